@@ -1,24 +1,40 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, UploadFile, File, Query
-from fastapi.responses import StreamingResponse
-from ...schemas.mindmap import DocumentAnalysisRequest, MindMapRequest, MindMapResponse, DocumentType
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Optional, Tuple
+from ...schemas.mindmap import BatchRequest, DocumentAnalysisRequest, ExpandRequest, LayoutRequest, MindMapRequest, MindMapResponse, DocumentType, ProcessingMode, check_max_depth
 from ...core.mindmap.processor import MindMapProcessor
-from ...core.models.llm import get_llm
+from ...core.mindmap.batch import batch_runner
+from ...core.mindmap.flight import Flight, inflight
+from ...core.mindmap.layout import layout_tree
+from ...core.models.llm import get_llm, llm_registry
+from ...core.models.scheduler import SchedulerSaturated, llm_scheduler
+from app.config.settings import settings
+from app.utils.lifecycle import drain
 from app.utils.logger import get_logger
 import asyncio
+import contextlib
 import json
 import base64
+import math
+import os
+import tempfile
 
 router = APIRouter(prefix="/mindmap", tags=["mindmap"])
 
 logger = get_logger()
 
 @router.post("/from-text/stream")
-async def create_mindmap_from_text(request: MindMapRequest):
-    """从文本生成思维导图（流式响应）"""
+async def create_mindmap_from_text(request: MindMapRequest, http_request: Request):
+    """从文本生成思维导图（流式响应），带 Last-Event-ID 重连时从断点继续"""
     processor = MindMapProcessor(get_llm())
+    if found := _resumable(http_request):
+        messages = processor.resume_stream(found, processor.process_text_stream(request))
+    else:
+        _check_admission()
+        messages = processor.process_text_stream(request)
     
     return StreamingResponse(
-        processor.process_text_stream(request),
+        messages,
         media_type="text/event-stream",
         headers={
             'Cache-Control': 'no-cache',
@@ -28,12 +44,17 @@ async def create_mindmap_from_text(request: MindMapRequest):
     )
 
 @router.post("/from-document/stream")
-async def create_mindmap_from_document(request: DocumentAnalysisRequest):
-    """从文档生成思维导图（流式响应）"""
+async def create_mindmap_from_document(request: DocumentAnalysisRequest, http_request: Request):
+    """从文档生成思维导图（流式响应），带 Last-Event-ID 重连时跳过文档解析直接续传"""
     processor = MindMapProcessor(get_llm())
+    if found := _resumable(http_request):
+        messages = processor.resume_stream(found, processor.process_document_stream(request))
+    else:
+        _check_admission()
+        messages = processor.process_document_stream(request)
     
     return StreamingResponse(
-        processor.process_document_stream(request),
+        messages,
         media_type="text/event-stream",
         headers={
             'Cache-Control': 'no-cache',
@@ -42,7 +63,250 @@ async def create_mindmap_from_document(request: DocumentAnalysisRequest):
         }
     )
 
+@router.post("/from-document/upload", openapi_extra={"requestBody": {"required": True, "content": {
+    "multipart/form-data": {"schema": {
+        "type": "object", "properties": {"file": {"type": "string", "format": "binary"}}, "required": ["file"]
+    }},
+    "application/pdf": {"schema": {"type": "string", "format": "binary"}},
+}}})
+async def create_mindmap_from_upload(
+    request: Request,
+    mode: ProcessingMode = Query(ProcessingMode.AUTO),
+    document_id: Optional[str] = Query(None),
+    max_depth: Optional[int] = Query(None, ge=1, le=5)
+):
+    """上传 PDF 生成思维导图（流式响应），支持 multipart 表单或 application/pdf 请求体"""
+    try:
+        check_max_depth(mode, max_depth)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    processor = MindMapProcessor(get_llm())
+    path = None
+    if found := _resumable(request):
+        # 重连时客户端可以不再上传文件；重新上传了文件时，任务没有结束事件则按新请求处理
+        try:
+            path = await _spool_pdf_upload(request)
+        except HTTPException:
+            messages = processor.resume_stream(found)
+        else:
+            fallback = processor.process_pdf_file_stream(path, mode, document_id, max_depth)
+            messages = processor.resume_stream(found, fallback)
+    else:
+        _check_admission()
+        path = await _spool_pdf_upload(request)
+        messages = processor.process_pdf_file_stream(path, mode, document_id, max_depth)
+
+    return _TempFileStreamingResponse(
+        messages,
+        path,
+        media_type="text/event-stream",
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@router.post("/batch", status_code=202)
+async def create_batch(request: BatchRequest):
+    """提交批量生成任务，返回任务 id，结果通过 /batch/{job_id}/results 读取"""
+    if not request.documents:
+        raise HTTPException(status_code=400, detail="文档列表为空")
+    if len(request.documents) > settings.BATCH_MAX_DOCUMENTS:
+        raise HTTPException(status_code=413, detail=f"每个批量任务最多 {settings.BATCH_MAX_DOCUMENTS} 篇文档")
+    _check_draining()
+    job_id = batch_runner.submit(request.documents, request.concurrency)
+    return {"job_id": job_id, "total": len(request.documents)}
+
+@router.get("/batch/{job_id}")
+async def get_batch(job_id: str):
+    """查询批量任务进度"""
+    job = await asyncio.to_thread(batch_runner.store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+@router.get("/batch/{job_id}/results")
+async def get_batch_results(job_id: str, follow: bool = Query(True)):
+    """以 NDJSON 读取批量结果（按完成顺序），follow 为 true 时持续输出直到任务结束"""
+    if await asyncio.to_thread(batch_runner.store.get_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return StreamingResponse(
+        batch_runner.iter_results(job_id, follow),
+        media_type="application/x-ndjson",
+        headers={'X-Accel-Buffering': 'no'}
+    )
+
+@router.post("/expand")
+async def expand_mindmap_node(request: ExpandRequest):
+    """渐进模式：按需生成节点的下一层子节点（已展开过的节点直接返回缓存）"""
+    processor = MindMapProcessor(get_llm())
+    _check_admission()
+    try:
+        return await processor.expand_node(request.session, request.node_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/layout")
+async def layout_mindmap(request: LayoutRequest):
+    """计算思维导图的整齐树布局，返回每个节点的左上角坐标和尺寸，客户端无需再做布局"""
+    try:
+        return layout_tree(request.tree, request.h_gap, request.v_gap, settings.LAYOUT_MAX_NODES)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _resumable(request: Request) -> Optional[Tuple[Flight, int]]:
+    """Last-Event-ID 对应的生成仍在进行时返回 (任务, seq)，否则按新请求处理（已完成的结果会命中缓存）
+
+    返回任务对象本身而不是 id：之后任务即使结束并从分组中移除，仍能回放剩余的事件
+    """
+    return inflight.find(request.headers.get("last-event-id"))
+
+def _check_draining():
+    """排空中的 worker 拒绝新的生成请求，客户端重试时由其他 worker 处理"""
+    if drain.draining:
+        raise HTTPException(status_code=503, detail="服务正在重启，请稍后重试", headers={"Retry-After": "1"})
+
+def _check_admission():
+    """LLM 调度队列已满时快速返回 429，而不是排队直到超时"""
+    _check_draining()
+    try:
+        llm_scheduler.check_admission()
+    except SchedulerSaturated as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+
+async def _spool_pdf_upload(request: Request) -> str:
+    """将上传的 PDF 分块写入临时文件并返回路径，不在内存中保留整个文件
+
+    multipart 表单边接收边解析，文件内容直接写入这一个临时文件，不再经过 Starlette 的表单临时文件
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        chunks = _iter_multipart_file(request, content_type)
+    elif content_type.startswith("application/pdf"):
+        chunks = request.stream()
+    else:
+        raise HTTPException(status_code=415, detail="请以 multipart 表单或 application/pdf 上传 PDF")
+
+    size = 0
+    head = b""  # 文件头可能被拆到多个网络分块中，收到至少 4 字节后再检查
+    f = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+    try:
+        with f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > settings.PDF_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail="PDF 文件过大")
+                if head is not None:
+                    head += chunk
+                    if len(head) < len(PDF_MAGIC):
+                        continue
+                    _check_pdf_magic(head)
+                    chunk, head = head, None
+                await asyncio.to_thread(f.write, chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="上传的文件为空")
+        if head is not None:
+            _check_pdf_magic(head)
+        return f.name
+    except BaseException:
+        os.unlink(f.name)
+        raise
+
+PDF_MAGIC = b"%PDF"
+
+def _check_pdf_magic(head: bytes):
+    if not head.startswith(PDF_MAGIC):
+        raise HTTPException(status_code=415, detail="上传的文件不是 PDF")
+
+async def _iter_multipart_file(request: Request, content_type: str, field: str = "file"):
+    """边接收边解析 multipart 请求体，产生指定文件字段的内容分块"""
+    from python_multipart.multipart import MultipartParser, parse_options_header
+
+    boundary = parse_options_header(content_type)[1].get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="multipart 请求缺少 boundary")
+
+    output: List[bytes] = []
+    header = {"field": b"", "value": b""}
+    state = {"disposition": b"", "current": False, "found": False}
+
+    def on_part_begin():
+        state["disposition"] = b""
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header["field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        if header["field"].lower() == b"content-disposition":
+            state["disposition"] = header["value"]
+        header["field"], header["value"] = b"", b""
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if state["current"]:
+            output.append(data[start:end])
+
+    def on_headers_finished():
+        name = parse_options_header(state["disposition"])[1].get(b"name", b"")
+        state["current"] = name.decode("latin-1") == field and not state["found"]
+        state["found"] = state["found"] or state["current"]
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for data in output:
+                yield data
+            output.clear()
+        parser.finalize()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"multipart 请求格式错误: {str(e)}")
+    if not state["found"]:
+        raise HTTPException(status_code=400, detail=f"multipart 表单缺少 {field} 字段")
+
+class _TempFileStreamingResponse(StreamingResponse):
+    """响应结束后删除上传的临时文件
+
+    在响应本身而不是流生成器中清理：客户端在响应开始前断开时生成器从未运行，其 finally 不会执行
+    """
+
+    def __init__(self, content, path: Optional[str], **kwargs):
+        super().__init__(content, **kwargs)
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.path:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(self.path)
+
 @router.get("/health")
 async def health_check():
     """健康检查"""
-    return {"status": "ok"} 
\ No newline at end of file
+    health = {"status": "ok", "scheduler": llm_scheduler.stats()}
+    if llm_registry.router:
+        health["backends"] = llm_registry.router.stats()
+    if drain.draining:
+        # 负载均衡据此停止向本 worker 发送新请求
+        return JSONResponse(status_code=503, content={**health, "status": "draining"})
+    return health 
\ No newline at end of file
@@ -1,20 +1,52 @@
 from pydantic_settings import BaseSettings
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional
 import os
+import warnings
 
 class Settings(BaseSettings):
     # 基础配置
     APP_NAME: str = "AI MindMap"
     DEBUG: bool = True
     API_V1_STR: str = "/api/v1"
+
+    # 生产部署配置（gunicorn.conf.py）
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0  # worker 进程数，0 表示等于 CPU 核数
+    SERVER_MAX_CONNECTIONS: int = 1000  # 每个 worker 同时处理的连接数上限，超过后返回 503，0 表示不限制
+    SERVER_KEEPALIVE: int = 5  # HTTP keep-alive 超时(秒)
+    SERVER_DRAIN_TIMEOUT: int = 120  # 收到 SIGTERM 后等待进行中的 SSE 生成完成的时间(秒)
+    SERVER_MAX_REQUESTS: int = 0  # worker 处理多少请求后重启，0 表示不重启
     
+    # LLM 类型：openai 或 ollama
+    LLM_TYPE: str = "openai"
+
+    # 多后端路由（JSON 列表），为空时按 LLM_TYPE 使用单个后端。每项可包含
+    # name、type(openai/ollama)、model、base_url、api_key、weight、short_text，未填写的字段使用下方对应配置
+    LLM_BACKENDS: List[Dict[str, Any]] = []
+    LLM_HEDGE_PERCENTILE: float = 0.95  # 主后端首 token 超过该分位数时对冲到第二个后端
+    LLM_HEDGE_MIN_DELAY: float = 1.0  # 对冲等待时间下限(秒)
+    LLM_HEDGE_MAX_DELAY: float = 10.0  # 对冲等待时间上限(秒)，样本不足时使用
+    LLM_BACKEND_MAX_FAILURES: int = 3  # 连续失败多少次后暂时摘除后端
+    LLM_BACKEND_COOLDOWN: int = 30  # 摘除后端的冷却时间(秒)
+    LLM_SHORT_TEXT_TOKENS: int = 0  # 输入不超过该 token 数时优先使用 short_text 后端，0 表示关闭
+
     # OpenAI 配置
     OPENAI_API_KEY: str = ""  # 从环境变量获取
     OPENAI_API_BASE: str = "https://api.openai.com/v1"  # 默认 API 地址
     OPENAI_MODEL: str = "gpt-4-1106-preview"  # 使用 GPT-4
+
+    # Ollama 配置
+    OLLAMA_MODEL: str = "qwen2.5"
+    OLLAMA_API_BASE: str = "http://localhost:11434"
+
+    # 草稿模型配置（短文本先由本地小模型输出骨架，留空表示关闭）
+    DRAFT_MODEL: str = ""  # Ollama 模型名，如 qwen2.5:1.5b
+    DRAFT_API_BASE: str = ""  # 默认使用 OLLAMA_API_BASE
+    DRAFT_MAX_CHARS: int = 4000  # 输入超过该字符数时不生成草稿
+    DRAFT_KEEP_ALIVE: str = "30m"  # 草稿模型在 Ollama 中常驻的时间，避免冷启动
     
     # LangChain配置
-    CHUNK_SIZE: int = 12000  # 更大的块大小
     CHUNK_OVERLAP: int = 200  # 更小的重叠度
     TEMPERATURE: float = 0.7  # 默认温度
     
@@ -29,11 +61,22 @@ class Settings(BaseSettings):
     TEMPERATURE_CONCLUSION: float = 1.0    # 结论部分处理 - 数据抽取/分析
     TEMPERATURE_GENERAL: float = 1.0      # 通用内容处理 - 数据抽取/分析
     TEMPERATURE_RELATIONSHIP: float = 1.3  # 关系分析 - 需要一定创造性
+
+    # 论文章节处理配置
+    SECTION_MIN_CHARS: int = 200  # 短于该字符数的章节并入前一个章节
+    SECTION_MAX_COUNT: int = 10  # 单篇论文最多的章节数（即并发的 LLM 调用数）
     
     # LLM 配置
     TIMEOUT: int = 30  # 减少超时时间到 30 秒
     MAX_RETRIES: int = 3  # 最大重试次数
     REQUEST_TIMEOUT: int = 120  # 请求超时时间(秒)
+
+    # LLM 连接池配置
+    LLM_MAX_CONNECTIONS: int = 100  # 每个连接池的最大连接数
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20  # 保持的空闲长连接数
+    LLM_KEEPALIVE_EXPIRY: float = 60.0  # 空闲长连接保持时间(秒)
+    LLM_HTTP2: bool = False  # 是否启用 HTTP/2（需要安装 h2）
+    LLM_STREAM_USAGE: bool = True  # 流式响应返回 token 用量（包括命中前缀缓存的 token），不支持的兼容接口可关闭
     
     # API 配置
     API_TIMEOUT: int = 1800  # 30分钟超时
@@ -43,8 +86,11 @@ class Settings(BaseSettings):
     API_MAX_EMPTY_LINES: int = 100  # 最大连续空行数
     
     # 流式输出配置
-    STREAM_CHUNK_SIZE: int = 100
+    STREAM_CHUNK_SIZE: int = 100  # 累计多少字符刷新一次 generating 事件
+    STREAM_FLUSH_INTERVAL_MS: int = 50  # 片段最长等待时间(毫秒)，与字符数先到者为准
     STREAM_PROGRESS_INTERVAL: int = 5  # 每5秒更新一次进度
+    STREAM_GRACE_PERIOD: int = 60  # 客户端全部断开后继续生成等待重连的时间(秒)，0 表示立即停止
+    STREAM_EVENT_LOG_SIZE: int = 2000  # 每个生成任务保留的事件数，更早的事件合并为快照
     
     # LLM 质量控制配置
     TOP_P: float = 0.7  # 控制输出的多样性
@@ -54,20 +100,47 @@ class Settings(BaseSettings):
     # 文本处理配置
     MIN_CHUNK_LENGTH: int = 2000  # 最小块长度
     MAX_SUMMARY_LENGTH: int = 5000  # 最大摘要长度
-    MAX_MINDMAP_DEPTH: int = 3  # 思维导图最大深度
+    MAX_MINDMAP_DEPTH: int = 3  # 思维导图最大深度（根节点以下的层数），请求未指定 max_depth 时使用
+    PROGRESSIVE_EXPAND_TOKENS: int = 3000  # 渐进模式展开节点时从原文抽取的参考内容 token 数
+    LAYOUT_MAX_NODES: int = 20000  # 布局接口接受的最大节点数
     
     # 缓存配置
     CACHE_EXPIRE_TIME: int = 3600  # 缓存过期时间（秒）
     MAX_CACHE_ITEMS: int = 1000  # 最大缓存条目数
+    CACHE_DB_PATH: str = "data/cache.sqlite3"  # 持久化缓存文件（多个 worker 共享）
+    PROMPT_VERSION: str = "2"  # 提示词模板版本，修改模板后递增以使旧缓存失效
+    SIMILARITY_THRESHOLD: float = 0.95  # 近似重复输入复用结果的 SimHash 相似度阈值，0 表示关闭
+    SIMILARITY_MIN_CHARS: int = 2000  # 参与近似重复查找的最短输入（字符数），短文本的少量改动就可能改变含义
     
     # 并发配置
-    MAX_CONCURRENT_REQUESTS: int = 3  # 并发限制
+    MAX_CONCURRENT_REQUESTS: int = 3  # 并发限制（每个 worker 同时进行的 LLM 调用数）
     MAX_WORKERS: int = 5  # 最大工作线程数
-    CHUNK_BATCH_SIZE: int = 3  # 批处理大小
+    CHUNK_BATCH_SIZE: int = 3  # 批处理大小（单个文档同时处理的分块数）
+    LLM_MAX_QUEUE: int = 50  # LLM 调用排队上限，超过后直接返回 429
+    LLM_RPM_LIMIT: int = 0  # 每分钟请求数限制，0 表示不限制
+    LLM_TPM_LIMIT: int = 0  # 每分钟 token 数限制，0 表示不限制
     
+    # PDF 解析配置
+    PDF_MAX_BYTES: int = 50 * 1024 * 1024  # PDF 文件大小上限
+    PDF_MAX_PAGES: int = 500  # 最多解析的页数
+    PDF_PAGE_BATCH_SIZE: int = 8  # 每个子进程任务解析的页数
+
+    # 批量任务配置
+    BATCH_DB_PATH: str = "data/batch.sqlite3"  # 批量任务和结果存储（多个 worker 共享）
+    BATCH_CONCURRENCY: int = 4  # 每个批量任务同时生成的文档数上限
+    BATCH_MAX_DOCUMENTS: int = 500  # 每个批量任务最多的文档数
+    BATCH_RESULT_TTL: int = 7 * 24 * 3600  # 批量结果保留时间（秒）
+    BATCH_HEARTBEAT_INTERVAL: float = 10.0  # 执行任务的 worker 刷新任务心跳的间隔（秒）
+    BATCH_LEASE_TIMEOUT: float = 60.0  # 运行中的任务超过该时间没有心跳时视为 worker 已退出，标记为 failed
+
     # 文本处理配置
     MAX_INPUT_TOKENS: int = 128000  # GPT-4 最大输入长度限制
     CHINESE_CHARS_PER_TOKEN: float = 0.7  # 中文字符到 token 的估算比例（GPT-4）
+    CONTEXT_FILL_RATIO: float = 0.5  # 单次调用最多使用上下文窗口的比例
+    CHUNK_TOKENS: int = 6000  # map-reduce 每个分块的 token 数
+    TOKENIZER_CACHE_DIR: str = "data/tiktoken"  # 分词器词表本地缓存目录
+    DETAIL_SOURCE_CHUNKS: int = 4  # 填充每个分支细节时参考的分块总结数，0 表示使用全部
+    INCREMENTAL_RESTRUCTURE_RATIO: float = 0.3  # 增量生成时变化的分块超过该比例则重新归纳全局结构
     
     # LLM 生成参数
     LLM_TEMPERATURE: float = 0.6  # 降低温度以增加专业性
@@ -77,8 +150,8 @@ class Settings(BaseSettings):
     LLM_MAX_TOKENS: int = 4000  # 进一步增加长度限制
     
     # 文本处理参数
-    TEXT_HEAD_RATIO: float = 0.8  # 增加前文本的比例
-    TEXT_TAIL_RATIO: float = 0.2  # 减少后文本的比例
+    EXTRACTIVE_HEAD_RATIO: float = 0.1  # 抽取式压缩时始终保留的文档开头（标题、摘要）占预算的比例
+    EXTRACTIVE_MAX_RATIO: float = 3.0  # AUTO 模式下不超过预算该倍数的文本先抽取关键句再单次生成，更长的使用 map-reduce，0 表示关闭
     CACHE_KEY_LENGTH: int = 1000  # 缓存键的文本长度
     
     model_config = {
@@ -90,10 +163,21 @@ class Settings(BaseSettings):
 # 创建单例实例
 settings = Settings()
 
+# 已移除的配置项及替代项：按开头和结尾截断文本的方式已改为抽取式压缩，
+# 旧部署中仍然设置时给出提示，避免以为旧值仍然生效
+REMOVED_SETTINGS = {
+    "TEXT_HEAD_RATIO": "EXTRACTIVE_HEAD_RATIO（含义不同：抽取式压缩时保留的文档开头占预算的比例）",
+    "TEXT_TAIL_RATIO": None,
+    "CHUNK_SIZE": "CHUNK_TOKENS（按 token 计）",
+}
+for _name, _replacement in REMOVED_SETTINGS.items():
+    if _name in os.environ or _name in (settings.model_extra or {}):
+        warnings.warn(
+            f"配置项 {_name} 已移除，不再生效" + (f"，请改用 {_replacement}" if _replacement else ""),
+            stacklevel=1
+        )
+
 # 确保导出 settings 实例
 __all__ = ['settings']
 
-# 验证必要的配置
-assert settings.OPENAI_API_KEY and settings.OPENAI_API_KEY.startswith("sk-"), (
-    "Invalid OPENAI_API_KEY format. It should start with 'sk-'"
-) 
\ No newline at end of file
+# 各后端的配置（如 OPENAI_API_KEY）按实际使用的后端类型在应用启动时检查，见 LLMClientRegistry.validate
@@ -0,0 +1,173 @@
+import re
+from typing import Callable, List, Optional
+import numpy as np
+from app.config.settings import settings
+
+# 句子边界：中英文句末标点（可带后引号）、英文句点后的空白和换行
+_SENTENCE_END = re.compile(r"[。！？!?；;…]+[”’\"'）)]*|\.(?=\s)|\n+")
+# 判断重复句子时忽略的字符
+_NOT_WORD = re.compile(r"[\W_]+")
+_MIN_SENTENCE_FEATURES = 4  # 特征更少的句子（编号、页眉、代码围栏等）不参与排序
+_COVERAGE_SHARE = 0.5  # 按位置均匀分配的预算比例，其余预算按全局得分分配
+_SEGMENT_TOKENS = 400  # 每个位置分段对应的预算 token 数
+_RATIO_SAMPLE_CHARS = 20000  # 校准 token 估算时实际分词的文本长度
+_QUERY_BACKGROUND = 0.1  # 按查询抽取时全文质心得分的权重，查询没有命中的句子按它排序
+
+def _sentence_spans(text: str):
+    """返回每个句子的 [起点, 终点)，句子不跨段落"""
+    ends = [match.end() for match in _SENTENCE_END.finditer(text)]
+    if not ends or ends[-1] < len(text):
+        ends.append(len(text))
+    ends = np.asarray(ends, dtype=np.int64)
+    starts = np.concatenate(([0], ends[:-1]))
+    return starts, ends
+
+def _codes(text: str):
+    """文本的小写码位数组，以及中文字符和英文数字字符的掩码（与原文逐字符对齐）"""
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    codes[(codes >= 0x41) & (codes <= 0x5A)] += 0x20
+    cjk = ((codes >= 0x4E00) & (codes <= 0x9FFF)) | ((codes >= 0x3400) & (codes <= 0x4DBF))
+    alnum = ((codes >= 0x61) & (codes <= 0x7A)) | ((codes >= 0x30) & (codes <= 0x39))
+    return codes, cjk, alnum
+
+def _features(codes: np.ndarray, cjk: np.ndarray, alnum: np.ndarray):
+    """提取特征的位置和哈希：中文按相邻两字，英文和数字按词内三字符片段"""
+    bigram = np.flatnonzero(cjk[:-1] & cjk[1:])
+    trigram = np.flatnonzero(alnum[:-2] & alnum[1:-1] & alnum[2:])
+    positions = np.concatenate((bigram, trigram))
+    keys = np.concatenate((
+        (codes[bigram] << 21) | codes[bigram + 1],
+        (1 << 42) | (codes[trigram] << 14) | (codes[trigram + 1] << 7) | codes[trigram + 2],
+    ))
+    return positions, keys
+
+def _score_sentences(
+    codes: np.ndarray,
+    cjk: np.ndarray,
+    alnum: np.ndarray,
+    starts: np.ndarray,
+    query: bool = False
+) -> np.ndarray:
+    """按 TF-IDF 向量与全文质心的余弦相似度给句子打分
+
+    句子-特征矩阵以 (句子, 特征, 词频) 的稀疏三元组表示，全部计算向量化完成。
+    query 为 True 时最后一个“句子”是查询文本，得分以与它的相似度为主
+    """
+    count = len(starts)
+    positions, keys = _features(codes, cjk, alnum)
+    if not len(keys):
+        return np.zeros(count)
+
+    sentence = np.searchsorted(starts, positions, side="right") - 1
+    terms, term = np.unique(keys, return_inverse=True)
+    pairs, tf = np.unique(sentence * len(terms) + term, return_counts=True)
+    rows, cols = pairs // len(terms), pairs % len(terms)
+
+    df = np.bincount(cols, minlength=len(terms))
+    idf = np.log((1 + count) / (1 + df)) + 1
+    weights = (1 + np.log(tf)) * idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights * weights, minlength=count))
+    weights /= norms[rows]
+
+    centroid = np.bincount(cols, weights, minlength=len(terms)) / count
+    centroid /= np.linalg.norm(centroid) or 1.0
+    scores = np.bincount(rows, weights * centroid[cols], minlength=count)
+    if query:
+        target = np.zeros(len(terms))
+        own = rows == count - 1
+        target[cols[own]] = weights[own]
+        scores = np.bincount(rows, weights * target[cols], minlength=count) + _QUERY_BACKGROUND * scores
+    scores[np.bincount(rows, tf, minlength=count) < _MIN_SENTENCE_FEATURES] = 0
+    return scores
+
+def _sentence_tokens(cjk: np.ndarray, starts: np.ndarray, ends: np.ndarray, scale: float) -> np.ndarray:
+    """按句子的中英文字符数估算 token 数（与 token_budget 的估算方式一致），再按抽样分词结果校准"""
+    cjk_before = np.r_[0, np.cumsum(cjk)]
+    cjk_count = cjk_before[ends] - cjk_before[starts]
+    estimate = cjk_count / settings.CHINESE_CHARS_PER_TOKEN + (ends - starts - cjk_count) / 4
+    return np.ceil(estimate * scale)
+
+def _fill(order: np.ndarray, cost: np.ndarray, group: np.ndarray, quota: np.ndarray) -> np.ndarray:
+    """按 order 的顺序在每组内依次选取，直到该组的 token 配额用完"""
+    group = group[order]
+    spent = np.cumsum(cost[order])
+    # 减去每组之前所有组的累计值，得到组内累计
+    first = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    offset = np.repeat(np.r_[0, spent[first[1:] - 1]], np.diff(np.r_[first, len(order)]))
+    return order[spent - offset <= quota[group]]
+
+def extract_summary(
+    text: str,
+    max_tokens: int,
+    count_tokens: Callable[[str], int],
+    head_ratio: float = 0.1,
+    query: Optional[str] = None
+) -> str:
+    """从全文中抽取最有信息量的句子，压缩到约 max_tokens 并保持原文顺序
+
+    文档开头（标题、摘要）按 head_ratio 保留；一半预算按位置分段均匀分配保证覆盖全文，
+    其余预算按得分从全局选取。传入 query 时只按与查询的相关程度选取（用于展开单个节点）。
+    句子的 token 数为估算值，调用方需要时再精确截断
+    """
+    starts, ends = _sentence_spans(text)
+    codes, cjk, alnum = _codes(f"{text}\n{query}" if query else text)
+    sample = min(_RATIO_SAMPLE_CHARS, len(text))
+    sample_estimate = _sentence_tokens(cjk, np.array([0]), np.array([sample]), 1.0)[0]
+    cost = _sentence_tokens(cjk, starts, ends, count_tokens(text[:sample]) / max(sample_estimate, 1))
+    budget = max_tokens * 0.95  # 为估算误差和段落分隔符留余量
+
+    if query:
+        scores = _score_sentences(codes, cjk, alnum, np.r_[starts, len(text) + 1], query=True)[:-1]
+    else:
+        scores = _score_sentences(codes, cjk, alnum, starts)
+    # 重复出现的句子（页眉页脚、模板段落）只保留第一次；比较时忽略大小写、标点和空白，
+    # 数字不同的句子可能陈述不同的数据，不视为重复
+    _, first = np.unique([_NOT_WORD.sub("", text[start:end].lower())
+                          for start, end in zip(starts.tolist(), ends.tolist())],
+                         return_index=True)
+    duplicate = np.ones(len(starts), dtype=bool)
+    duplicate[first] = False
+    scores[duplicate] = 0
+
+    selected = np.zeros(len(starts), dtype=bool)
+    head = np.cumsum(cost) <= budget * head_ratio
+    selected |= head
+    budget -= cost[head].sum()
+
+    # 按位置均匀分段，每段的配额与其长度成正比
+    segments = int(min(max(budget // _SEGMENT_TOKENS, 1), len(starts)))
+    segment = np.minimum((starts * segments) // max(len(text), 1), segments - 1)
+    segment_cost = np.bincount(segment, cost, minlength=segments)
+    quota = budget * (0 if query else _COVERAGE_SHARE) * segment_cost / max(segment_cost.sum(), 1)
+    candidates = np.flatnonzero(~selected & (scores > 0))
+    ranked = candidates[np.lexsort((-scores[candidates], segment[candidates]))]
+    picked = _fill(ranked, cost, segment, quota)
+    selected[picked] = True
+    budget -= cost[picked].sum()
+
+    candidates = np.flatnonzero(~selected & (scores > 0))
+    ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+    selected[ranked[np.cumsum(cost[ranked]) <= budget]] = True
+
+    return _join(text, starts[selected], ends[selected])
+
+def _join(text: str, starts: np.ndarray, ends: np.ndarray) -> str:
+    """按原文顺序拼接选中的句子，保留原文中的段落分隔和换行"""
+    paragraph_breaks = np.asarray([match.start() for match in re.finditer(r"\n\n", text)], dtype=np.int64)
+    paragraphs = np.searchsorted(paragraph_breaks, starts, side="right")
+    parts: List[str] = []
+    previous = None
+    for start, end, paragraph in zip(starts.tolist(), ends.tolist(), paragraphs.tolist()):
+        sentence = text[start:end].strip()
+        if not sentence:
+            continue
+        if previous is not None:
+            if paragraph != previous[0]:
+                parts.append("\n\n")
+            elif text[previous[1] - 1] == "\n":
+                parts.append("\n")
+            elif sentence[0].isascii() and parts[-1][-1].isascii():
+                parts.append(" ")
+        parts.append(sentence)
+        previous = paragraph, end
+    return "".join(parts)
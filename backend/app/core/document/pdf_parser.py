@@ -1,25 +1,148 @@
+import asyncio
 import base64
 import io
-from PyPDF2 import PdfReader
-from typing import Optional
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional, Tuple, Union
+from app.config.settings import settings
+from app.utils.logger import get_logger
+from app.utils.metrics import PDF_PAGES, STAGE_DURATION
+
+logger = get_logger()
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_pid: Optional[int] = None
+
+def _get_executor() -> ProcessPoolExecutor:
+    """获取当前进程的 PDF 解析进程池（fork 后重新创建）"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ProcessPoolExecutor(max_workers=settings.MAX_WORKERS)
+        _executor_pid = os.getpid()
+    return _executor
+
+def _reader(source):
+    # PyPDF2 在首次解析时才导入，不计入 worker 启动时间（后台预热或 fork 前已导入时不再重复加载）
+    from PyPDF2 import PdfReader
+    return PdfReader(source)
+
+# 子进程中最近打开的 PDF：解析交叉引用表需要读入并扫描整个文件，同一文档的各批页面复用同一个 reader。
+# 每个子进程只保留少量文档（reader 持有整个文件的内容），以路径和文件元数据识别，同一路径上的新文件不会误用旧的 reader
+_READER_CACHE_SIZE = 2
+_readers: "OrderedDict[tuple, object]" = OrderedDict()
+
+def _cached_reader(path: str):
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    reader = _readers.get(key)
+    if reader is None:
+        reader = _readers[key] = _reader(path)
+        while len(_readers) > _READER_CACHE_SIZE:
+            _readers.popitem(last=False)
+    else:
+        _readers.move_to_end(key)
+    return reader
+
+def _count_pages(path: str) -> int:
+    return len(_cached_reader(path).pages)
+
+def _extract_pages(path: str, start: int, end: int) -> List[str]:
+    """在子进程中提取 [start, end) 页的文本"""
+    reader = _cached_reader(path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+def _write_temp(data: bytes) -> str:
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(data)
+        return f.name
 
 class PDFParser:
+    @staticmethod
+    def decode_base64(base64_string: str) -> bytes:
+        """解码 base64 编码的 PDF，并检查大小上限"""
+        if len(base64_string) * 3 // 4 > settings.PDF_MAX_BYTES:
+            raise ValueError(f"PDF 文件超过 {settings.PDF_MAX_BYTES // (1024 * 1024)}MB 上限")
+        return base64.b64decode(base64_string)
+
     @staticmethod
     def parse_base64_pdf(base64_string: str) -> str:
         """将 base64 编码的 PDF 转换为文本"""
         try:
-            # 解码 base64 字符串
-            pdf_bytes = base64.b64decode(base64_string)
-            pdf_file = io.BytesIO(pdf_bytes)
-            
-            # 读取 PDF
-            reader = PdfReader(pdf_file)
-            text = ""
-            
-            # 提取所有页面的文本
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-                
-            return text.strip()
+            start = time.perf_counter()
+            reader = _reader(io.BytesIO(PDFParser.decode_base64(base64_string)))
+            pages = [page.extract_text() or "" for page in reader.pages[:settings.PDF_MAX_PAGES]]
+            PDF_PAGES.inc(len(pages))
+            STAGE_DURATION.labels("pdf_parse").observe(time.perf_counter() - start)
+            return "\n".join(pages).strip()
         except Exception as e:
-            raise ValueError(f"PDF parsing failed: {str(e)}") 
\ No newline at end of file
+            raise ValueError(f"PDF parsing failed: {str(e)}")
+
+    @staticmethod
+    async def iter_pages(
+        source: Union[bytes, str],
+        max_chars: Optional[int] = None
+    ) -> AsyncIterator[Tuple[int, int, str]]:
+        """在进程池中按页并行提取文本，按页码顺序产生 (页码, 总页数, 文本)
+
+        source 为 PDF 字节或文件路径；累计文本达到 max_chars 后停止提取剩余页面。
+        """
+        temp_path = None
+        if isinstance(source, bytes):
+            if len(source) > settings.PDF_MAX_BYTES:
+                raise ValueError(f"PDF 文件超过 {settings.PDF_MAX_BYTES // (1024 * 1024)}MB 上限")
+            # 写入临时文件，子进程按路径读取，避免在进程间复制整个文件；写入在线程中进行，不阻塞事件循环
+            temp_path = path = await asyncio.to_thread(_write_temp, source)
+        else:
+            path = source
+
+        loop = asyncio.get_running_loop()
+        executor = _get_executor()
+        pending = []
+        try:
+            total = await loop.run_in_executor(executor, _count_pages, path)
+            if total > settings.PDF_MAX_PAGES:
+                logger.warning(f"PDF 共 {total} 页，只解析前 {settings.PDF_MAX_PAGES} 页")
+                total = settings.PDF_MAX_PAGES
+
+            batch = max(1, settings.PDF_PAGE_BATCH_SIZE)
+            ranges = [(start, min(start + batch, total)) for start in range(0, total, batch)]
+            window = max(1, settings.MAX_WORKERS)
+            collected = 0
+            next_range = 0
+
+            while next_range < len(ranges) or pending:
+                # 保持进程池满载，同时按顺序产出结果
+                while next_range < len(ranges) and len(pending) < window:
+                    start, end = ranges[next_range]
+                    pending.append((start, loop.run_in_executor(executor, _extract_pages, path, start, end)))
+                    next_range += 1
+
+                start, future = pending.pop(0)
+                for offset, text in enumerate(await future):
+                    collected += len(text)
+                    PDF_PAGES.inc()
+                    yield start + offset + 1, total, text
+
+                if max_chars and collected >= max_chars:
+                    logger.info(f"已提取 {collected} 字符，提前结束 PDF 解析")
+                    break
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"PDF parsing failed: {str(e)}")
+        finally:
+            for _, future in pending:
+                future.cancel()
+            if temp_path:
+                os.unlink(temp_path)
+
+    @staticmethod
+    def shutdown():
+        """关闭解析进程池"""
+        global _executor
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
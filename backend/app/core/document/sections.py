@@ -0,0 +1,156 @@
+import re
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import List, Optional, Tuple
+from app.config.settings import settings
+
+class SectionKind(str, Enum):
+    ABSTRACT = "abstract"
+    INTRODUCTION = "introduction"
+    METHOD = "method"
+    RESULT = "result"
+    CONCLUSION = "conclusion"
+    GENERAL = "general"
+    REFERENCES = "references"  # 参考文献、致谢，不参与生成
+
+# 按顺序匹配，先命中的类型优先（如 "Experimental Results and Discussion" 归为结果）
+_KEYWORDS: List[Tuple[SectionKind, Tuple[str, ...]]] = [
+    (SectionKind.ABSTRACT, ("abstract", "摘要", "内容提要")),
+    (SectionKind.REFERENCES, ("references", "bibliography", "acknowledgment", "acknowledgement", "参考文献", "致谢")),
+    (SectionKind.INTRODUCTION, ("introduction", "background", "motivation", "引言", "绪论", "前言", "研究背景")),
+    (SectionKind.CONCLUSION, ("conclusion", "concluding", "future work", "结论", "总结", "结语", "展望")),
+    (SectionKind.RESULT, ("experiment", "result", "evaluation", "empirical", "ablation",
+                          "实验", "结果", "评估", "评测", "性能分析")),
+    (SectionKind.METHOD, ("method", "approach", "model", "framework", "architecture", "algorithm", "proposed",
+                          "方法", "模型", "算法", "框架", "原理", "系统设计")),
+]
+
+_CJK_NUMERALS = {c: i for i, c in enumerate("一二三四五六七八九十", 1)}
+_ROMAN = {"I": 1, "V": 5, "X": 10}
+
+# 一级标题的编号：1 / 1. / I. / 第一章 / 一、（不包括 3.1 这样的小节编号）
+_NUMBERED = re.compile(
+    r"^(?:(?P<arabic>\d{1,2})(?:\.(?!\d)\s*|\s+)"
+    r"|(?P<roman>[IVX]{1,4})\.\s*"
+    r"|第(?P<chapter>[一二三四五六七八九十\d]{1,3})[章部分]\s*"
+    r"|(?P<cjk>[一二三四五六七八九十]{1,3})[、.．]\s*)"
+    r"(?P<title>\S.*)$"
+)
+# 与正文写在同一行的摘要，如 "Abstract—We propose..."、"摘要：本文..."
+_INLINE_ABSTRACT = re.compile(r"^(?:abstract|摘\s*要)\s*[—:：\-.]\s*(?P<text>\S.+)$", re.I)
+_SENTENCE_END = re.compile(r"[。．.，,；;:：]$")
+
+@dataclass
+class Section:
+    kind: SectionKind
+    heading: str
+    text: str = ""
+
+@dataclass
+class PaperStructure:
+    title: Optional[str]
+    sections: List[Section] = field(default_factory=list)
+
+def _kind(title: str) -> Optional[SectionKind]:
+    normalized = title.lower()
+    compact = re.sub(r"\s+", "", normalized)
+    for kind, keywords in _KEYWORDS:
+        for keyword in keywords:
+            if keyword.isascii():
+                if re.search(rf"\b{keyword}", normalized):
+                    return kind
+            elif keyword in compact:
+                return kind
+    return None
+
+def _number(match: re.Match) -> int:
+    if match.group("arabic"):
+        return int(match.group("arabic"))
+    if roman := match.group("roman"):
+        values = [_ROMAN[c] for c in roman]
+        return sum(-v if i + 1 < len(values) and v < values[i + 1] else v for i, v in enumerate(values))
+    value = match.group("chapter") or match.group("cjk")
+    if value.isdigit():
+        return int(value)
+    if len(value) == 1:
+        return _CJK_NUMERALS.get(value, 0)
+    # 十一、二十 这样的两位中文数字
+    tens, _, ones = value.partition("十")
+    return _CJK_NUMERALS.get(tens, 1) * 10 + _CJK_NUMERALS.get(ones, 0)
+
+def _looks_like_title(title: str) -> bool:
+    """标题较短、不以句子标点结尾，英文标题首字母大写"""
+    if len(title) > 80 or len(title.split()) > 12 or _SENTENCE_END.search(title):
+        return False
+    first = title[0]
+    return not first.isdigit() and not (first.isascii() and first.islower())
+
+def _heading(line: str, expected: Optional[int]) -> Optional[Tuple[SectionKind, str, Optional[int]]]:
+    """判断一行是否为一级标题，返回 (类型, 标题, 编号)
+
+    不依赖字体信息：编号标题要求编号连续递增，未编号的标题必须是已知的章节名
+    """
+    if match := _NUMBERED.match(line):
+        title, number = match.group("title").strip(), _number(match)
+        in_sequence = number == expected if expected else number in (1, 2)
+        if in_sequence and _looks_like_title(title):
+            return _kind(title) or SectionKind.GENERAL, title, number
+    if len(line) <= 40 and _looks_like_title(line) and len(line.split()) <= 5:
+        if kind := _kind(line):
+            return kind, line, None
+    return None
+
+def detect_sections(text: str) -> Optional[PaperStructure]:
+    """按标题模式把提取出的论文文本切分为章节，不像论文时返回 None"""
+    title = None
+    preamble: List[str] = []
+    sections: List[Section] = []
+    expected = None
+
+    for raw in text.split("\n"):
+        line = raw.strip()
+        if not line:
+            continue
+        if match := _INLINE_ABSTRACT.match(line):
+            sections.append(Section(SectionKind.ABSTRACT, "摘要", match.group("text")))
+            continue
+        if heading := _heading(line, expected):
+            kind, heading_text, number = heading
+            if number is not None:
+                expected = number + 1
+            sections.append(Section(kind, heading_text))
+            continue
+        if sections:
+            sections[-1].text += line + "\n"
+        else:
+            preamble.append(line)
+
+    if preamble and 4 <= len(preamble[0]) <= 200:
+        title = preamble.pop(0)
+
+    # 没有单独的摘要标题时，标题和第一个章节之间的内容通常就是摘要
+    front = "\n".join(preamble)
+    if len(front) >= settings.SECTION_MIN_CHARS and not any(s.kind == SectionKind.ABSTRACT for s in sections):
+        sections.insert(0, Section(SectionKind.ABSTRACT, "摘要", front))
+
+    sections = _merge_sections([s for s in sections if s.kind != SectionKind.REFERENCES and s.text.strip()])
+    # 过短的章节合并后仍不足三个有实际内容的章节时，多半是带小标题的笔记而不是论文
+    known = {s.kind for s in sections} - {SectionKind.GENERAL}
+    if len(sections) < 3 or len(known) < 2 or any(len(s.text) < settings.SECTION_MIN_CHARS for s in sections):
+        return None
+    return PaperStructure(title, sections)
+
+def _merge_sections(sections: List[Section]) -> List[Section]:
+    """过短的章节并入前一个章节，章节数超过上限时合并最短的章节"""
+    merged: List[Section] = []
+    for section in sections:
+        if merged and len(section.text) < settings.SECTION_MIN_CHARS:
+            merged[-1].text += f"\n{section.heading}\n{section.text}"
+        else:
+            merged.append(section)
+
+    while len(merged) > max(1, settings.SECTION_MAX_COUNT):
+        index = min(range(1, len(merged)), key=lambda i: len(merged[i].text))
+        section = merged.pop(index)
+        merged[index - 1].text += f"\n{section.heading}\n{section.text}"
+    return merged
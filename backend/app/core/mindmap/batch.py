@@ -0,0 +1,224 @@
+from typing import Dict, List, Optional
+from app.schemas.mindmap import BatchStatus, DocumentAnalysisRequest
+from app.core.mindmap.processor import MindMapProcessor
+from app.core.models.llm import get_llm
+from app.core.models.scheduler import Priority, llm_scheduler
+from app.config.settings import settings
+from app.utils.cache import SQLiteDatabase
+from app.utils.logger import get_logger
+import asyncio
+import json
+import time
+import uuid
+
+logger = get_logger()
+
+class BatchStore:
+    """批量任务和逐篇结果的持久化存储，任意 worker 都可以查询和读取结果"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS batch_jobs (
+        id TEXT PRIMARY KEY, status TEXT NOT NULL, total INTEGER NOT NULL,
+        created REAL NOT NULL, updated REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS batch_items (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, idx INTEGER NOT NULL,
+        status TEXT NOT NULL, line TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS batch_items_job ON batch_items (job_id, seq);
+    """
+
+    def __init__(self, path: str, ttl: int):
+        self.db = SQLiteDatabase(path, self.SCHEMA)
+        self.ttl = ttl
+
+    def create(self, job_id: str, total: int):
+        now = time.time()
+        with self.db.lock:
+            conn = self.db.connect()
+            # 顺带清理过期任务
+            expired = now - self.ttl
+            conn.execute("DELETE FROM batch_items WHERE job_id IN (SELECT id FROM batch_jobs WHERE updated < ?)", (expired,))
+            conn.execute("DELETE FROM batch_jobs WHERE updated < ?", (expired,))
+            conn.execute(
+                "INSERT INTO batch_jobs (id, status, total, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (job_id, BatchStatus.RUNNING.value, total, now, now)
+            )
+            conn.commit()
+
+    def set_status(self, job_id: str, status: BatchStatus):
+        with self.db.lock:
+            conn = self.db.connect()
+            conn.execute("UPDATE batch_jobs SET status = ?, updated = ? WHERE id = ?", (status.value, time.time(), job_id))
+            conn.commit()
+
+    def heartbeat(self, job_id: str):
+        """刷新运行中任务的心跳（updated），证明执行它的 worker 仍然存活"""
+        with self.db.lock:
+            conn = self.db.connect()
+            conn.execute(
+                "UPDATE batch_jobs SET updated = ? WHERE id = ? AND status = ?",
+                (time.time(), job_id, BatchStatus.RUNNING.value)
+            )
+            conn.commit()
+
+    def expire_stale(self) -> int:
+        """把心跳超时的运行中任务标记为 failed，返回标记的任务数
+
+        worker 被强制终止时来不及记录 interrupted，任务会一直停留在 running。
+        查询时 get_job 已按心跳判断，这里只在应用启动时把状态写回数据库
+        """
+        now = time.time()
+        with self.db.lock:
+            conn = self.db.connect()
+            count = conn.execute(
+                "UPDATE batch_jobs SET status = ?, updated = ? WHERE status = ? AND updated < ?",
+                (BatchStatus.FAILED.value, now, BatchStatus.RUNNING.value, now - settings.BATCH_LEASE_TIMEOUT)
+            ).rowcount
+            conn.commit()
+        if count:
+            logger.warning(f"{count} 个批量任务心跳超时，已标记为失败")
+        return count
+
+    def save_item(self, job_id: str, index: int, result: dict = None, error: str = None):
+        """保存单篇结果，每篇对应 NDJSON 输出中的一行"""
+        status = "failed" if error else "completed"
+        line = {"index": index, "status": status}
+        if error:
+            line["error"] = error
+        else:
+            line["result"] = result
+        with self.db.lock:
+            conn = self.db.connect()
+            conn.execute(
+                "INSERT INTO batch_items (job_id, idx, status, line) VALUES (?, ?, ?, ?)",
+                (job_id, index, status, json.dumps(line, ensure_ascii=False))
+            )
+            conn.execute("UPDATE batch_jobs SET updated = ? WHERE id = ?", (time.time(), job_id))
+            conn.commit()
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """只读查询：心跳超时的运行中任务按 failed 返回，数据库中的状态由启动时的 expire_stale 更新"""
+        with self.db.lock:
+            conn = self.db.connect()
+            row = conn.execute(
+                "SELECT status, total, created, updated FROM batch_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM batch_items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+        status, total, created, updated = row
+        if status == BatchStatus.RUNNING.value and updated < time.time() - settings.BATCH_LEASE_TIMEOUT:
+            status = BatchStatus.FAILED.value
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": total,
+            "completed": counts.get("completed", 0),
+            "failed": counts.get("failed", 0),
+            "created": created,
+            "updated": updated
+        }
+
+    def items_after(self, job_id: str, seq: int) -> List[tuple]:
+        """按完成顺序返回 seq 之后的结果行"""
+        with self.db.lock:
+            return self.db.connect().execute(
+                "SELECT seq, line FROM batch_items WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, seq)
+            ).fetchall()
+
+class BatchRunner:
+    """在当前 worker 中执行批量任务：提取和生成两级流水线，生成使用后台优先级"""
+
+    def __init__(self, store: BatchStore):
+        self.store = store
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(self, documents: List[DocumentAnalysisRequest], concurrency: int = None) -> str:
+        job_id = uuid.uuid4().hex
+        concurrency = min(concurrency or settings.BATCH_CONCURRENCY, settings.BATCH_CONCURRENCY)
+        self.store.create(job_id, len(documents))
+        task = asyncio.create_task(self._run(job_id, list(documents), concurrency))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        logger.info(f"批量任务 {job_id} 已提交: {len(documents)} 篇文档，并发 {concurrency}")
+        return job_id
+
+    async def _run(self, job_id: str, documents: list, concurrency: int):
+        # 生成第 N 篇时提前提取后续文档，队列长度限制提前提取的数量
+        ready = asyncio.Queue(maxsize=concurrency)
+
+        async def extract():
+            for index, request in enumerate(documents):
+                documents[index] = None  # 提取后释放原始内容
+                processor = MindMapProcessor(get_llm(priority=Priority.BACKGROUND))
+                try:
+                    text = await processor.extract_text(request)
+                except Exception as e:
+                    logger.error(f"批量任务 {job_id} 第 {index} 篇提取失败: {str(e)}")
+                    self.store.save_item(job_id, index, error=str(e))
+                    continue
+                await ready.put((index, request.mode, request.document_id, request.max_depth, processor, text))
+            for _ in range(concurrency):
+                await ready.put(None)
+
+        async def generate():
+            while (item := await ready.get()) is not None:
+                index, mode, document_id, max_depth, processor, text = item
+                await self._wait_for_capacity()
+                try:
+                    result = await processor.generate_document(text, mode, document_id, max_depth)
+                    self.store.save_item(job_id, index, result=result)
+                except Exception as e:
+                    logger.error(f"批量任务 {job_id} 第 {index} 篇生成失败: {str(e)}")
+                    self.store.save_item(job_id, index, error=str(e))
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            await asyncio.gather(extract(), *(generate() for _ in range(concurrency)))
+            self.store.set_status(job_id, BatchStatus.COMPLETED)
+            logger.info(f"批量任务 {job_id} 已完成")
+        except asyncio.CancelledError:
+            self.store.set_status(job_id, BatchStatus.INTERRUPTED)
+            raise
+        except Exception as e:
+            logger.error(f"批量任务 {job_id} 异常中止: {str(e)}")
+            self.store.set_status(job_id, BatchStatus.INTERRUPTED)
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(settings.BATCH_HEARTBEAT_INTERVAL)
+            try:
+                await asyncio.to_thread(self.store.heartbeat, job_id)
+            except Exception as e:
+                logger.warning(f"刷新批量任务 {job_id} 心跳失败: {str(e)}")
+
+    async def _wait_for_capacity(self):
+        """调度队列过半时暂停提交，为交互式请求保留排队名额"""
+        while llm_scheduler.queue_depth >= max(1, llm_scheduler.max_queue // 2):
+            await asyncio.sleep(llm_scheduler.retry_after())
+
+    async def iter_results(self, job_id: str, follow: bool = True, poll_interval: float = 0.5):
+        """以 NDJSON 输出已完成的结果，follow 时持续等待直到任务结束"""
+        seq = 0
+        while True:
+            # 先读取状态再读取结果，保证任务结束时不遗漏最后的结果
+            job = await asyncio.to_thread(self.store.get_job, job_id)
+            for seq, line in await asyncio.to_thread(self.store.items_after, job_id, seq):
+                yield line + "\n"
+            if not follow or job is None or job["status"] != BatchStatus.RUNNING.value:
+                return
+            await asyncio.sleep(poll_interval)
+
+    async def shutdown(self):
+        """取消本 worker 中未完成的任务，状态记为 interrupted"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+batch_runner = BatchRunner(BatchStore(settings.BATCH_DB_PATH, ttl=settings.BATCH_RESULT_TTL))
@@ -1,72 +1,129 @@
-from langchain.prompts import PromptTemplate
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from app.core.models.llm import get_llm
-from app.core.mindmap.prompts import MindMapPrompts
+from app.core.models.llm import get_llm, get_llm_identity
+from app.core.mindmap.prompts import CHUNK_SUMMARY_PROMPT, DETAILS_PROMPT, MINDMAP_PROMPT, STRUCTURE_PROMPT, CompiledPrompt
+from app.core.models.token_budget import TokenBudget
+from app.core.models.scheduler import Priority, with_priority
 from app.utils.logger import get_logger
-from app.utils.cache import cache
-from app.config import settings
+from app.utils.cache import cache, make_cache_key, result_cache
+from app.utils.metrics import StageTimer
+from app.config.settings import settings
 import json
 import asyncio
-from typing import Dict, List
-from langchain.output_parsers import ResponseSchema, StructuredOutputParser
+import hashlib
+import re
+import time
+import zlib
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
 
 logger = get_logger()
 
+class JsonFormats(NamedTuple):
+    mindmap_parser: object
+    details_parser: object
+    mindmap_prompt: CompiledPrompt
+    details_prompt: CompiledPrompt
+
+@lru_cache(maxsize=None)
+def json_formats() -> JsonFormats:
+    """输出格式解析器和对应的提示词，首次使用时构建一次
+
+    langchain 的 output_parsers 导入较慢，不在应用启动时加载（后台预热任务会提前调用）
+    """
+    from langchain.output_parsers import ResponseSchema, StructuredOutputParser
+
+    mindmap_parser = StructuredOutputParser.from_response_schemas([
+        ResponseSchema(
+            name="id",
+            description="节点的唯一标识符",
+            type="string"
+        ),
+        ResponseSchema(
+            name="label",
+            description="节点的显示文本",
+            type="string"
+        ),
+        ResponseSchema(
+            name="children",
+            description="子节点数组",
+            type="array"
+        )
+    ])
+    details_parser = StructuredOutputParser.from_response_schemas([
+        ResponseSchema(
+            name="children",
+            description="包含2-4个要点的数组，每个要点都有id和label字段",
+            type="array"
+        )
+    ])
+    return JsonFormats(
+        mindmap_parser,
+        details_parser,
+        MINDMAP_PROMPT.extend(mindmap_parser.get_format_instructions()),
+        DETAILS_PROMPT.extend(details_parser.get_format_instructions())
+    )
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+def _bigrams(label: str) -> set:
+    label = _NON_WORD.sub("", label.lower())
+    return {label[i:i + 2] for i in range(len(label) - 1)} or {label}
+
 class MindMapChain:
     def __init__(self, llm=None):
         """初始化思维导图生成链"""
         self.llm = llm or get_llm()
-        
-        # 使用默认值，避免配置缺失时的错误
-        chunk_size = getattr(settings, 'CHUNK_SIZE', 3000)
-        chunk_overlap = getattr(settings, 'CHUNK_OVERLAP', 200)
-        
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", "。", "！", "？", "，", " ", ""]
-        )
+        # 长文档分块任务优先级低于交互式请求
+        self.background_llm = with_priority(self.llm, Priority.BACKGROUND)
+        self.timer = StageTimer()
 
-        # 定义输出格式
-        self.mindmap_response_schemas = [
-            ResponseSchema(
-                name="id",
-                description="节点的唯一标识符",
-                type="string"
-            ),
-            ResponseSchema(
-                name="label",
-                description="节点的显示文本",
-                type="string"
-            ),
-            ResponseSchema(
-                name="children",
-                description="子节点数组",
-                type="array"
-            )
-        ]
-        
-        self.details_response_schemas = [
-            ResponseSchema(
-                name="children",
-                description="包含2-4个要点的数组，每个要点都有id和label字段",
-                type="array"
+        # 按模型上下文窗口和真实 token 数分块
+        model, _ = get_llm_identity(self.llm)
+        self.budget = TokenBudget(model)
+        self.chunk_tokens = min(
+            settings.CHUNK_TOKENS,
+            self.budget.input_budget(CHUNK_SUMMARY_PROMPT.template)
+        ) or settings.CHUNK_TOKENS
+
+        self._text_splitter = None
+        # 最近一次长文本处理复用已有结果的情况
+        self.reuse: Dict[str, object] = {}
+
+    @property
+    def text_splitter(self):
+        """切分超长段落的递归切分器，只有段落超过分块大小时才创建"""
+        if self._text_splitter is None:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            self._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_tokens,
+                chunk_overlap=min(settings.CHUNK_OVERLAP, self.chunk_tokens // 10),
+                length_function=self.budget.count,
+                separators=["\n\n", "\n", "。", "！", "？", "，", " ", ""]
             )
-        ]
-        
-        self.mindmap_parser = StructuredOutputParser.from_response_schemas(self.mindmap_response_schemas)
-        self.details_parser = StructuredOutputParser.from_response_schemas(self.details_response_schemas)
+        return self._text_splitter
+
+    @property
+    def mindmap_parser(self):
+        return json_formats().mindmap_parser
+
+    @property
+    def details_parser(self):
+        return json_formats().details_parser
 
     async def process_text(self, text: str, is_summary: bool = False) -> dict:
         """处理文本并生成思维导图"""
         try:
-            cache_key = f"mindmap:{hash(text)}"
+            model, temperature = get_llm_identity(self.llm)
+            cache_key = make_cache_key(
+                text, model, temperature,
+                namespace="chain-summary" if is_summary else "chain"
+            )
             if cached := cache.get(cache_key):
                 return cached
 
+            budget = self.budget.input_budget(json_formats().mindmap_prompt.template)
             mindmap = (
-                await self._generate_mindmap(text[:3000]) if is_summary or len(text) <= 3000
+                await self._generate_mindmap(self.budget.truncate(text, budget))
+                if is_summary or self.budget.count(text) <= budget
                 else await self._process_long_text(text)
             )
 
@@ -80,25 +137,120 @@ class MindMapChain:
     async def _process_long_text(self, text: str) -> dict:
         """处理长文本"""
         try:
-            chunks = self._split_text(text)
-            summaries = await self._generate_chunk_summaries(chunks)
-            structure = await self._generate_global_structure(summaries)
-            return await self._fill_details(structure, chunks)
+            structure = None
+            async for type, data in self.process_long_text_stream(text):
+                if type == "result":
+                    structure = data
+            return structure or self._get_error_response("处理失败")
         except Exception as e:
             logger.error(f"处理长文本失败: {str(e)}")
             return self._get_error_response("处理失败")
 
+    async def process_long_text_stream(self, text: str, document_id: str = None) -> AsyncIterator[Tuple[str, dict]]:
+        """流式 map-reduce：并发总结分块、归纳全局结构、并行填充细节
+
+        产生 progress 事件报告每个阶段的进度，最后产生一个 result 事件携带完整的树。
+        分块总结和分支细节按内容哈希缓存；传入 document_id 时与该文档上次的分块对比，
+        变化较少则沿用上次的全局结构，只有引用了变化分块的分支重新生成。
+        """
+        start_time = time.time()
+        with self.timer.stage("chain_split"):
+            chunks = self._split_text(text)
+        hashes = [self._chunk_hash(chunk) for chunk in chunks]
+
+        manifest = self._load_manifest(document_id)
+        previous = set(manifest["chunks"]) if manifest else set()
+        changed = [i for i, digest in enumerate(hashes) if digest not in previous]
+        self.reuse = {"chunks": len(chunks), "chunks_reused": 0, "branches": 0, "branches_reused": 0,
+                      "structure_reused": False}
+        yield ("progress", {
+            "stage": "split",
+            "completed": 0,
+            "total": len(chunks),
+            "changed": len(changed) if manifest else None
+        })
+
+        stage_started = time.perf_counter()
+        summaries = [""] * len(chunks)
+        async for index, summary, completed, cached in self._iter_chunk_summaries(chunks):
+            summaries[index] = summary
+            self.reuse["chunks_reused"] += cached
+            elapsed = time.time() - start_time
+            yield ("progress", {
+                "stage": "map",
+                "chunk": index,
+                "cached": cached,
+                "completed": completed,
+                "total": len(chunks),
+                "elapsed": round(elapsed, 2),
+                "chunks_per_second": round(completed / elapsed, 2) if elapsed else None
+            })
+
+        self.timer.record("chain_map", time.perf_counter() - stage_started)
+
+        # 只改动了少数分块时沿用上次的分支划分（保留节点 id），否则重新归纳
+        if manifest and len(changed) <= len(chunks) * settings.INCREMENTAL_RESTRUCTURE_RATIO:
+            structure = json.loads(json.dumps(manifest["structure"]))
+            self.reuse["structure_reused"] = True
+        else:
+            with self.timer.stage("chain_reduce"):
+                structure = await self._generate_global_structure([s for s in summaries if s])
+        branches = len(structure.get("children", []))
+        self.reuse["branches"] = branches
+        yield ("progress", {"stage": "reduce", "completed": 0, "total": branches})
+
+        stage_started = time.perf_counter()
+        async for completed, cached in self._iter_fill_details(structure, summaries, hashes):
+            self.reuse["branches_reused"] += cached
+            yield ("progress", {
+                "stage": "details",
+                "cached": cached,
+                "completed": completed,
+                "total": branches,
+                "elapsed": round(time.time() - start_time, 2)
+            })
+        self.timer.record("chain_details", time.perf_counter() - stage_started)
+
+        if structure.get("children"):
+            self._save_manifest(document_id, hashes, structure)
+        yield ("result", structure)
+
+    def _cache_key(self, text: str, namespace: str) -> str:
+        model, temperature = get_llm_identity(self.llm)
+        return make_cache_key(text, model, temperature, namespace=namespace)
+
+    @staticmethod
+    def _chunk_hash(chunk: str) -> str:
+        return hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:32]
+
+    def _load_manifest(self, document_id: Optional[str]) -> Optional[dict]:
+        """读取文档上次生成时的分块哈希和分支划分"""
+        if not document_id:
+            return None
+        manifest = result_cache.get(self._cache_key(document_id, "manifest"))
+        if manifest and manifest.get("structure", {}).get("children"):
+            return manifest
+        return None
+
+    def _save_manifest(self, document_id: Optional[str], hashes: List[str], structure: dict):
+        if not document_id:
+            return
+        result_cache.set(self._cache_key(document_id, "manifest"), {
+            "chunks": hashes,
+            "structure": {
+                "id": structure["id"],
+                "label": structure["label"],
+                "children": [
+                    {"id": node["id"], "label": node["label"], "children": []}
+                    for node in structure.get("children", [])
+                ]
+            }
+        })
+
     async def _generate_mindmap(self, text: str) -> dict:
         """生成简单的思维导图"""
         try:
-            format_instructions = self.mindmap_parser.get_format_instructions()
-            response = await self.llm.ainvoke(
-                PromptTemplate(
-                    template=MindMapPrompts.get_mindmap_template() + "\n{format_instructions}",
-                    input_variables=["text"],
-                    partial_variables={"format_instructions": format_instructions}
-                ).format(text=text)
-            )
+            response = await self.llm.ainvoke(json_formats().mindmap_prompt.messages(text=text))
             return self._validate_node_format(self.mindmap_parser.parse(response.content))
         except Exception as e:
             logger.error(f"生成思维导图失败: {str(e)}")
@@ -107,31 +259,46 @@ class MindMapChain:
     async def _generate_chunk_summaries(self, chunks: List[str]) -> List[str]:
         """为每个文本块生成总结"""
         try:
-            tasks = [
-                self.llm.ainvoke(
-                    PromptTemplate(
-                        template=MindMapPrompts.get_chunk_summary_template(),
-                        input_variables=["text"]
-                    ).format(text=chunk)
-                )
-                for chunk in chunks
-            ]
-            responses = await asyncio.gather(*tasks)
-            return [resp.content for resp in responses]
+            summaries = [""] * len(chunks)
+            async for index, summary, _, _ in self._iter_chunk_summaries(chunks):
+                summaries[index] = summary
+            return summaries
         except Exception as e:
             logger.error(f"生成块总结失败: {str(e)}")
             return []
 
+    async def _iter_chunk_summaries(self, chunks: List[str]) -> AsyncIterator[Tuple[int, str, int, bool]]:
+        """在单文档并发上限内总结所有文本块，按完成顺序产生 (序号, 总结, 已完成数, 是否来自缓存)"""
+        semaphore = asyncio.Semaphore(max(1, settings.CHUNK_BATCH_SIZE))
+
+        async def summarize(index: int, chunk: str) -> Tuple[int, str, bool]:
+            cache_key = self._cache_key(chunk, "chunk")
+            if cached := result_cache.get(cache_key):
+                return index, cached, True
+            async with semaphore:
+                try:
+                    response = await self.background_llm.ainvoke(CHUNK_SUMMARY_PROMPT.messages(text=chunk))
+                except Exception as e:
+                    logger.error(f"总结第 {index} 块失败: {str(e)}")
+                    return index, "", False
+            if response.content:
+                result_cache.set(cache_key, response.content)
+            return index, response.content, False
+
+        tasks = [asyncio.create_task(summarize(i, chunk)) for i, chunk in enumerate(chunks)]
+        try:
+            for completed, future in enumerate(asyncio.as_completed(tasks), 1):
+                index, summary, cached = await future
+                yield index, summary, completed, cached
+        finally:
+            for task in tasks:
+                task.cancel()
+
     async def _generate_global_structure(self, summaries: List[str]) -> dict:
         """生成全局结构"""
         try:
-            response = await self.llm.ainvoke(
-                PromptTemplate(
-                    template=MindMapPrompts.get_structure_template(),
-                    input_variables=["text"]
-                ).format(text="\n\n".join(summaries))
-            )
-            return self._validate_node_format(json.loads(response.content))
+            response = await self.llm.ainvoke(STRUCTURE_PROMPT.messages(text="\n\n".join(summaries)))
+            return self._validate_node_format(self._parse_json(response.content))
         except Exception as e:
             logger.error(f"生成全局结构失败: {str(e)}")
             return self._get_error_response("结构生成失败")
@@ -139,46 +306,127 @@ class MindMapChain:
     async def _fill_details(self, structure: dict, chunks: List[str]) -> dict:
         """填充结构细节"""
         try:
-            text = "\n\n".join(chunks)
-            format_instructions = self.details_parser.get_format_instructions()
-            
-            for node in structure.get("children", []):
-                try:
-                    response = await self.llm.ainvoke(
-                        PromptTemplate(
-                            template=MindMapPrompts.get_details_template() + "\n{format_instructions}",
-                            input_variables=["text", "topic", "category"],
-                            partial_variables={"format_instructions": format_instructions}
-                        ).format(
-                            text=text,
-                            topic=structure["label"],
-                            category=node["label"]
-                        )
-                    )
-                    details = self.details_parser.parse(response.content)
-                    node["children"] = details.get("children", [])
-                except Exception:
-                    node["children"] = []
+            async for _ in self._iter_fill_details(structure, chunks):
+                pass
             return structure
         except Exception as e:
             logger.error(f"填充细节失败: {str(e)}")
             return structure
 
+    async def _iter_fill_details(
+        self,
+        structure: dict,
+        summaries: List[str],
+        hashes: List[str] = None
+    ) -> AsyncIterator[Tuple[int, bool]]:
+        """并行为每个一级分支填充细节，每完成一个分支产生一次 (已完成数, 是否来自缓存)
+
+        每个分支只参考与其标签最相关的分块总结，缓存键由主题、分支和这些分块的哈希组成，
+        分块未变化的分支直接复用上次的子树。
+        """
+        hashes = hashes or [self._chunk_hash(summary) for summary in summaries]
+        semaphore = asyncio.Semaphore(max(1, settings.CHUNK_BATCH_SIZE))
+
+        async def fill(node: dict) -> bool:
+            sources = self._branch_sources(node["label"], summaries)
+            cache_key = self._cache_key(
+                "\x1f".join([structure["label"], node["id"], node["label"], *(hashes[i] for i in sources)]),
+                "branch"
+            )
+            if (cached := result_cache.get(cache_key)) is not None:
+                node["children"] = cached
+                return True
+            async with semaphore:
+                try:
+                    response = await self.background_llm.ainvoke(json_formats().details_prompt.messages(
+                        text="\n\n".join(summaries[i] for i in sources),
+                        topic=structure["label"],
+                        category=node["label"]
+                    ))
+                    details = self.details_parser.parse(response.content)
+                    node["children"] = self._assign_ids(node["id"], [
+                        self._validate_node_format(child)
+                        for child in details.get("children", [])
+                    ])
+                except Exception:
+                    node["children"] = []
+            if node["children"]:
+                result_cache.set(cache_key, node["children"])
+            return False
+
+        tasks = [asyncio.create_task(fill(node)) for node in structure.get("children", [])]
+        try:
+            for completed, future in enumerate(asyncio.as_completed(tasks), 1):
+                cached = await future
+                yield completed, cached
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _branch_sources(self, label: str, summaries: List[str]) -> List[int]:
+        """按分支标签的字符二元组命中数选出最相关的分块总结，保持原文顺序"""
+        candidates = [i for i, summary in enumerate(summaries) if summary]
+        limit = settings.DETAIL_SOURCE_CHUNKS
+        if limit <= 0 or len(candidates) <= limit:
+            return candidates
+        grams = _bigrams(label)
+        scores = {i: sum(gram in summaries[i] for gram in grams) for i in candidates}
+        return sorted(sorted(candidates, key=lambda i: -scores[i])[:limit])
+
+    @classmethod
+    def _assign_ids(cls, prefix: str, children: List[dict]) -> List[dict]:
+        """按分支 id 和位置重新编号，不同分支的细节节点 id 不会冲突，复用的子树 id 保持不变"""
+        for index, child in enumerate(children, 1):
+            child["id"] = f"{prefix}-{index}"
+            cls._assign_ids(child["id"], child.get("children", []))
+        return children
+
     def _split_text(self, text: str) -> List[str]:
-        """分割文本"""
-        if len(text) <= 3000:
+        """分割文本（按内容确定边界，编辑某一段只影响它所在的分块）"""
+        if self.budget.count(text) <= self.chunk_tokens:
             return [text]
-        chunks = self.text_splitter.split_text(text)
-        return self._merge_small_chunks(chunks)
+        return self._merge_small_chunks(self._content_defined_chunks(text))
+
+    def _content_defined_chunks(self, text: str) -> List[str]:
+        """按段落累积分块：达到最小长度后在哈希命中的段落结尾切分，超过上限时强制切分
+
+        段落是否为切分点只取决于它自身的内容（命中概率与其 token 数成正比，平均每半个分块一次），
+        插入或修改一段后，后续分块会在下一个切分点重新对齐
+        """
+        pieces = []
+        for paragraph in text.split("\n\n"):
+            if not paragraph.strip():
+                continue
+            if self.budget.count(paragraph) > self.chunk_tokens:
+                pieces.extend(self.text_splitter.split_text(paragraph))
+            else:
+                pieces.append(paragraph)
+
+        chunks, current, size = [], [], 0
+        min_tokens = self.chunk_tokens // 4
+        span = max(1, self.chunk_tokens // 2)
+        for piece in pieces:
+            tokens = self.budget.count(piece)
+            if current and size + tokens > self.chunk_tokens:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += tokens
+            if size >= min_tokens and zlib.crc32(piece.encode("utf-8")) % span < tokens:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+        if current:
+            chunks.append("\n\n".join(current))
+        return chunks
 
-    def _merge_small_chunks(self, chunks: List[str], min_size: int = 1000) -> List[str]:
-        """合并小文本块"""
+    def _merge_small_chunks(self, chunks: List[str], min_size: int = 500) -> List[str]:
+        """合并小文本块（min_size 为 token 数）"""
         if not chunks:
             return chunks
         merged = []
         current = chunks[0]
         for chunk in chunks[1:]:
-            if len(current) + len(chunk) < min_size:
+            if self.budget.count(current) + self.budget.count(chunk) < min_size:
                 current += "\n" + chunk
             else:
                 merged.append(current)
@@ -201,6 +449,22 @@ class MindMapChain:
         ]
         return node
 
+    def _parse_json(self, content: str) -> dict:
+        """解析 LLM 返回的 JSON，兼容 ```json 代码块"""
+        match = re.search(r"```(?:json)?\s*(.*?)```", content, re.S)
+        return json.loads(match.group(1) if match else content)
+
+    @classmethod
+    def to_markdown(cls, node: dict, depth: int = 1) -> str:
+        """将节点树转换为 Markdown 思维导图（前三级为标题，更深层为列表项）"""
+        if depth <= 3:
+            lines = [f"{'#' * depth} {node.get('label', '')}"]
+        else:
+            lines = [f"{'  ' * (depth - 4)}- {node.get('label', '')}"]
+        for child in node.get("children", []):
+            lines.append(cls.to_markdown(child, depth + 1))
+        return "\n".join(lines)
+
     def _get_error_response(self, message: str) -> dict:
         """生成错误响应"""
         return {
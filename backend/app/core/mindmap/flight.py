@@ -0,0 +1,199 @@
+import asyncio
+import uuid
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from app.config.settings import settings
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+Event = Tuple[str, dict]
+
+# 订阅者落后时可以合并的流式片段事件
+_PARTIAL_EVENTS = ("reasoning", "generating")
+
+class Flight:
+    """一次正在进行的生成任务，记录已产生的事件供后加入或重连的订阅者回放
+
+    事件按 seq 从 1 开始编号。日志超过 max_events 时丢弃最早的事件，丢弃的内容合并进快照，
+    落后到快照之前的订阅者先收到一条 snapshot 事件，再接收之后的事件。
+    """
+
+    def __init__(self, key: str, max_events: int = None):
+        self.key = key
+        self.token = uuid.uuid4().hex[:12]
+        self.max_events = max_events or settings.STREAM_EVENT_LOG_SIZE
+        self.events: List[Event] = []
+        self.base = 0  # 已丢弃的事件数，events[i] 的 seq 为 base + i + 1
+        self.snapshot = {"data": [], "reasoning": [], "nodes": []}
+        self.done = False
+        self.subscribers = 0
+        self.task: asyncio.Task = None
+        self.expiry: asyncio.TimerHandle = None
+        self._updated = asyncio.Event()
+
+    def publish(self, event: Event):
+        self.events.append(event)
+        if len(self.events) > self.max_events:
+            self._trim(len(self.events) - self.max_events // 2)
+        self._notify()
+
+    def finish(self):
+        self.done = True
+        self._notify()
+
+    def _notify(self):
+        # 唤醒当前所有等待者，后续等待者使用新的 Event
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def _trim(self, count: int):
+        """丢弃最早的 count 个事件，并把其中的内容合并进快照"""
+        for type, data in self.events[:count]:
+            if type == "generating":
+                self.snapshot["data"].append(data["partial"])
+            elif type == "reasoning":
+                self.snapshot["reasoning"].append(data["partial"])
+            elif type == "node_added":
+                self.snapshot["nodes"].append(data)
+        del self.events[:count]
+        self.base += count
+
+    def _snapshot_event(self) -> Event:
+        return ("snapshot", {
+            "data": "".join(self.snapshot["data"]),
+            "reasoning": "".join(self.snapshot["reasoning"]),
+            "nodes": list(self.snapshot["nodes"])
+        })
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.token}.{seq}"
+
+    async def subscribe(self, after: int = 0) -> AsyncIterator[Tuple[Optional[int], Event]]:
+        """回放 seq 大于 after 的事件，再持续接收新事件，产生 (seq, 事件)
+
+        客户端连接较慢时订阅者会落后于生成进度，此时把积压的片段合并成一条消息发送，
+        积压越多合并得越多，减少慢连接上的消息数量和序列化开销。合并后的多条消息中
+        只有最后一条带 seq，其余为 None。
+        """
+        next_seq = after + 1
+        while True:
+            updated = self._updated
+            if next_seq <= self.base:
+                # 需要的事件已被丢弃，用快照代替（客户端以快照替换已有内容）
+                next_seq = self.base + 1
+                yield self.base, self._snapshot_event()
+            while next_seq - self.base - 1 < len(self.events):
+                batch, end = self._coalesce(next_seq - self.base - 1)
+                next_seq = self.base + end + 1
+                for i, event in enumerate(batch):
+                    yield (next_seq - 1 if i == len(batch) - 1 else None), event
+            if self.done:
+                return
+            await updated.wait()
+
+    def _coalesce(self, index: int) -> Tuple[List[Event], int]:
+        """合并从 index 开始积压的片段事件，node_added 保持原有顺序"""
+        if index + 1 >= len(self.events):
+            return [self.events[index]], index + 1
+
+        partials = {type: [] for type in _PARTIAL_EVENTS}
+        nodes = []
+        end = index
+        while end < len(self.events):
+            type, data = self.events[end]
+            if type in partials:
+                partials[type].append(data["partial"])
+            elif type == "node_added":
+                nodes.append(self.events[end])
+            else:
+                break
+            end += 1
+
+        if end == index:
+            return [self.events[index]], index + 1
+
+        batch = [
+            (type, {"partial": "".join(parts)})
+            for type, parts in partials.items() if parts
+        ]
+        return batch + nodes, end
+
+class FlightGroup:
+    """相同输入的并发请求合并为一次生成（single-flight），断线重连的请求从断点继续接收"""
+
+    def __init__(self, grace_period: float = None):
+        self.grace_period = settings.STREAM_GRACE_PERIOD if grace_period is None else grace_period
+        self.flights: Dict[str, Flight] = {}
+        self.tokens: Dict[str, Flight] = {}
+
+    async def run(self, key: str, producer: Callable[[], AsyncIterator[Event]]) -> AsyncIterator[Tuple[Optional[str], Event]]:
+        """订阅 key 对应的生成任务，不存在时由 producer 启动一个新任务，产生 (事件 id, 事件)"""
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = Flight(key)
+            self.flights[key] = flight
+            self.tokens[flight.token] = flight
+            flight.task = asyncio.create_task(self._drive(flight, producer))
+        else:
+            logger.info(f"合并相同请求: {key}，当前订阅者 {flight.subscribers}")
+
+        async for event in self._subscribe(flight):
+            yield event
+
+    def find(self, event_id: Optional[str]) -> Optional[Tuple[Flight, int]]:
+        """根据 Last-Event-ID 查找仍在进行的生成任务，返回 (任务, seq)"""
+        token, _, seq = (event_id or "").partition(".")
+        flight = self.tokens.get(token)
+        if flight is None or not seq.isdigit():
+            return None
+        return flight, int(seq)
+
+    async def resume(self, flight: Flight, seq: int) -> AsyncIterator[Tuple[Optional[str], Event]]:
+        """从 seq 之后继续接收 find 返回的任务
+
+        直接订阅任务对象：查找之后任务即使已结束并从分组中移除，仍能回放剩余的事件
+        """
+        logger.info(f"断线重连: {flight.key}，从 {seq} 继续")
+        async for event in self._subscribe(flight, seq):
+            yield event
+
+    async def _subscribe(self, flight: Flight, after: int = 0):
+        flight.subscribers += 1
+        if flight.expiry is not None:
+            flight.expiry.cancel()
+            flight.expiry = None
+        try:
+            async for seq, event in flight.subscribe(after):
+                yield (flight.event_id(seq) if seq is not None else None), event
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                self._release(flight)
+
+    def _release(self, flight: Flight):
+        """所有订阅者断开后保留一段时间等待重连，生成完成的结果仍会写入缓存"""
+        if self.grace_period <= 0:
+            flight.task.cancel()
+            return
+        logger.info(f"所有订阅者已断开: {flight.key}，{self.grace_period} 秒内无人重连将停止生成")
+        flight.expiry = asyncio.get_running_loop().call_later(self.grace_period, flight.task.cancel)
+
+    async def _drive(self, flight: Flight, producer: Callable[[], AsyncIterator[Event]]):
+        try:
+            async for event in producer():
+                flight.publish(event)
+        except asyncio.CancelledError:
+            logger.info(f"生成任务已取消: {flight.key}")
+        except Exception as e:
+            logger.error(f"生成任务失败: {str(e)}")
+            flight.publish(("error", {"message": str(e)}))
+        finally:
+            flight.finish()
+            if flight.expiry is not None:
+                flight.expiry.cancel()
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+            self.tokens.pop(flight.token, None)
+
+# 进程内共享的 single-flight 分组
+inflight = FlightGroup()
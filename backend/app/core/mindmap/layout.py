@@ -0,0 +1,247 @@
+from array import array
+from typing import List, Optional
+import re
+
+# 与前端节点样式一致：根节点、一级分支、其余节点的字号和节点高度
+_FONT_SIZES = (16, 14, 12)
+_NODE_HEIGHTS = (40, 35, 30)
+_NODE_PADDING = 24
+_NARROW_CHAR_RATIO = 0.6  # 半角字符宽度约为字号的 0.6 倍，全角字符等于字号
+
+_WIDE = re.compile(r"[ᄀ-ᅟ⺀-꓏가-힣豈-﫿︰-﹏＀-｠￠-￦]")
+
+class CompactTree:
+    """数组存储的树：节点按先序编号，记录父节点、深度和标签在拼接字符串中的偏移
+
+    千级节点的树只占几个连续数组，遍历时不需要递归访问嵌套字典
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.parent = array("i")
+        self.depth = array("i")
+        self.label_offsets = array("i", [0])
+        self.labels = ""
+
+    @classmethod
+    def from_dict(cls, root: dict, max_nodes: Optional[int] = None) -> "CompactTree":
+        tree = cls()
+        labels = []
+        offset = 0
+        stack = [(root, -1, 0)]
+        while stack:
+            node, parent, depth = stack.pop()
+            if not isinstance(node, dict):
+                raise ValueError("节点必须是对象")
+            label = str(node.get("label", ""))
+            tree.ids.append(str(node.get("id", len(tree.ids))))
+            tree.parent.append(parent)
+            tree.depth.append(depth)
+            labels.append(label)
+            offset += len(label)
+            tree.label_offsets.append(offset)
+            index = len(tree.ids) - 1
+            if max_nodes and index >= max_nodes:
+                raise ValueError(f"节点数超过上限 {max_nodes}")
+            children = node.get("children") or []
+            if not isinstance(children, list):
+                raise ValueError("children 必须是节点列表")
+            # 逆序入栈，出栈时按原顺序得到先序编号
+            for child in reversed(children):
+                stack.append((child, index, depth + 1))
+        tree.labels = "".join(labels)
+        return tree
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def label(self, index: int) -> str:
+        return self.labels[self.label_offsets[index]:self.label_offsets[index + 1]]
+
+    def children(self) -> List[List[int]]:
+        """每个节点的子节点下标（按原顺序）"""
+        children = [[] for _ in range(len(self))]
+        for index in range(1, len(self)):
+            children[self.parent[index]].append(index)
+        return children
+
+def node_size(label: str, depth: int) -> tuple:
+    """按标签宽度估算节点尺寸 (宽, 高)"""
+    level = min(depth, len(_FONT_SIZES) - 1)
+    font_size = _FONT_SIZES[level]
+    wide = _WIDE.subn("", label)[1]
+    width = (wide + (len(label) - wide) * _NARROW_CHAR_RATIO) * font_size + _NODE_PADDING
+    return width, _NODE_HEIGHTS[level]
+
+class _TidyLayout:
+    """Buchheim 线性时间的 Reingold–Tilford 布局，沿纵向排列兄弟节点，节点高度可以不同"""
+
+    def __init__(self, tree: CompactTree, heights: List[float], gap: float):
+        size = len(tree)
+        self.parent = tree.parent
+        self.children = tree.children()
+        self.heights = heights
+        self.gap = gap
+        self.prelim = [0.0] * size
+        self.mod = [0.0] * size
+        self.shift = [0.0] * size
+        self.change = [0.0] * size
+        self.thread = [-1] * size
+        self.ancestor = list(range(size))
+        self.number = [0] * size  # 在兄弟节点中的序号
+        self.left_sibling = [-1] * size
+        self.default_ancestor = [-1] * size
+        for children in self.children:
+            for number, child in enumerate(children):
+                self.number[child] = number
+                if number:
+                    self.left_sibling[child] = children[number - 1]
+
+    def _separation(self, upper: int, lower: int) -> float:
+        return (self.heights[upper] + self.heights[lower]) / 2 + self.gap
+
+    def _next_upper(self, v: int) -> int:
+        children = self.children[v]
+        return children[0] if children else self.thread[v]
+
+    def _next_lower(self, v: int) -> int:
+        children = self.children[v]
+        return children[-1] if children else self.thread[v]
+
+    def run(self) -> List[float]:
+        """返回每个节点中心的纵坐标"""
+        for v in self._postorder():
+            self._first_walk(v)
+        y = [0.0] * len(self.prelim)
+        offset = [0.0] * len(self.prelim)
+        # 先序编号保证父节点先于子节点
+        for v in range(len(self.prelim)):
+            y[v] = self.prelim[v] + offset[v]
+            for child in self.children[v]:
+                offset[child] = offset[v] + self.mod[v]
+        return y
+
+    def _postorder(self):
+        stack = [(0, False)]
+        while stack:
+            v, expanded = stack.pop()
+            if expanded:
+                yield v
+                continue
+            stack.append((v, True))
+            stack.extend((child, False) for child in reversed(self.children[v]))
+
+    def _first_walk(self, v: int):
+        """子树已经完成布局后确定 v 的初始位置，并与左侧（上方）的兄弟子树分开"""
+        children = self.children[v]
+        sibling = self.left_sibling[v]
+        if children:
+            self._execute_shifts(v)
+            midpoint = (self.prelim[children[0]] + self.prelim[children[-1]]) / 2
+            if sibling >= 0:
+                self.prelim[v] = self.prelim[sibling] + self._separation(sibling, v)
+                self.mod[v] = self.prelim[v] - midpoint
+            else:
+                self.prelim[v] = midpoint
+        elif sibling >= 0:
+            self.prelim[v] = self.prelim[sibling] + self._separation(sibling, v)
+
+        parent = self.parent[v]
+        if parent >= 0:
+            if sibling < 0:
+                self.default_ancestor[parent] = v
+            self.default_ancestor[parent] = self._apportion(v, self.default_ancestor[parent])
+
+    def _apportion(self, v: int, default_ancestor: int) -> int:
+        sibling = self.left_sibling[v]
+        if sibling < 0:
+            return default_ancestor
+        prelim, mod = self.prelim, self.mod
+        # i 表示内侧轮廓，o 表示外侧轮廓；u 为上方的子树，l 为 v 所在的子树
+        v_il, v_ol = v, v
+        v_iu, v_ou = sibling, self.children[self.parent[v]][0]
+        s_il, s_ol, s_iu, s_ou = mod[v_il], mod[v_ol], mod[v_iu], mod[v_ou]
+        while True:
+            next_iu, next_il = self._next_lower(v_iu), self._next_upper(v_il)
+            if next_iu < 0 or next_il < 0:
+                break
+            v_iu, v_il = next_iu, next_il
+            v_ou, v_ol = self._next_upper(v_ou), self._next_lower(v_ol)
+            self.ancestor[v_ol] = v
+            shift = (prelim[v_iu] + s_iu) - (prelim[v_il] + s_il) + self._separation(v_iu, v_il)
+            if shift > 0:
+                self._move_subtree(self._ancestor(v_iu, v, default_ancestor), v, shift)
+                s_il += shift
+                s_ol += shift
+            s_iu += mod[v_iu]
+            s_il += mod[v_il]
+            s_ou += mod[v_ou]
+            s_ol += mod[v_ol]
+
+        next_iu = self._next_lower(v_iu)
+        if next_iu >= 0 and self._next_lower(v_ol) < 0:
+            self.thread[v_ol] = next_iu
+            mod[v_ol] += s_iu - s_ol
+        next_il = self._next_upper(v_il)
+        if next_il >= 0 and self._next_upper(v_ou) < 0:
+            self.thread[v_ou] = next_il
+            mod[v_ou] += s_il - s_ou
+            default_ancestor = v
+        return default_ancestor
+
+    def _ancestor(self, v_iu: int, v: int, default_ancestor: int) -> int:
+        candidate = self.ancestor[v_iu]
+        return candidate if self.parent[candidate] == self.parent[v] else default_ancestor
+
+    def _move_subtree(self, upper: int, lower: int, shift: float):
+        subtrees = self.number[lower] - self.number[upper]
+        self.change[lower] -= shift / subtrees
+        self.shift[lower] += shift
+        self.change[upper] += shift / subtrees
+        self.prelim[lower] += shift
+        self.mod[lower] += shift
+
+    def _execute_shifts(self, v: int):
+        shift = change = 0.0
+        for child in reversed(self.children[v]):
+            self.prelim[child] += shift
+            self.mod[child] += shift
+            change += self.change[child]
+            shift += self.shift[child] + change
+
+def layout_tree(root: dict, h_gap: float = 80, v_gap: float = 20, max_nodes: Optional[int] = None) -> dict:
+    """计算从左到右展开的整齐树布局，返回可直接渲染的几何信息
+
+    同一深度的节点对齐为一列，列宽取该层最宽的节点；兄弟子树之间至少相隔 v_gap。
+    节点坐标为左上角，画布从 (0, 0) 开始
+    """
+    tree = CompactTree.from_dict(root, max_nodes)
+    sizes = [node_size(tree.label(i), tree.depth[i]) for i in range(len(tree))]
+    heights = [height for _, height in sizes]
+    centers = _TidyLayout(tree, heights, v_gap).run()
+
+    column_widths = [0.0] * (max(tree.depth) + 1)
+    for (width, _), depth in zip(sizes, tree.depth):
+        column_widths[depth] = max(column_widths[depth], width)
+    columns = [0.0]
+    for width in column_widths[:-1]:
+        columns.append(columns[-1] + width + h_gap)
+
+    top = min(center - height / 2 for center, height in zip(centers, heights))
+    nodes = []
+    for i, ((width, height), center) in enumerate(zip(sizes, centers)):
+        parent = tree.parent[i]
+        nodes.append({
+            "id": tree.ids[i],
+            "parent_id": tree.ids[parent] if parent >= 0 else None,
+            "label": tree.label(i),
+            "x": round(columns[tree.depth[i]], 1),
+            "y": round(center - height / 2 - top, 1),
+            "width": round(width, 1),
+            "height": height
+        })
+    return {
+        "width": round(columns[-1] + column_widths[-1], 1),
+        "height": round(max(node["y"] + node["height"] for node in nodes), 1),
+        "nodes": nodes
+    }
@@ -0,0 +1,78 @@
+import re
+from typing import List, Optional
+
+# 结尾的 # 只有与标题文本以空白分隔时才是闭合标记（保留 C#、F# 这样的标签）
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)(?:\s+#+)?\s*$")
+_BULLET = re.compile(r"^(\s*)[-*+]\s+(.*?)\s*$")
+
+class IncrementalMarkdownParser:
+    """增量解析 LLM 输出的 Markdown 思维导图
+
+    逐行消费 token 流，每得到一个完整的标题或列表项就产生一个节点，
+    节点 id 按位置生成（如 1、1-2、1-2-3），同一输出的 id 保持稳定。
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self.root: Optional[dict] = None
+        # 当前路径上每个节点的 (层级, 节点, 是否标题)
+        self._stack: List[tuple] = []
+
+    def feed(self, text: str) -> List[dict]:
+        """输入一段文本，返回其中新增的完整节点"""
+        self._pending += text
+        if "\n" not in self._pending:
+            return []
+        *lines, self._pending = self._pending.split("\n")
+        return [event for line in lines if (event := self._parse_line(line))]
+
+    def close(self) -> List[dict]:
+        """处理末尾没有换行的最后一行"""
+        line, self._pending = self._pending, ""
+        event = self._parse_line(line)
+        return [event] if event else []
+
+    def tree(self) -> dict:
+        """返回当前已解析的完整树"""
+        return self.root or {"id": "root", "label": "", "children": []}
+
+    def _parse_line(self, line: str) -> Optional[dict]:
+        if match := _HEADING.match(line):
+            level, label, is_heading = len(match.group(1)), match.group(2), True
+        elif match := _BULLET.match(line):
+            # 列表项挂在最近的标题下，缩进每两个空格加深一层
+            indent = len(match.group(1).expandtabs(2)) // 2
+            level, label, is_heading = self._heading_level() + 1 + indent, match.group(2), False
+        else:
+            return None
+        if not label:
+            return None
+        return self._add(level, label, is_heading)
+
+    def _heading_level(self) -> int:
+        for level, _, is_heading in reversed(self._stack):
+            if is_heading:
+                return level
+        return 0
+
+    def _add(self, level: int, label: str, is_heading: bool) -> dict:
+        if self.root is None:
+            self.root = {"id": "root", "label": label, "children": []}
+            self._stack = [(level, self.root, is_heading)]
+            return {"node": self._public(self.root), "parent_id": None}
+
+        # 与根节点同级的标题（如第二个 #）统一挂到根节点下
+        while len(self._stack) > 1 and self._stack[-1][0] >= level:
+            self._stack.pop()
+        parent = self._stack[-1][1]
+
+        index = len(parent["children"]) + 1
+        node_id = str(index) if parent is self.root else f"{parent['id']}-{index}"
+        node = {"id": node_id, "label": label, "children": []}
+        parent["children"].append(node)
+        self._stack.append((level, node, is_heading))
+        return {"node": self._public(node), "parent_id": parent["id"]}
+
+    @staticmethod
+    def _public(node: dict) -> dict:
+        return {"id": node["id"], "label": node["label"], "children": []}
@@ -1,10 +1,21 @@
-from app.schemas.mindmap import MindMapRequest, DocumentType, DocumentAnalysisRequest
+from app.schemas.mindmap import MindMapRequest, MindMapNode, DocumentType, DocumentAnalysisRequest, ProcessingMode
 from app.utils.logger import get_logger
-import json
+import asyncio
 from ..document.pdf_parser import PDFParser
-from app.core.mindmap.prompts import MindMapPrompts
+from ..document.sections import PaperStructure, Section, SectionKind, detect_sections
+from app.core.mindmap.prompts import DRAFT_PROMPT, EXPAND_PROMPT, MINDMAP_PROMPT, OUTLINE_PROMPT, SECTION_PROMPT, MindMapPrompts
+from app.core.mindmap.chains import MindMapChain
+from app.core.mindmap.markdown_stream import IncrementalMarkdownParser
+from app.core.mindmap.sse import FlushPolicy, encode_sse
 from app.config.settings import settings
-from langchain.prompts import PromptTemplate
+from app.core.models.llm import get_llm, get_llm_identity, llm_registry
+from app.core.models.scheduler import Priority
+from app.core.models.token_budget import TokenBudget
+from app.utils.cache import result_cache, make_cache_key, normalize_text
+from app.utils.metrics import CACHE_REQUESTS, LLM_TOKENS_PER_SECOND, SSE_MESSAGES, StageTimer
+from app.utils.similarity import similarity_index, simhash
+from app.core.mindmap.flight import Flight, inflight
+from typing import AsyncIterator, List, Optional, Tuple
 import time
 
 logger = get_logger()
@@ -12,36 +23,54 @@ logger = get_logger()
 class MindMapProcessor:
     def __init__(self, llm):
         self.llm = llm
+        self.budget = TokenBudget(get_llm_identity(llm)[0])
+        self.timer = StageTimer()
     
-    def _create_sse_message(self, type: str, data: dict) -> str:
+    def _create_sse_message(self, type: str, data: dict, event_id: str = None) -> str:
         """创建 SSE 消息"""
-        message = {"type": type, **data}
-        return f"data: {json.dumps(message)}\n\n"
+        return encode_sse(type, data, event_id)
 
-    async def _process_llm_stream(self, prompt: str):
-        """处理 LLM 流式响应的核心逻辑"""
+    def _validate_tree(self, tree: dict):
+        """按 MindMapNode 校验解析得到的树，校验失败时返回 None"""
+        try:
+            MindMapNode(**tree)
+            return tree
+        except Exception as e:
+            logger.warning(f"思维导图树校验失败: {str(e)}")
+            return None
+
+    def _cache_key(self, text: str, namespace: str) -> str:
+        """根据输入文本和当前模型配置生成缓存键"""
+        model, temperature = get_llm_identity(self.llm)
+        return make_cache_key(text, model, temperature, namespace=namespace)
+
+    async def _generate_events(self, messages: list, cache_key: str = None, extra: dict = None):
+        """调用 LLM 并产生 (类型, 数据) 事件，extra 中的字段附加到最终结果"""
         try:
-            # 1. 发送开始消息
-            yield self._create_sse_message("start", {"message": "开始处理"})
-            
             # 2. 使用流式响应
             reasoning_content = []
             content = []
-            buffer = []
+            flush_policy = FlushPolicy()
+            generated_chars = 0
             is_thinking = False
+            parser = IncrementalMarkdownParser()
 
-            messages = [("human", prompt)]
             start_time = time.time()
+            next_progress = start_time + settings.STREAM_PROGRESS_INTERVAL
+            first_token_at = reasoning_first = reasoning_last = content_first = None
 
             async for chunk in self.llm.astream(messages):
                 chunk_content = str(chunk.content)
+                now = time.time()
+                first_token_at = first_token_at or now
                 
                 # 处理 OpenAI 的 reasoning_content
                 if hasattr(chunk, 'additional_kwargs') and 'reasoning_content' in chunk.additional_kwargs:
                     reasoning_chunk = chunk.additional_kwargs['reasoning_content']
                     if reasoning_chunk:
                         reasoning_content.append(reasoning_chunk)
-                        yield self._create_sse_message("reasoning", {
+                        reasoning_first, reasoning_last = reasoning_first or now, now
+                        yield ("reasoning", {
                             "partial": reasoning_chunk
                         })
                         continue
@@ -55,86 +84,691 @@ class MindMapProcessor:
                     chunk_content = chunk_content.replace("</think>", "")
                     if chunk_content.strip():
                         reasoning_content.append(chunk_content)
-                        yield self._create_sse_message("reasoning", {
+                        reasoning_first, reasoning_last = reasoning_first or now, now
+                        yield ("reasoning", {
                             "partial": chunk_content
                         })
                     continue
                 
                 if is_thinking:
                     reasoning_content.append(chunk_content)
-                    yield self._create_sse_message("reasoning", {
+                    reasoning_first, reasoning_last = reasoning_first or now, now
+                    yield ("reasoning", {
                         "partial": chunk_content
                     })
                 else:
                     content.append(chunk_content)
-                    buffer.append(chunk_content)
-                    
-                    # 每累积10个字符就发送一次
-                    if len(''.join(buffer)) >= 10:
-                        yield self._create_sse_message("generating", {"partial": ''.join(buffer)})
-                        buffer = []
+                    generated_chars += len(chunk_content)
+                    content_first = content_first or now
+
+                    # 服务端增量解析，客户端只需逐个追加节点
+                    for node_event in parser.feed(chunk_content):
+                        yield ("node_added", node_event)
+
+                    # 按字符数或时间间隔合并片段后再发送
+                    if partial := flush_policy.add(chunk_content):
+                        yield ("generating", {"partial": partial})
+
+                # 定期报告生成进度
+                if now >= next_progress:
+                    next_progress = now + settings.STREAM_PROGRESS_INTERVAL
+                    yield ("progress", {
+                        "stage": "generating",
+                        "generated": generated_chars,
+                        "elapsed": round(now - start_time, 2),
+                        "chars_per_second": round(generated_chars / (now - start_time), 2)
+                    })
 
             # 3. 合并结果
+            if partial := flush_policy.flush():
+                yield ("generating", {"partial": partial})
+            for node_event in parser.close():
+                yield ("node_added", node_event)
             final_result = "".join(content)
             final_reasoning = "".join(reasoning_content)
-            total_time = float(time.time() - start_time)
+            end_time = time.time()
+            total_time = float(end_time - start_time)
+
+            # 记录首 token 时间、思考/正文耗时和输出速度
+            timing = {"total": float(round(total_time, 2))}
+            self.timer.record("llm_total", total_time)
+            if first_token_at:
+                self.timer.record("llm_ttft", first_token_at - start_time)
+            if reasoning_first:
+                self.timer.record("llm_reasoning", reasoning_last - reasoning_first)
+            if content_first:
+                content_time = end_time - content_first
+                self.timer.record("llm_content", content_time)
+                if content_time > 0:
+                    tokens_per_second = self.budget.count(final_result) / content_time
+                    LLM_TOKENS_PER_SECOND.observe(tokens_per_second)
+                    timing["tokens_per_second"] = round(tokens_per_second, 1)
             
             # 4. 返回最终结果
-            yield self._create_sse_message("complete", {
+            payload = {
                 "data": final_result,
                 "reasoning": final_reasoning,
+                "tree": self._validate_tree(parser.tree()),
+                "timing": {**self.timer.timings, **timing},
+                **(extra or {})
+            }
+            if cache_key and final_result.strip():
+                result_cache.set(cache_key, payload)
+            yield ("complete", payload)
+
+        except Exception as e:
+            logger.error(f"处理失败: {str(e)}")
+            yield ("error", {
+                "message": str(e)
+            })
+
+    async def _map_reduce_events(self, text: str, cache_key: str = None, document_id: str = None):
+        """长文本 map-reduce 处理，产生进度事件和最终结果"""
+        try:
+            start_time = time.time()
+            chain = MindMapChain(self.llm)
+            structure = None
+            async for type, data in chain.process_long_text_stream(text, document_id):
+                if type == "result":
+                    structure = data
+                else:
+                    yield (type, data)
+
+            payload = {
+                "data": chain.to_markdown(structure),
+                "reasoning": "",
+                "tree": structure,
+                "reuse": chain.reuse,
                 "timing": {
-                    "total": float(round(total_time, 2))
+                    **self.timer.timings,
+                    **chain.timer.timings,
+                    "total": float(round(time.time() - start_time, 2))
                 }
+            }
+            if cache_key and structure.get("children"):
+                result_cache.set(cache_key, payload)
+            yield ("complete", payload)
+
+        except Exception as e:
+            logger.error(f"长文本处理失败: {str(e)}")
+            yield ("error", {
+                "message": str(e)
             })
 
+    def _section_llm(self, kind: SectionKind):
+        """按章节类型的温度获取模型实例，沿用当前请求的调度优先级"""
+        temperature = {
+            SectionKind.ABSTRACT: settings.TEMPERATURE_ABSTRACT,
+            SectionKind.INTRODUCTION: settings.TEMPERATURE_INTRODUCTION,
+            SectionKind.METHOD: settings.TEMPERATURE_METHOD,
+            SectionKind.RESULT: settings.TEMPERATURE_RESULT,
+            SectionKind.CONCLUSION: settings.TEMPERATURE_CONCLUSION,
+        }.get(kind, settings.TEMPERATURE_GENERAL)
+        return get_llm(temperature, getattr(self.llm, "priority", Priority.INTERACTIVE))
+
+    async def _generate_section(self, title: str, section: Section) -> dict:
+        """为单个章节生成分支，章节超出单次调用预算时截取开头部分"""
+        budget = self.budget.input_budget(SECTION_PROMPT.template)
+        text = section.text
+        if self.budget.count(text) > budget:
+            logger.info(f"章节 {section.heading} 超出单次调用预算，截取前 {budget} token")
+            text = self.budget.truncate(text, budget)
+
+        response = await self._section_llm(section.kind).ainvoke(SECTION_PROMPT.messages(
+            title=title,
+            heading=section.heading,
+            focus=MindMapPrompts.SECTION_FOCUS[section.kind.value],
+            text=text
+        ))
+        parser = IncrementalMarkdownParser()
+        parser.feed(str(response.content))
+        parser.close()
+        return parser.tree()
+
+    async def _section_events(self, paper: PaperStructure, cache_key: str = None):
+        """论文按章节并发生成分支（各自使用章节类型对应的温度），完成一个章节就推送它的节点"""
+        try:
+            start_time = time.time()
+            sections = paper.sections
+            title = paper.title or "论文思维导图"
+            root = {"id": "root", "label": title, "children": []}
+            yield ("node_added", {"node": {**root}, "parent_id": None})
+            yield ("progress", {
+                "stage": "sections",
+                "completed": 0,
+                "total": len(sections),
+                "sections": [section.heading for section in sections]
+            })
+
+            semaphore = asyncio.Semaphore(max(1, settings.CHUNK_BATCH_SIZE))
+
+            async def generate(index: int, section: Section):
+                async with semaphore:
+                    try:
+                        return index, await self._generate_section(title, section)
+                    except Exception as e:
+                        logger.error(f"生成章节 {section.heading} 失败: {str(e)}")
+                        return index, None
+
+            branches = [None] * len(sections)
+            stage_started = time.perf_counter()
+            tasks = [asyncio.create_task(generate(i, section)) for i, section in enumerate(sections)]
+            try:
+                for completed, future in enumerate(asyncio.as_completed(tasks), 1):
+                    index, tree = await future
+                    # 分支 id 按章节顺序编号，与完成顺序无关
+                    node = {
+                        "id": str(index + 1),
+                        "label": (tree or {}).get("label") or sections[index].heading,
+                        "children": MindMapChain._assign_ids(str(index + 1), (tree or {}).get("children", []))
+                    }
+                    branches[index] = node
+                    for event in self._subtree_events(node, "root"):
+                        yield ("node_added", event)
+                    yield ("progress", {
+                        "stage": "sections",
+                        "section": index,
+                        "completed": completed,
+                        "total": len(sections),
+                        "elapsed": round(time.time() - start_time, 2)
+                    })
+            finally:
+                for task in tasks:
+                    task.cancel()
+            self.timer.record("sections", time.perf_counter() - stage_started)
+
+            root["children"] = branches
+            payload = {
+                "data": MindMapChain.to_markdown(root),
+                "reasoning": "",
+                "tree": self._validate_tree(root),
+                "timing": {**self.timer.timings, "total": float(round(time.time() - start_time, 2))}
+            }
+            if cache_key and any(branch["children"] for branch in branches):
+                result_cache.set(cache_key, payload)
+            yield ("complete", payload)
+
         except Exception as e:
-            logger.error(f"处理失败: {str(e)}")
-            yield self._create_sse_message("error", {
+            logger.error(f"章节处理失败: {str(e)}")
+            yield ("error", {
                 "message": str(e)
             })
 
+    def _subtree_events(self, node: dict, parent_id: str):
+        """按先序产生子树中每个节点的 node_added 事件"""
+        yield {"node": {"id": node["id"], "label": node["label"], "children": []}, "parent_id": parent_id}
+        for child in node.get("children", []):
+            yield from self._subtree_events(child, node["id"])
+
+    async def _process_llm_stream(
+        self,
+        messages: list,
+        cache_key: str = None,
+        announce: bool = True,
+        text: str = None,
+        draft: str = None,
+        source: str = "document"
+    ):
+        """处理 LLM 流式响应的核心逻辑"""
+        producer = lambda: self._generate_events(messages, cache_key)
+        async for message in self._stream(cache_key, producer, announce, text, draft, source):
+            yield message
+
+    async def _stream(
+        self,
+        cache_key: str,
+        producer,
+        announce: bool = True,
+        text: str = None,
+        draft: str = None,
+        source: str = "document"
+    ):
+        """缓存回放、请求合并并将事件格式化为 SSE 消息
+
+        text 为用于近似重复查找的规范化输入，source 为请求入口（text 或 document）；
+        draft 不为空时，未命中缓存的请求同时用草稿模型为它生成骨架
+        """
+        # 1. 发送开始消息（调用方已发送时跳过）
+        if announce:
+            yield self._create_sse_message("start", {"message": "开始处理"})
+
+        if cache_key:
+            # 命中缓存（包括近似重复的输入）时直接回放已保存的结果
+            cached, fingerprint = await self._cached_result(cache_key, text, source)
+            if cached:
+                SSE_MESSAGES.labels("complete").inc()
+                yield self._create_sse_message("complete", cached)
+                return
+
+            # 相同输入的并发请求共享同一个 LLM 流，生成与连接解耦，断线后可以续传
+            events = inflight.run(cache_key, self._remember(cache_key, fingerprint, producer, source))
+        else:
+            events = ((None, event) async for event in producer())
+        if draft is not None:
+            events = self._with_draft(events, self._draft_events(draft))
+
+        async for message in self._format_events(events):
+            yield message
+
+    async def _draft_events(self, text: str):
+        """草稿模型流式输出骨架，产生 draft 事件"""
+        llm = llm_registry.get_draft()
+        flush_policy = FlushPolicy()
+        start_time = time.perf_counter()
+        first = True
+        async for chunk in llm.astream(DRAFT_PROMPT.messages(text=text)):
+            if first:
+                self.timer.record("draft_ttft", time.perf_counter() - start_time)
+                first = False
+            if partial := flush_policy.add(str(chunk.content)):
+                yield ("draft", {"partial": partial})
+        if partial := flush_policy.flush():
+            yield ("draft", {"partial": partial})
+
+    async def _with_draft(self, events, draft):
+        """在主模型输出正文之前转发草稿事件，主模型开始输出正文或结束后停止草稿
+
+        草稿事件只发给当前连接，不带事件 id，也不进入共享的事件日志；客户端收到正式内容后丢弃草稿
+        """
+        next_event = asyncio.ensure_future(events.__anext__())
+        next_draft = asyncio.ensure_future(draft.__anext__())
+        try:
+            while True:
+                waiting = {next_event, next_draft} if next_draft else {next_event}
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+                if next_draft in done:
+                    try:
+                        yield None, next_draft.result()
+                        next_draft = asyncio.ensure_future(draft.__anext__())
+                    except StopAsyncIteration:
+                        next_draft = None
+                    except Exception as e:
+                        logger.warning(f"草稿生成失败: {str(e)}")
+                        next_draft = None
+
+                if next_event in done:
+                    try:
+                        event_id, (type, data) = next_event.result()
+                    except StopAsyncIteration:
+                        return
+                    if next_draft and type in ("node_added", "generating", "complete", "error"):
+                        next_draft.cancel()
+                        next_draft = None
+                    yield event_id, (type, data)
+                    next_event = asyncio.ensure_future(events.__anext__())
+        finally:
+            for future in (next_event, next_draft):
+                if future and not future.done():
+                    future.cancel()
+            await asyncio.gather(*(f for f in (next_event, next_draft) if f), return_exceptions=True)
+            await draft.aclose()
+            await events.aclose()
+
+    def _similarity_scope(self, cache_key: str, source: str) -> str:
+        """只在请求入口、实际处理模式（缓存键的命名空间）、模型、温度和提示词版本都相同的结果之间复用，
+        近似重复的输入不能覆盖显式选择的处理模式
+        """
+        model, temperature = get_llm_identity(self.llm)
+        namespace = cache_key.partition(":")[0]
+        return f"{source}|{namespace}|{model}|{temperature!r}|{settings.PROMPT_VERSION}"
+
+    async def _cached_result(self, cache_key: str, text: str = None, source: str = "document"):
+        """查找精确或近似重复输入的缓存结果，返回 (结果, 输入指纹)"""
+        if cached := result_cache.get(cache_key):
+            logger.info(f"命中结果缓存: {cache_key}")
+            return {**cached, "cached": True}, None
+        # 短文本的 shingle 太少，改一个年份或加一个否定词的相似度仍在阈值以上，只对长文档做近似查找
+        if text is None or len(text) < settings.SIMILARITY_MIN_CHARS or not similarity_index.enabled:
+            return None, None
+
+        with self.timer.stage("fingerprint"):
+            fingerprint = await asyncio.to_thread(simhash, text)
+        match = similarity_index.find(self._similarity_scope(cache_key, source), fingerprint)
+        if match and (cached := result_cache.get(match[0])):
+            logger.info(f"命中近似重复缓存: {match[0]}，相似度 {match[1]:.3f}")
+            CACHE_REQUESTS.labels("similar").inc()
+            return {**cached, "cached": True, "similarity": round(match[1], 3)}, fingerprint
+        return None, fingerprint
+
+    def _remember(self, cache_key: str, fingerprint: int, producer, source: str = "document"):
+        """生成完成后登记输入指纹，供之后近似重复的输入复用"""
+        if fingerprint is None:
+            return producer
+        scope = self._similarity_scope(cache_key, source)
+
+        async def remembering():
+            async for type, data in producer():
+                if type == "complete":
+                    similarity_index.add(scope, cache_key, fingerprint)
+                yield type, data
+
+        return remembering
+
+    async def _format_events(self, events):
+        async for event_id, (type, data) in events:
+            if type == "complete":
+                # 合并本请求自身的阶段耗时（如 PDF 解析），生成阶段耗时来自驱动生成的请求
+                data = {**data, "timing": {**data.get("timing", {}), **self.timer.timings}}
+            SSE_MESSAGES.labels(type).inc()
+            yield self._create_sse_message(type, data, event_id)
+
+    async def resume_stream(self, found: Tuple[Flight, int], fallback: Optional[AsyncIterator[str]] = None):
+        """断线重连：从 Last-Event-ID 之后继续接收生成任务的事件，缺失部分以 snapshot 事件补齐
+
+        任务在重连前已被取消、或客户端已收到全部事件时收不到结束事件，此时改走 fallback
+        （正常的请求流程，已完成的结果会命中缓存）；没有 fallback 时返回 error 事件
+        """
+        finished = False
+
+        async def events():
+            nonlocal finished
+            async for event_id, (type, data) in inflight.resume(*found):
+                finished = finished or type in ("complete", "error")
+                yield event_id, (type, data)
+
+        async for message in self._format_events(events()):
+            yield message
+        if finished:
+            return
+        if fallback is None:
+            yield self._create_sse_message("error", {"message": "生成任务已结束，请重新提交请求"})
+            return
+        logger.info("重连的生成任务没有结束事件，按新请求处理")
+        async for message in fallback:
+            yield message
+
     async def process_text_stream(self, request: MindMapRequest):
         """处理文本并生成思维导图（流式响应）"""
-        prompt = PromptTemplate(
-            template=MindMapPrompts.get_mindmap_template(),
-            input_variables=["text"]
-        ).format(text=request.content)
-        
-        async for message in self._process_llm_stream(prompt):
+        with self.timer.stage("prompt_build"):
+            text = normalize_text(request.content)
+            messages = MINDMAP_PROMPT.messages(text=text)
+
+        # 短文本可选两阶段：本地小模型先输出草稿骨架，主模型的 complete 事件替换草稿
+        use_draft = (
+            bool(settings.DRAFT_MODEL)
+            and request.options.get("draft", True)
+            and len(text) <= settings.DRAFT_MAX_CHARS
+        )
+        async for message in self._process_llm_stream(
+            messages,
+            self._cache_key(text, "mindmap"),
+            text=text,
+            draft=text if use_draft else None,
+            source="text"
+        ):
             yield message
 
     async def process_document_stream(self, request: DocumentAnalysisRequest):
         """处理文档并生成思维导图（流式响应）"""
+        yield self._create_sse_message("start", {"message": "开始处理"})
         try:
             # 1. 解析文档
-            text = PDFParser.parse_base64_pdf(request.content) if request.doc_type == DocumentType.PDF else request.content
-            
-            # 2. 准备文本
-            if len(text) > settings.CHUNK_SIZE:
-                main_content = text[:int(settings.CHUNK_SIZE * settings.TEXT_HEAD_RATIO)]
-                important_paragraphs = []
-                remaining_text = text[int(settings.CHUNK_SIZE * settings.TEXT_HEAD_RATIO):]
-                paragraphs = remaining_text.split('\n\n')
-                for para in paragraphs[:5]:
-                    if any(keyword in para.lower() for keyword in ['结果', '实验', '性能', '创新', '贡献']):
-                        important_paragraphs.append(para)
-                
-                text_to_process = main_content + "\n\n重要补充：\n" + "\n".join(important_paragraphs)
+            if request.doc_type == DocumentType.PDF:
+                pdf_bytes = await asyncio.to_thread(PDFParser.decode_base64, request.content)
+                pages = []
+                async for message in self._extract_pdf(pdf_bytes, request.mode, pages):
+                    yield message
+                text = "\n".join(pages)
             else:
-                text_to_process = text
+                text = request.content
 
-            # 3. 生成思维导图
-            prompt = PromptTemplate(
-                template=MindMapPrompts.get_mindmap_template(),
-                input_variables=["text"]
-            ).format(text=text_to_process)
-            
-            async for message in self._process_llm_stream(prompt):
+            async for message in self._process_document_text(text, request.mode, request.document_id, request.max_depth):
+                yield message
+
+        except Exception as e:
+            logger.error(f"处理文档失败: {str(e)}")
+            yield self._create_sse_message("error", {
+                "message": str(e)
+            })
+
+    async def process_pdf_file_stream(
+        self,
+        path: str,
+        mode: ProcessingMode = ProcessingMode.AUTO,
+        document_id: str = None,
+        max_depth: int = None
+    ):
+        """处理已保存到磁盘的 PDF 文件（流式响应），子进程直接按路径读取"""
+        yield self._create_sse_message("start", {"message": "开始处理"})
+        try:
+            pages = []
+            async for message in self._extract_pdf(path, mode, pages):
+                yield message
+
+            async for message in self._process_document_text("\n".join(pages), mode, document_id, max_depth):
                 yield message
 
         except Exception as e:
             logger.error(f"处理文档失败: {str(e)}")
             yield self._create_sse_message("error", {
                 "message": str(e)
-            })
\ No newline at end of file
+            })
+
+    def _extraction_budget(self, mode: ProcessingMode):
+        """单次调用模式只需要抽取式压缩能处理的文本（按每 token 至多 4 个字符估算），其余模式需要全文"""
+        if mode != ProcessingMode.SINGLE:
+            return None
+        return int(self.budget.input_budget(MINDMAP_PROMPT.template) * 4 * max(settings.EXTRACTIVE_MAX_RATIO, 1))
+
+    async def _extract_pdf(self, source, mode: ProcessingMode, pages: list):
+        """在进程池中逐页提取 PDF 文本，页面文本追加到 pages，并产生 extracting 进度消息"""
+        with self.timer.stage("pdf_parse"):
+            async for page, total, page_text in PDFParser.iter_pages(source, max_chars=self._extraction_budget(mode)):
+                pages.append(page_text)
+                SSE_MESSAGES.labels("extracting").inc()
+                yield self._create_sse_message("extracting", {"page": page, "total": total})
+
+    async def _process_document_text(
+        self,
+        text: str,
+        mode: ProcessingMode,
+        document_id: str = None,
+        max_depth: int = None
+    ):
+        """根据处理模式为提取出的文档文本生成思维导图"""
+        text = normalize_text(text)
+        cache_key, producer = await self._plan_document(text, mode, document_id, max_depth)
+        async for message in self._stream(cache_key, producer, announce=False, text=self._similarity_text(text, mode, document_id)):
+            yield message
+
+    @staticmethod
+    def _similarity_text(text: str, mode: ProcessingMode, document_id: str = None) -> Optional[str]:
+        """参与近似重复查找的文本：编辑后重新提交的文档不能复用编辑前的近似结果，
+        渐进模式的大纲需要对应自己的会话，也不复用其他结果
+        """
+        if document_id or mode == ProcessingMode.PROGRESSIVE:
+            return None
+        return text
+
+    async def _plan_document(self, text: str, mode: ProcessingMode, document_id: str = None, max_depth: int = None):
+        """为规范化后的文本选择处理方式并准备提示词，返回 (缓存键, 事件生成函数)
+
+        全文 token 计数、章节识别和抽取式压缩在长文本上需要上百毫秒，放到线程中执行，不阻塞其他请求的流
+        """
+        if mode == ProcessingMode.PROGRESSIVE:
+            return await asyncio.to_thread(self._plan_outline, text, max_depth)
+        return await asyncio.to_thread(self._select_plan, text, mode, document_id)
+
+    def _select_plan(self, text: str, mode: ProcessingMode, document_id: str = None):
+        prompt_started = time.perf_counter()
+
+        budget = self.budget.input_budget(MINDMAP_PROMPT.template)
+        text_tokens = self.budget.count(text)
+
+        # 识别出论文章节结构时按章节并发生成，各章节在单次调用的上下文内处理。
+        # 自动模式下单次调用能容纳的论文仍然单次生成，不拆成多次调用
+        if mode == ProcessingMode.SECTIONS or (mode == ProcessingMode.AUTO and text_tokens > budget):
+            with self.timer.stage("section_detect"):
+                paper = detect_sections(text)
+            if paper:
+                cache_key = self._cache_key(text, "sections")
+                return cache_key, lambda: self._section_events(paper, cache_key)
+            mode = ProcessingMode.AUTO
+
+        # 略超出单次调用预算的文本压缩后单次生成；更长的文本使用 map-reduce，避免压缩丢弃过多内容。
+        # 按 document_id 增量生成的文档需要分块清单，始终使用 map-reduce
+        if mode == ProcessingMode.AUTO:
+            compressible = text_tokens <= budget * settings.EXTRACTIVE_MAX_RATIO and document_id is None
+            mode = ProcessingMode.MAP_REDUCE if text_tokens > budget and not compressible else ProcessingMode.SINGLE
+        if mode == ProcessingMode.MAP_REDUCE:
+            cache_key = self._cache_key(text, "map_reduce")
+            return cache_key, lambda: self._map_reduce_events(text, cache_key, document_id)
+
+        # 2. 超出预算时从全文抽取关键句，而不是只保留开头
+        text_to_process = self._compress(text, budget)
+
+        # 3. 生成思维导图
+        messages = MINDMAP_PROMPT.messages(text=text_to_process)
+
+        cache_key = self._cache_key(text_to_process, "mindmap")
+        self.timer.record("prompt_build", time.perf_counter() - prompt_started)
+        return cache_key, lambda: self._generate_events(messages, cache_key)
+
+    def _compress(self, text: str, budget: int) -> str:
+        """超出 token 预算的文本压缩为抽取出的关键句"""
+        if self.budget.count(text) <= budget:
+            return text
+        # numpy 在首次压缩时才导入
+        from ..document.extractive import extract_summary
+        with self.timer.stage("extractive"):
+            compressed = extract_summary(text, budget, self.budget.count, settings.EXTRACTIVE_HEAD_RATIO)
+            if self.budget.count(compressed) > budget:
+                compressed = self.budget.truncate(compressed, budget)
+        return compressed
+
+    def _plan_outline(self, text: str, max_depth: int = None):
+        """渐进模式：单次调用只生成根节点和一级分支，保存原文供按需展开时检索（在线程中执行）
+
+        大纲的缓存键同时作为会话 id 返回给客户端。最大深度计入缓存键，
+        同一文本以不同深度生成的会话互不影响
+        """
+        prompt_started = time.perf_counter()
+        max_depth = max_depth or settings.MAX_MINDMAP_DEPTH
+        text_to_process = self._compress(text, self.budget.input_budget(OUTLINE_PROMPT.template))
+        messages = OUTLINE_PROMPT.messages(text=text_to_process)
+        cache_key = self._cache_key(f"{max_depth}\x1f{text_to_process}", "outline")
+
+        # 原文只写入持久化层，不占用进程内 LRU；重复写入同时刷新会话的过期时间
+        result_cache.set_persistent(self._session_key(cache_key), {"text": text, "max_depth": max_depth})
+        self.timer.record("prompt_build", time.perf_counter() - prompt_started)
+        return cache_key, lambda: self._generate_events(messages, cache_key, {"session": cache_key})
+
+    def _session_key(self, session: str) -> str:
+        return self._cache_key(session, "session")
+
+    def _expand_key(self, session: str, node_id: str) -> str:
+        return self._cache_key(f"{session}\x1f{node_id}", "expand")
+
+    async def _node_path(self, session: str, tree: dict, node_id: str) -> Optional[List[dict]]:
+        """按层级 id（如 2-3-1）在大纲和已展开的子节点中查找节点，返回从根节点到它的路径"""
+        if node_id == tree["id"]:
+            return [tree]
+        parent_id = node_id.rpartition("-")[0] or tree["id"]
+        path = await self._node_path(session, tree, parent_id)
+        if path is None:
+            return None
+        children = path[-1].get("children") or await result_cache.aget(self._expand_key(session, parent_id)) or []
+        node = next((child for child in children if child["id"] == node_id), None)
+        return path + [node] if node else None
+
+    async def expand_node(self, session: str, node_id: str) -> dict:
+        """渐进模式下生成节点的下一层子节点，只参考原文中与节点路径相关的句子，结果按节点缓存
+
+        会话或节点不存在时抛出 LookupError，超过会话的最大深度时抛出 ValueError。
+        缓存在内存中未命中时从 SQLite 读取，读写都不阻塞事件循环
+        """
+        record = await asyncio.to_thread(result_cache.get_persistent, self._session_key(session))
+        outline = await result_cache.aget(session)
+        if not record or not outline or not outline.get("tree"):
+            raise LookupError("会话不存在或已过期，请重新生成")
+        tree = outline["tree"]
+        if node_id == tree["id"]:
+            raise ValueError("一级分支已在首次生成时给出")
+        depth = node_id.count("-") + 1
+        if depth >= record["max_depth"]:
+            raise ValueError(f"节点已达到最大深度 {record['max_depth']}")
+        path = await self._node_path(session, tree, node_id)
+        if path is None:
+            raise LookupError("节点不存在")
+
+        expandable = depth + 1 < record["max_depth"]
+        cache_key = self._expand_key(session, node_id)
+        # 大纲中已经带有子节点时（模型多输出了一层）直接返回
+        children = path[-1].get("children") or await result_cache.aget(cache_key)
+        if children is not None:
+            return {"node_id": node_id, "children": children, "expandable": expandable, "cached": True}
+
+        from ..document.extractive import extract_summary
+        labels = [node["label"] for node in path]
+        with self.timer.stage("extractive"):
+            reference = await asyncio.to_thread(
+                extract_summary, record["text"], settings.PROGRESSIVE_EXPAND_TOKENS, self.budget.count, 0.0,
+                "\n".join(labels[1:])
+            )
+        with self.timer.stage("llm_total"):
+            response = await self.llm.ainvoke(EXPAND_PROMPT.messages(
+                text=reference,
+                topic=labels[0],
+                path=" > ".join(labels[1:]),
+                label=labels[-1]
+            ))
+        children = [
+            {"id": f"{node_id}-{index}", "label": label, "children": []}
+            for index, label in enumerate(self._list_items(str(response.content)), 1)
+        ]
+        if children:
+            await result_cache.aset(cache_key, children)
+        return {
+            "node_id": node_id,
+            "children": children,
+            "expandable": expandable,
+            "cached": False,
+            "timing": self.timer.timings
+        }
+
+    @staticmethod
+    def _list_items(content: str) -> List[str]:
+        """提取 Markdown 列表项的文本"""
+        items = []
+        for line in content.splitlines():
+            line = line.strip()
+            if line[:1] in ("-", "*", "•"):
+                if item := line.lstrip("-*• ").strip():
+                    items.append(item)
+        return items
+
+    async def extract_text(self, request: DocumentAnalysisRequest) -> str:
+        """提取文档文本（不产生消息），供批量任务使用"""
+        if request.doc_type != DocumentType.PDF:
+            return request.content
+        pdf_bytes = await asyncio.to_thread(PDFParser.decode_base64, request.content)
+        pages = []
+        with self.timer.stage("pdf_parse"):
+            async for _, _, page_text in PDFParser.iter_pages(pdf_bytes, max_chars=self._extraction_budget(request.mode)):
+                pages.append(page_text)
+        return "\n".join(pages)
+
+    async def generate_document(
+        self,
+        text: str,
+        mode: ProcessingMode,
+        document_id: str = None,
+        max_depth: int = None
+    ) -> dict:
+        """为文档文本生成思维导图并返回最终结果，相同输入复用结果缓存和进行中的生成"""
+        text = normalize_text(text)
+        cache_key, producer = await self._plan_document(text, mode, document_id, max_depth)
+        cached, fingerprint = await self._cached_result(cache_key, self._similarity_text(text, mode, document_id))
+        if cached:
+            return cached
+
+        result = error = None
+        async for _, (type, data) in inflight.run(cache_key, self._remember(cache_key, fingerprint, producer)):
+            if type == "complete":
+                result = {**data, "timing": {**data.get("timing", {}), **self.timer.timings}}
+            elif type == "error":
+                error = data["message"]
+        if result is None:
+            raise RuntimeError(error or "生成未完成")
+        return result
@@ -1,9 +1,12 @@
-from langchain.prompts import PromptTemplate
-from typing import Dict, List
+from typing import List, Tuple
+import string
 
 class MindMapPrompts:
-    # 基础思维导图模板（用于短文本）
-    MINDMAP_TEMPLATE = """
+    # 提示词分为两部分：固定的指令作为系统消息放在最前面，逐字节不变，
+    # 提供方可以缓存这部分前缀（OpenAI 缓存输入 token、Ollama 复用 KV）；变量部分放在用户消息中。
+
+    # 基础思维导图指令（用于短文本）
+    MINDMAP_SYSTEM = """
 作为AI助手，请详细分析文本并生成一个内容丰富的思维导图。要求：
 
 1. 使用 Markdown 格式，必须包含完整的三级结构：
@@ -42,9 +45,98 @@ class MindMapPrompts:
 - 使用512维度的嵌入向量，2048维度的前馈网络，总参数量达到213M（架构细节）
 - 采用Adam优化器，β1=0.9，β2=0.98，ε=10^-9，使用warmup_steps=4000（训练配置）
 
+要求中文回复
+"""
+
+    MINDMAP_TEMPLATE = """
 请基于以下文本生成完整且内容丰富的思维导图：
 {text}
+"""
+
+    # 论文单个章节的分支指令（各章节并发生成后合并到同一个根节点下）
+    SECTION_SYSTEM = """
+作为AI助手，请为学术论文中的一个章节生成思维导图分支。要求：
+
+1. 使用 Markdown 格式：
+   - 使用 # 作为分支主题（格式为“章节名：核心内容概括”，20字以内）
+   - 使用 ## 作为3-5个要点（每个要点完整表达一个观点）
+   - 使用 ### 作为每个要点下的2-3个细节（保留具体数据、实验设置和关键术语）
+
+2. 只根据本章节内容生成，不要补充章节中没有的信息
+3. 直接输出 Markdown，不要其他内容
+
+要求中文回复
+"""
+
+    SECTION_TEMPLATE = """
+论文：{title}
+章节：{heading}
+侧重：{focus}
+
+章节内容：
+{text}
+"""
+
+    # 各类章节的侧重点
+    SECTION_FOCUS = {
+        "abstract": "研究问题、核心方法和主要结论",
+        "introduction": "研究背景、现有方法的不足和本文的贡献",
+        "method": "提出的方法、模型结构和关键设计",
+        "result": "实验设置、数据集、评价指标和具体结果数据",
+        "conclusion": "主要结论、局限性和未来工作",
+        "general": "本章节的核心观点和关键信息",
+    }
+
+    # 草稿骨架指令（本地小模型快速输出，正式结果生成后被替换）
+    DRAFT_SYSTEM = """
+快速阅读文本，输出思维导图的骨架。要求：
+- 使用 Markdown 格式：# 为核心主题，## 为3-5个主要方面，### 为每个方面下1-3个要点
+- 每个标题不超过15字，不写列表项和解释
+- 直接输出骨架，不要任何其他内容
+
 要求中文回复
+"""
+
+    DRAFT_TEMPLATE = """
+文本：
+{text}
+"""
+
+    # 渐进模式的大纲指令（只生成前两层，更深的节点在用户展开时生成）
+    OUTLINE_SYSTEM = """
+作为AI助手，请通读文本并生成思维导图的前两层，更深的内容会在用户展开节点时再生成。要求：
+
+1. 使用 Markdown 格式，只输出两级标题：
+   - 使用 # 作为一级标题（核心主题，15-20字，概括文章主要内容）
+   - 使用 ## 作为二级标题（4-6个主要方面，每个20-30字，完整表达一个核心要点）
+2. 各方面之间不要重叠，合起来覆盖文章所有重要内容
+3. 不要输出更深层的标题和列表项，直接输出 Markdown
+
+要求中文回复
+"""
+
+    OUTLINE_TEMPLATE = """
+请基于以下文本生成思维导图的前两层：
+{text}
+"""
+
+    # 按需展开节点的指令
+    EXPAND_SYSTEM = """
+作为AI助手，请为思维导图中的指定节点生成下一层子节点。要求：
+1. 生成3-5个子节点，每行一个，以 - 开头
+2. 每个子节点30-40字，包含具体细节和关键数据，只依据参考内容
+3. 子节点之间不要重复，也不要重复路径上的上层节点已经表达的内容
+4. 直接输出列表，不要其他内容
+要求中文回复
+"""
+
+    EXPAND_TEMPLATE = """
+参考内容：
+{text}
+
+文档主题：{topic}
+节点路径：{path}
+当前节点：{label}
 """
 
     # 主要观点提取模板（用于长文本的第一步）
@@ -72,11 +164,73 @@ class MindMapPrompts:
 
 详细内容：
 {details}
+"""
+
+    # 分块总结模板（用于长文本 map 阶段）
+    CHUNK_SUMMARY_SYSTEM = """
+请总结用户给出的文本片段的核心内容。要求：
+1. 列出3-6个要点，每个要点一行，以 - 开头
+2. 保留具体数据、实验结果和专业术语
+3. 直接输出要点，不要解释
+要求中文回复
+"""
+
+    CHUNK_SUMMARY_TEMPLATE = """
+文本片段：
+{text}
+"""
+
+    # 全局结构模板（用于长文本 reduce 阶段）
+    STRUCTURE_SYSTEM = """
+用户会给出一篇长文档各部分的要点总结，请归纳出整篇文档的思维导图骨架。要求：
+1. 根节点概括文档核心主题（15-20字）
+2. 4-6个一级分支，每个分支完整表达一个主要方面（20-30字）
+3. 只输出 JSON，不要输出其他内容，格式如下：
+{"id": "root", "label": "核心主题", "children": [{"id": "1", "label": "主要方面", "children": []}]}
+要求中文回复
+"""
+
+    STRUCTURE_TEMPLATE = """
+各部分要点：
+{text}
+"""
+
+    # 分支细节模板（用于长文本填充阶段）
+    DETAILS_SYSTEM = """
+请根据用户给出的参考内容，为指定的当前分支补充2-4个具体要点。要求：
+1. 每个要点30-40字，包含具体细节和关键数据
+2. 每个要点包含 id 和 label 字段，id 使用 "分支id-序号" 的形式
+要求中文回复
+"""
+
+    # 同一文档各分支的参考内容相同，放在分支信息之前以便复用缓存的前缀
+    DETAILS_TEMPLATE = """
+参考内容：
+{text}
+
+文档主题：{topic}
+当前分支：{category}
 """
 
     @staticmethod
     def get_mindmap_template() -> str:
-        return MindMapPrompts.MINDMAP_TEMPLATE
+        return MINDMAP_PROMPT.template
+
+    @staticmethod
+    def get_section_template() -> str:
+        return SECTION_PROMPT.template
+
+    @staticmethod
+    def get_draft_template() -> str:
+        return DRAFT_PROMPT.template
+
+    @staticmethod
+    def get_outline_template() -> str:
+        return OUTLINE_PROMPT.template
+
+    @staticmethod
+    def get_expand_template() -> str:
+        return EXPAND_PROMPT.template
 
     @staticmethod
     def get_main_points_template() -> str:
@@ -84,4 +238,48 @@ class MindMapPrompts:
 
     @staticmethod
     def get_mindmap_with_points_template() -> str:
-        return MindMapPrompts.MINDMAP_WITH_POINTS_TEMPLATE
\ No newline at end of file
+        return MindMapPrompts.MINDMAP_WITH_POINTS_TEMPLATE
+
+    @staticmethod
+    def get_chunk_summary_template() -> str:
+        return CHUNK_SUMMARY_PROMPT.template
+
+    @staticmethod
+    def get_structure_template() -> str:
+        return STRUCTURE_PROMPT.template
+
+    @staticmethod
+    def get_details_template() -> str:
+        return DETAILS_PROMPT.template
+
+class CompiledPrompt:
+    """预编译的提示词：系统消息固定不变，用户消息使用 str.format 填充变量"""
+
+    def __init__(self, system: str, template: str):
+        self.system = system.strip()
+        self.human = template.strip()
+        self.variables = {name for _, name, _, _ in string.Formatter().parse(self.human) if name}
+
+    @property
+    def template(self) -> str:
+        """完整的模板文本，用于估算提示词本身占用的 token"""
+        return f"{self.system}\n\n{self.human}"
+
+    def extend(self, instructions: str) -> "CompiledPrompt":
+        """在系统消息末尾追加固定说明（如输出格式），返回新的提示词"""
+        return CompiledPrompt(f"{self.system}\n\n{instructions}", self.human)
+
+    def format(self, **kwargs) -> str:
+        return self.human.format(**kwargs)
+
+    def messages(self, **kwargs) -> List[Tuple[str, str]]:
+        return [("system", self.system), ("human", self.format(**kwargs))]
+
+MINDMAP_PROMPT = CompiledPrompt(MindMapPrompts.MINDMAP_SYSTEM, MindMapPrompts.MINDMAP_TEMPLATE)
+CHUNK_SUMMARY_PROMPT = CompiledPrompt(MindMapPrompts.CHUNK_SUMMARY_SYSTEM, MindMapPrompts.CHUNK_SUMMARY_TEMPLATE)
+STRUCTURE_PROMPT = CompiledPrompt(MindMapPrompts.STRUCTURE_SYSTEM, MindMapPrompts.STRUCTURE_TEMPLATE)
+DETAILS_PROMPT = CompiledPrompt(MindMapPrompts.DETAILS_SYSTEM, MindMapPrompts.DETAILS_TEMPLATE)
+DRAFT_PROMPT = CompiledPrompt(MindMapPrompts.DRAFT_SYSTEM, MindMapPrompts.DRAFT_TEMPLATE)
+SECTION_PROMPT = CompiledPrompt(MindMapPrompts.SECTION_SYSTEM, MindMapPrompts.SECTION_TEMPLATE)
+OUTLINE_PROMPT = CompiledPrompt(MindMapPrompts.OUTLINE_SYSTEM, MindMapPrompts.OUTLINE_TEMPLATE)
+EXPAND_PROMPT = CompiledPrompt(MindMapPrompts.EXPAND_SYSTEM, MindMapPrompts.EXPAND_TEMPLATE)
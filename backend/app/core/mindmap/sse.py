@@ -0,0 +1,51 @@
+import json
+import time
+from typing import List, Optional
+from app.config.settings import settings
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时退回标准库
+    orjson = None
+
+def encode_sse(type: str, data: dict, event_id: str = None) -> str:
+    """将事件序列化为 SSE 消息，带 event_id 时客户端可以通过 Last-Event-ID 断点续传"""
+    message = {"type": type, **data}
+    if orjson is not None:
+        body = orjson.dumps(message).decode("utf-8")
+    else:
+        body = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+    if event_id:
+        return f"id: {event_id}\ndata: {body}\n\n"
+    return f"data: {body}\n\n"
+
+class FlushPolicy:
+    """合并流式片段：累计字符数达到阈值或距首个片段超过时间间隔时刷新（先到者为准）"""
+
+    def __init__(self, max_chars: int = None, max_delay_ms: int = None):
+        self.max_chars = max_chars or settings.STREAM_CHUNK_SIZE
+        self.max_delay = (max_delay_ms or settings.STREAM_FLUSH_INTERVAL_MS) / 1000
+        self._parts: List[str] = []
+        self._size = 0
+        self._first_at = 0.0
+
+    def add(self, text: str) -> Optional[str]:
+        """加入一个片段，需要刷新时返回合并后的文本"""
+        if not text:
+            return None
+        if not self._parts:
+            self._first_at = time.monotonic()
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.max_chars or time.monotonic() - self._first_at >= self.max_delay:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[str]:
+        """取出所有未发送的片段"""
+        if not self._parts:
+            return None
+        text = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        return text
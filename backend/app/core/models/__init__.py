@@ -1,3 +1,4 @@
-from .llm import get_llm
+from .llm import get_llm, get_llm_identity, llm_registry
+from .scheduler import Priority, SchedulerSaturated, llm_scheduler
 
-__all__ = ['get_llm'] 
\ No newline at end of file
+__all__ = ['get_llm', 'get_llm_identity', 'llm_registry', 'Priority', 'SchedulerSaturated', 'llm_scheduler']
@@ -1,47 +1,218 @@
-from langchain_openai import ChatOpenAI
-from langchain_ollama import ChatOllama
 from app.config.settings import settings
+from app.core.models.router import LLMRouter, RoutedLLM, backend_configs
+from app.core.models.scheduler import Priority, ScheduledLLM, llm_scheduler
 from app.utils.logger import get_logger
+from typing import Callable, Dict, List, Optional, Tuple
 import httpx
 
 logger = get_logger()
 
-def get_llm(temperature: float = None):
-    """获取 LLM 实例"""
-    try:
-        if settings.LLM_TYPE == "ollama":
-            logger.info(f"使用 Ollama 模型: {settings.OLLAMA_MODEL}")
-            logger.info(f"Ollama Base URL: {settings.OLLAMA_API_BASE}")
-            
+# 各类后端对应的 langchain 集成，创建模型实例时才导入（导入 langchain_openai 需要一秒以上）
+PROVIDER_MODULES = {"openai": "langchain_openai", "ollama": "langchain_ollama"}
+
+class LLMClientRegistry:
+    """LLM 客户端注册表
+
+    每个 (provider, base_url) 只保留一个长连接的异步 HTTP 客户端，
+    按温度缓存轻量的模型实例，请求之间复用 TCP/TLS 连接。
+    配置了多个后端时返回经过路由器的模型实例。
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str], httpx.AsyncClient] = {}
+        self._views: Dict[Tuple[str, float], object] = {}
+        self._factory: Optional[Callable[[float], object]] = None
+        self.backends = backend_configs()
+        self.router = LLMRouter(self.backends) if len(self.backends) > 1 else None
+
+    def provider_modules(self) -> List[str]:
+        """当前配置实际用到的模型集成模块"""
+        types = {backend["type"] for backend in self.backends}
+        if settings.DRAFT_MODEL:
+            types.add("ollama")
+        return sorted(PROVIDER_MODULES[type] for type in types if type in PROVIDER_MODULES)
+
+    def validate(self):
+        """按后端类型检查配置，在应用启动时调用，配置有误时抛出 ValueError 终止启动
+
+        只检查实际配置的后端：只使用 Ollama 时不需要 OpenAI API Key
+        """
+        if self._factory:
+            return
+        errors = []
+        for backend in self.backends:
+            name = backend["name"]
+            if backend["type"] not in PROVIDER_MODULES:
+                errors.append(f"后端 {name} 的类型 {backend['type']} 不受支持（可选 openai、ollama）")
+            elif backend["type"] == "openai":
+                if not backend.get("api_key"):
+                    errors.append(f"后端 {name} 未设置 API key（OPENAI_API_KEY）")
+                elif not backend["api_key"].startswith("sk-"):
+                    errors.append(f"后端 {name} 的 API key 格式错误，应以 sk- 开头")
+            if not backend.get("base_url") or not backend.get("model"):
+                errors.append(f"后端 {name} 缺少 base_url 或 model")
+        if errors:
+            raise ValueError("LLM 配置错误：" + "；".join(errors))
+
+    def override(self, factory: Optional[Callable[[float], object]]):
+        """用自定义工厂替换模型实例（基准测试使用本地假模型），传入 None 恢复默认"""
+        self._factory = factory
+        self._views.clear()
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY
+        )
+
+    def _client_kwargs(self) -> dict:
+        kwargs = {
+            "limits": self._limits(),
+            "timeout": httpx.Timeout(settings.REQUEST_TIMEOUT, connect=settings.TIMEOUT),
+        }
+        if settings.LLM_HTTP2:
+            try:
+                import h2  # noqa: F401
+                kwargs["http2"] = True
+            except ImportError:
+                logger.warning("未安装 h2，HTTP/2 已禁用（pip install 'httpx[http2]'）")
+        return kwargs
+
+    def get_http_client(self, provider: str, base_url: str) -> httpx.AsyncClient:
+        """获取 (provider, base_url) 对应的共享连接池"""
+        key = (provider, base_url)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**self._client_kwargs())
+            self._clients[key] = client
+            logger.info(f"创建 LLM 连接池: {provider} {base_url}")
+        return client
+
+    def get(self, temperature: float = None):
+        """获取指定温度的模型实例（共享底层连接池）"""
+        temperature = temperature if temperature is not None else settings.TEMPERATURE_MINDMAP
+        key = (settings.LLM_TYPE, temperature)
+        llm = self._views.get(key)
+        if llm is None:
+            if self._factory:
+                llm = self._factory(temperature)
+            elif self.router:
+                models = {backend["name"]: self._create(backend, temperature) for backend in self.backends}
+                llm = RoutedLLM(self.router, models, temperature)
+            else:
+                llm = self._create(self.backends[0], temperature)
+            self._views[key] = llm
+        return llm
+
+    def get_draft(self):
+        """获取草稿模型实例（本地 Ollama 小模型，不经过调度器），未配置时返回 None"""
+        if not settings.DRAFT_MODEL:
+            return None
+        temperature = settings.TEMPERATURE_MINDMAP
+        key = ("draft", temperature)
+        llm = self._views.get(key)
+        if llm is None:
+            if self._factory:
+                llm = self._factory(temperature)
+            else:
+                llm = self._create({
+                    "type": "ollama",
+                    "name": "draft",
+                    "model": settings.DRAFT_MODEL,
+                    "base_url": settings.DRAFT_API_BASE or settings.OLLAMA_API_BASE,
+                    "keep_alive": settings.DRAFT_KEEP_ALIVE
+                }, temperature)
+            self._views[key] = llm
+        return llm
+
+    def _create(self, backend: dict, temperature: float):
+        if backend["type"] == "ollama":
+            from langchain_ollama import ChatOllama
+            logger.info(f"使用 Ollama 模型: {backend['model']}，Base URL: {backend['base_url']}")
+
+            # ChatOllama 不接受外部 httpx 客户端，只能传入连接池参数
             return ChatOllama(
-                model=settings.OLLAMA_MODEL,
-                base_url=settings.OLLAMA_API_BASE,
-                temperature=temperature if temperature is not None else settings.TEMPERATURE_MINDMAP,
-                num_predict=settings.LLM_MAX_TOKENS
-            )
-        else:
-            logger.info(f"使用模型: {settings.OPENAI_MODEL}")
-            logger.info(f"API Base URL: {settings.OPENAI_API_BASE}")
-            logger.info(f"API Key: {settings.OPENAI_API_KEY[:8]}...{settings.OPENAI_API_KEY[-4:]}")
-            
-            if not settings.OPENAI_API_KEY:
-                raise ValueError("OPENAI_API_KEY not set")
-                
-            if not settings.OPENAI_API_KEY.startswith("sk-"):
-                raise ValueError("Invalid OPENAI_API_KEY format")
-            
-            return ChatOpenAI(
-                model_name=settings.OPENAI_MODEL,
-                temperature=temperature if temperature is not None else settings.TEMPERATURE_MINDMAP,
-                openai_api_key=settings.OPENAI_API_KEY,
-                openai_api_base=settings.OPENAI_API_BASE,
-                max_retries=settings.MAX_RETRIES,
-                request_timeout=settings.REQUEST_TIMEOUT
+                model=backend["model"],
+                base_url=backend["base_url"],
+                temperature=temperature,
+                num_predict=settings.LLM_MAX_TOKENS,
+                keep_alive=backend.get("keep_alive"),
+                client_kwargs=self._client_kwargs()
             )
-            
+
+        if not backend["api_key"]:
+            raise ValueError(f"API key not set for backend {backend['name']}")
+
+        if not backend["api_key"].startswith("sk-"):
+            raise ValueError(f"Invalid API key format for backend {backend['name']}")
+
+        from langchain_openai import ChatOpenAI
+        logger.info(f"使用模型: {backend['model']}，API Base URL: {backend['base_url']}")
+
+        # 路由器负责故障转移时不在单个后端内重试，尽快切换
+        return ChatOpenAI(
+            model_name=backend["model"],
+            temperature=temperature,
+            openai_api_key=backend["api_key"],
+            openai_api_base=backend["base_url"],
+            max_retries=0 if self.router else settings.MAX_RETRIES,
+            request_timeout=settings.REQUEST_TIMEOUT,
+            stream_usage=settings.LLM_STREAM_USAGE,
+            http_async_client=self.get_http_client("openai", backend["base_url"])
+        )
+
+    async def warmup(self):
+        """预热连接池，提前完成 TCP/TLS 握手"""
+        try:
+            self.get()
+        except Exception as e:
+            logger.warning(f"LLM 初始化失败: {str(e)}")
+            return
+        if self._factory:
+            return
+        if draft := self.get_draft():
+            try:
+                # 提前把草稿模型加载到内存，首个请求不必等待冷启动
+                await draft.ainvoke("你好")
+                logger.info("草稿模型预热完成")
+            except Exception as e:
+                logger.warning(f"草稿模型预热失败: {str(e)}")
+        for backend in self.backends:
+            if backend["type"] == "ollama":
+                continue
+            try:
+                client = self.get_http_client("openai", backend["base_url"])
+                await client.get(
+                    f"{backend['base_url'].rstrip('/')}/models",
+                    headers={"Authorization": f"Bearer {backend['api_key']}"}
+                )
+                logger.info(f"LLM 连接池预热完成: {backend['name']}")
+            except Exception as e:
+                logger.warning(f"LLM 连接池预热失败: {backend['name']} {str(e)}")
+
+    async def aclose(self):
+        """关闭所有连接池"""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+        self._views.clear()
+
+llm_registry = LLMClientRegistry()
+
+def get_llm(temperature: float = None, priority: Priority = Priority.INTERACTIVE):
+    """获取 LLM 实例（调用经过全局调度器）"""
+    try:
+        return ScheduledLLM(llm_registry.get(temperature), llm_scheduler, priority)
     except httpx.ConnectError as e:
         logger.error(f"连接 LLM 服务失败: {str(e)}")
         raise
     except Exception as e:
         logger.error(f"初始化 LLM 失败: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
+
+def get_llm_identity(llm) -> tuple:
+    """获取 LLM 实例的模型名称和温度，用于生成缓存键"""
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+    temperature = getattr(llm, "temperature", None)
+    return str(model), temperature
@@ -0,0 +1,218 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from app.config.settings import settings
+from app.core.models.token_budget import context_window, count_tokens
+from app.utils.logger import get_logger
+from app.utils.metrics import LLM_BACKEND_FAILURES, LLM_BACKEND_TTFT, LLM_HEDGES
+
+logger = get_logger()
+
+def backend_configs() -> List[dict]:
+    """后端列表：配置了 LLM_BACKENDS 时使用该列表，否则按 LLM_TYPE 使用单个后端"""
+    if not settings.LLM_BACKENDS:
+        if settings.LLM_TYPE == "ollama":
+            return [_with_defaults({"name": "ollama", "type": "ollama"}, 0)]
+        return [_with_defaults({"name": "openai", "type": "openai"}, 0)]
+    return [_with_defaults(dict(config), index) for index, config in enumerate(settings.LLM_BACKENDS)]
+
+def _with_defaults(config: dict, index: int) -> dict:
+    provider = config.setdefault("type", "openai")
+    if provider == "ollama":
+        config.setdefault("model", settings.OLLAMA_MODEL)
+        config.setdefault("base_url", settings.OLLAMA_API_BASE)
+    else:
+        config.setdefault("model", settings.OPENAI_MODEL)
+        config.setdefault("base_url", settings.OPENAI_API_BASE)
+        config.setdefault("api_key", settings.OPENAI_API_KEY)
+    config.setdefault("name", f"{provider}-{index}")
+    config.setdefault("weight", 1.0)
+    config.setdefault("short_text", False)  # 短文本优先使用该后端（如本地小模型）
+    return config
+
+def _quantile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+class Backend:
+    """一个上游后端的滚动统计：首 token 时间和连续失败次数"""
+
+    # 计算分位数所需的最少样本数
+    MIN_SAMPLES = 10
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.name = config["name"]
+        self.weight = float(config["weight"])
+        self.ttfts = deque(maxlen=200)
+        self.failures = 0
+        self.down_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def observe_ttft(self, seconds: float):
+        self.ttfts.append(seconds)
+        self.failures = 0
+        LLM_BACKEND_TTFT.labels(self.name).observe(seconds)
+
+    def observe_failure(self, error: Exception):
+        self.failures += 1
+        LLM_BACKEND_FAILURES.labels(self.name).inc()
+        if self.failures >= settings.LLM_BACKEND_MAX_FAILURES:
+            # 连续失败后暂时摘除，冷却结束后重新参与选择
+            self.down_until = time.monotonic() + settings.LLM_BACKEND_COOLDOWN
+            logger.warning(f"后端 {self.name} 连续失败 {self.failures} 次，暂停 {settings.LLM_BACKEND_COOLDOWN} 秒: {str(error)}")
+
+    def ttft(self, q: float) -> Optional[float]:
+        return _quantile(self.ttfts, q) if len(self.ttfts) >= self.MIN_SAMPLES else None
+
+    def stats(self) -> dict:
+        p50, p95 = self.ttft(0.5), self.ttft(0.95)
+        return {
+            "healthy": self.healthy,
+            "failures": self.failures,
+            "ttft_p50": round(p50, 3) if p50 is not None else None,
+            "ttft_p95": round(p95, 3) if p95 is not None else None,
+        }
+
+class LLMRouter:
+    """在多个后端之间按权重选择，首 token 超过分位数期限时对冲到第二个后端"""
+
+    def __init__(self, configs: List[dict]):
+        self.backends = [Backend(config) for config in configs]
+
+    def select(self, input) -> List[Backend]:
+        """返回候选后端：第一个是主后端，其余按首 token 中位数从快到慢排列，用于对冲和故障转移"""
+        healthy = [backend for backend in self.backends if backend.healthy] or list(self.backends)
+
+        primary = None
+        if settings.LLM_SHORT_TEXT_TOKENS and _input_tokens(input) <= settings.LLM_SHORT_TEXT_TOKENS:
+            primary = next((backend for backend in healthy if backend.config["short_text"]), None)
+        if primary is None:
+            candidates = [backend for backend in healthy if backend.weight > 0] or healthy
+            primary = random.choices(candidates, weights=[max(b.weight, 1e-6) for b in candidates])[0]
+
+        others = sorted(
+            (backend for backend in self.backends if backend is not primary),
+            key=lambda backend: (not backend.healthy, backend.ttft(0.5) or float("inf"))
+        )
+        return [primary] + others
+
+    def hedge_delay(self, backend: Backend) -> float:
+        """等待主后端首 token 的期限：该后端首 token 时间的分位数，样本不足时使用上限"""
+        observed = backend.ttft(settings.LLM_HEDGE_PERCENTILE)
+        if observed is None:
+            return settings.LLM_HEDGE_MAX_DELAY
+        return min(max(observed, settings.LLM_HEDGE_MIN_DELAY), settings.LLM_HEDGE_MAX_DELAY)
+
+    def stats(self) -> Dict[str, dict]:
+        return {backend.name: backend.stats() for backend in self.backends}
+
+def _input_tokens(input) -> int:
+    if isinstance(input, list):
+        return sum(count_tokens(message[1] if isinstance(message, tuple) else str(getattr(message, "content", message)))
+                   for message in input)
+    return count_tokens(str(input))
+
+class RoutedLLM:
+    """按路由器选择后端的模型实例，接口与 LangChain 聊天模型的 astream/ainvoke 一致"""
+
+    def __init__(self, router: LLMRouter, models: Dict[str, object], temperature: float):
+        self.router = router
+        self.models = models
+        self.temperature = temperature
+        # 以上下文窗口最小的模型作为标识，保证按它规划的提示词能放进任一后端
+        self.model_name = min(
+            (backend.config["model"] for backend in router.backends),
+            key=context_window
+        )
+
+    async def astream(self, input, *args, **kwargs):
+        backends = self.router.select(input)
+        stream, first = await self._race(backends, input, args, kwargs)
+        try:
+            if first is not None:
+                yield first
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    async def _race(self, backends: List[Backend], input, args, kwargs) -> Tuple[object, object]:
+        """依次启动候选后端，返回最先产生首个片段的 (流, 首个片段)，其余请求取消"""
+        queue = list(backends)
+        attempts: Dict[asyncio.Task, Backend] = {}
+
+        def start() -> float:
+            """启动下一个候选后端，返回等待它首 token 的截止时间"""
+            backend = queue.pop(0)
+            attempts[asyncio.create_task(self._first_chunk(backend, input, args, kwargs))] = backend
+            return time.monotonic() + self.router.hedge_delay(backend)
+
+        primary = backends[0]
+        deadline = start()
+        hedged = False
+        error = None
+        try:
+            while attempts:
+                timeout = None if hedged or not queue else max(deadline - time.monotonic(), 0)
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 首 token 超过期限，向下一个后端发出对冲请求，先返回的一方胜出
+                    hedged = True
+                    logger.info(f"后端 {primary.name} 首 token 超时，对冲到 {queue[0].name}")
+                    start()
+                    continue
+
+                for task in done:
+                    backend = attempts.pop(task)
+                    if task.exception() is None:
+                        if hedged:
+                            LLM_HEDGES.labels("primary" if backend is primary else "hedge").inc()
+                        return task.result()
+                    error = task.exception()
+                    backend.observe_failure(error)
+                    logger.warning(f"后端 {backend.name} 请求失败: {str(error)}")
+
+                # 故障转移：没有进行中的请求时立即尝试下一个后端
+                if not attempts and queue:
+                    deadline = start()
+            raise error
+        finally:
+            # 取消落后的请求，已经返回首个片段的流需要关闭以释放连接
+            for task in attempts:
+                task.cancel()
+            for result in await asyncio.gather(*attempts, return_exceptions=True):
+                if isinstance(result, tuple):
+                    await result[0].aclose()
+
+    async def _first_chunk(self, backend: Backend, input, args, kwargs):
+        """等待后端的首个片段，返回 (流, 首个片段)；合法的空响应返回 (流, None)，按成功处理"""
+        started = time.monotonic()
+        stream = self.models[backend.name].astream(input, *args, **kwargs)
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            # 在任务中抛出会变成 RuntimeError，被误判为后端故障并触发故障转移
+            first = None
+        except BaseException:
+            await stream.aclose()
+            raise
+        backend.observe_ttft(time.monotonic() - started)
+        return stream, first
+
+    async def ainvoke(self, input, *args, **kwargs):
+        """非流式调用只做故障转移：按候选顺序重试，不做对冲"""
+        error = None
+        for backend in self.router.select(input):
+            try:
+                return await self.models[backend.name].ainvoke(input, *args, **kwargs)
+            except Exception as e:
+                error = e
+                backend.observe_failure(e)
+                logger.warning(f"后端 {backend.name} 请求失败，尝试下一个: {str(e)}")
+        raise error
@@ -0,0 +1,186 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from app.config.settings import settings
+from app.core.models.token_budget import count_tokens
+from app.utils.logger import get_logger
+from app.utils.metrics import LLM_ACTIVE_CALLS, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT, record_usage
+
+logger = get_logger()
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # 短文本等交互式流式请求
+    BACKGROUND = 1   # 长文档分块等后台任务
+
+class SchedulerSaturated(Exception):
+    """调度队列已满或排队超时"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM 请求繁忙，请 {math.ceil(retry_after)} 秒后重试")
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """令牌桶限速，rate_per_minute 为 0 表示不限速"""
+
+    def __init__(self, rate_per_minute: int):
+        self.rate = rate_per_minute / 60
+        self.capacity = rate_per_minute
+        self.tokens = float(rate_per_minute)
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """预留 amount 个令牌，返回需要等待的秒数（允许透支，由后续请求等待补足）"""
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+class LLMScheduler:
+    """LLM 调用的准入控制：并发上限、优先级队列和请求/令牌速率限制"""
+
+    def __init__(self, max_concurrency: int, max_queue: int, rpm: int = 0, tpm: int = 0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.active = 0
+        self._queue = []
+        self._seq = itertools.count()
+        self._waits = deque(maxlen=200)
+        self._durations = deque(maxlen=200)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._queue if not future.done())
+
+    def retry_after(self) -> float:
+        """按当前排队长度和平均调用时长估算重试等待时间"""
+        average = sum(self._durations) / len(self._durations) if self._durations else 10.0
+        return min(60.0, max(1.0, (self.queue_depth + 1) * average / self.max_concurrency))
+
+    def check_admission(self):
+        """队列已满时立即拒绝，避免请求在排队中超时"""
+        if self.queue_depth >= self.max_queue:
+            raise SchedulerSaturated(self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE, tokens: int = 0):
+        """获取一个调用名额，退出时释放给队列中优先级最高的等待者"""
+        started = time.monotonic()
+        await self._acquire(priority)
+        try:
+            delay = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+            if delay:
+                await asyncio.sleep(delay)
+            waited = time.monotonic() - started
+            self._waits.append(waited)
+            LLM_QUEUE_WAIT.labels(priority.name.lower()).observe(waited)
+            call_started = time.monotonic()
+            yield
+            self._durations.append(time.monotonic() - call_started)
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: Priority):
+        if self.active < self.max_concurrency and not self.queue_depth:
+            self.active += 1
+            self._publish()
+            return
+
+        self.check_admission()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (int(priority), next(self._seq), future))
+        self._publish()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=settings.REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                raise SchedulerSaturated(self.retry_after())
+        except asyncio.CancelledError:
+            # 名额已经转交给当前任务时需要归还
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                future.cancel()
+            raise
+
+    def _release(self):
+        # 名额直接转交给优先级最高且仍在等待的请求
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                future.set_result(None)
+                self._publish()
+                return
+        self.active -= 1
+        self._publish()
+
+    def _publish(self):
+        LLM_QUEUE_DEPTH.set(self.queue_depth)
+        LLM_ACTIVE_CALLS.set(self.active)
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "active": self.active,
+            "queue_depth": self.queue_depth,
+            "max_concurrency": self.max_concurrency,
+            "wait_avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+            "wait_p95": round(waits[int(len(waits) * 0.95) - 1], 3) if waits else 0.0,
+        }
+
+class ScheduledLLM:
+    """LLM 代理，所有 ainvoke/astream 调用都经过调度器，并记录 token 用量"""
+
+    def __init__(self, llm, scheduler: LLMScheduler, priority: Priority = Priority.INTERACTIVE):
+        self._llm = llm
+        self._scheduler = scheduler
+        self.priority = priority
+
+    def __getattr__(self, name):
+        return getattr(self._llm, name)
+
+    def with_priority(self, priority: Priority) -> "ScheduledLLM":
+        return ScheduledLLM(self._llm, self._scheduler, priority)
+
+    def _estimate_tokens(self, input) -> int:
+        if isinstance(input, list):
+            # 消息列表逐条计数，固定的系统消息命中分词缓存
+            return sum(
+                count_tokens(message[1] if isinstance(message, tuple) else str(getattr(message, "content", message)))
+                for message in input
+            ) + settings.LLM_MAX_TOKENS
+        return count_tokens(str(input)) + settings.LLM_MAX_TOKENS
+
+    async def ainvoke(self, input, *args, **kwargs):
+        async with self._scheduler.slot(self.priority, self._estimate_tokens(input)):
+            response = await self._llm.ainvoke(input, *args, **kwargs)
+        record_usage(getattr(response, "usage_metadata", None))
+        return response
+
+    async def astream(self, input, *args, **kwargs):
+        async with self._scheduler.slot(self.priority, self._estimate_tokens(input)):
+            async for chunk in self._llm.astream(input, *args, **kwargs):
+                # 流式响应的用量在最后一个片段中
+                record_usage(getattr(chunk, "usage_metadata", None))
+                yield chunk
+
+def with_priority(llm, priority: Priority):
+    """为经过调度的 LLM 切换优先级，未经调度的 LLM 原样返回"""
+    return llm.with_priority(priority) if isinstance(llm, ScheduledLLM) else llm
+
+llm_scheduler = LLMScheduler(
+    max_concurrency=settings.MAX_CONCURRENT_REQUESTS,
+    max_queue=settings.LLM_MAX_QUEUE,
+    rpm=settings.LLM_RPM_LIMIT,
+    tpm=settings.LLM_TPM_LIMIT
+)
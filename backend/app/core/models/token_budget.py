@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from functools import lru_cache
+import hashlib
+import os
+import re
+import threading
+from app.config.settings import settings
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+# BPE 词表缓存到本地目录，避免每个 worker 启动时重新下载
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", settings.TOKENIZER_CACHE_DIR)
+
+# 各模型的上下文窗口（按前缀匹配，越具体的放在越前面）
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "deepseek": 64000,
+    "qwen2.5": 32768,
+    "llama3": 8192,
+}
+
+_CJK = re.compile(r"[　-〿㐀-鿿豈-﫿＀-￯]")
+
+def context_window(model: str) -> int:
+    """获取模型的上下文窗口，不超过 MAX_INPUT_TOKENS"""
+    for prefix, window in MODEL_CONTEXT_WINDOWS.items():
+        if model.startswith(prefix):
+            return min(window, settings.MAX_INPUT_TOKENS)
+    return settings.MAX_INPUT_TOKENS
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    try:
+        import tiktoken  # 首次计数或后台预热时才导入
+    except ImportError:  # 未安装 tiktoken 时使用字符估算
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # 离线且本地没有词表缓存时退回估算
+        logger.warning(f"加载分词器失败，使用字符估算: {str(e)}")
+        return None
+
+def _estimate_tokens(text: str) -> int:
+    cjk = _CJK.subn("", text)[1]
+    return int(cjk / settings.CHINESE_CHARS_PER_TOKEN + (len(text) - cjk) / 4) + 1
+
+_COUNT_CACHE_SIZE = 8192
+_INLINE_KEY_CHARS = 256  # 更长的文本以摘要作为缓存键，缓存中不保留整篇文档
+_counts: "OrderedDict[tuple, int]" = OrderedDict()
+_counts_lock = threading.Lock()  # 计数也会在线程中进行（文档规划、抽取式压缩）
+
+def count_tokens(text: str, model: str = None) -> int:
+    """计算文本的 token 数（按文本块缓存结果）"""
+    model = model or settings.OPENAI_MODEL
+    if len(text) > _INLINE_KEY_CHARS:
+        key = (model, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest())
+    else:
+        key = (model, text)
+    with _counts_lock:
+        if key in _counts:
+            _counts.move_to_end(key)
+            return _counts[key]
+
+    encoding = _get_encoding(model)
+    count = _estimate_tokens(text) if encoding is None else len(encoding.encode_ordinary(text))
+    with _counts_lock:
+        _counts[key] = count
+        if len(_counts) > _COUNT_CACHE_SIZE:
+            _counts.popitem(last=False)
+    return count
+
+def clear_token_counts():
+    """清空 token 计数缓存（基准测试测量未命中缓存的耗时）"""
+    with _counts_lock:
+        _counts.clear()
+
+def preload_encodings(models):
+    """加载各模型的分词器词表：本地没有缓存时需要下载，不能在事件循环中首次触发"""
+    for model in {settings.OPENAI_MODEL, *models}:
+        _get_encoding(model)
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = None) -> str:
+    """截取文本开头，使其不超过 max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding(model or settings.OPENAI_MODEL)
+    if encoding is not None:
+        tokens = encoding.encode_ordinary(text)
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+    # 估算模式下按比例截取后逐步收缩
+    total = _estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+    end = int(len(text) * max_tokens / total)
+    while end > 0 and _estimate_tokens(text[:end]) > max_tokens:
+        end = int(end * 0.95)
+    return text[:end]
+
+class TokenBudget:
+    """按模型上下文窗口规划提示词的 token 预算"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.context_window = context_window(model)
+
+    def count(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def input_budget(self, prompt_template: str = "") -> int:
+        """可用于输入文本的 token 数：窗口目标比例减去输出预留和模板开销"""
+        target = int(self.context_window * settings.CONTEXT_FILL_RATIO)
+        reserved = settings.LLM_MAX_TOKENS + self.count(prompt_template)
+        return max(target - reserved, 0)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        return truncate_to_tokens(text, max_tokens, self.model)
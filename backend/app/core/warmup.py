@@ -0,0 +1,39 @@
+import asyncio
+import importlib
+import time
+from app.core.mindmap.chains import json_formats
+from app.core.models.llm import llm_registry
+from app.core.models.token_budget import preload_encodings
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+# 首次请求才会用到、导入较慢的依赖；模型集成模块按配置的后端类型另外加入
+DEFERRED_MODULES = (
+    "langchain.text_splitter",
+    "PyPDF2",
+    "app.core.document.extractive",  # numpy
+)
+
+def preload_modules():
+    """同步导入重量级依赖、构建输出解析器并加载分词器词表
+
+    gunicorn 主进程在 fork 之前调用（worker 共享这部分内存），单独运行时由后台预热任务在线程中调用
+    """
+    started = time.perf_counter()
+    for name in (*llm_registry.provider_modules(), *DEFERRED_MODULES):
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"预加载 {name} 失败: {str(e)}")
+    json_formats()
+    preload_encodings(backend["model"] for backend in llm_registry.backends)
+    logger.info(f"依赖预加载完成，耗时 {time.perf_counter() - started:.2f}s")
+
+async def warmup():
+    """启动后的后台预热：先在线程中导入依赖（不阻塞事件循环），再预热 LLM 连接池"""
+    try:
+        await asyncio.to_thread(preload_modules)
+        await llm_registry.warmup()
+    except Exception as e:
+        logger.warning(f"后台预热失败: {str(e)}")
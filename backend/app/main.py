@@ -1,13 +1,37 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1 import router as api_router
 from app.config.settings import settings
 from app.api.middleware.error_handler import error_handler
 from app.api.middleware.request_logger import request_logger
+from app.core.models.llm import llm_registry
+from app.core.document.pdf_parser import PDFParser
+from app.core.mindmap.batch import batch_runner
+from app.core.warmup import warmup
+from app.utils.lifecycle import drain
+from app.utils.metrics import render_metrics
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时检查后端配置，依赖预加载和连接池预热在后台进行，worker 启动后立即可以接受请求；
+    # 关闭时中断未完成的批量任务并释放连接
+    llm_registry.validate()
+    # 上次异常退出的 worker 遗留的运行中任务
+    await asyncio.to_thread(batch_runner.store.expire_stale)
+    drain.install()
+    warmup_task = asyncio.create_task(warmup())
+    yield
+    warmup_task.cancel()
+    await batch_runner.shutdown()
+    await llm_registry.aclose()
+    PDFParser.shutdown()
 
 app = FastAPI(
     title=settings.APP_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # 配置 CORS
@@ -30,5 +54,13 @@ app.include_router(api_router)
 async def root():
     return {"message": "Welcome to AI MindMap API"}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 指标"""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000, debug=settings.DEBUG) 
\ No newline at end of file
+    # 单进程调试运行，生产环境使用 gunicorn -c gunicorn.conf.py
+    import uvicorn
+    uvicorn.run(app, host=settings.SERVER_HOST, port=settings.SERVER_PORT) 
\ No newline at end of file
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from pydantic import BaseModel, Field, model_validator
+from typing import Any, List, Optional, Dict
 from enum import Enum
 
 class Relationship(BaseModel):
@@ -50,8 +50,46 @@ class DocumentType(str, Enum):
     TEXT = "text"
     PDF = "pdf"
 
+class ProcessingMode(str, Enum):
+    AUTO = "auto"              # 按文本长度自动选择
+    SINGLE = "single"          # 单次调用，长文本截取后处理
+    MAP_REDUCE = "map_reduce"  # 分块并发总结后归纳
+    SECTIONS = "sections"      # 按论文章节并发生成后合并
+    PROGRESSIVE = "progressive"  # 只生成根节点和一级分支，更深的节点通过 /expand 按需生成
+
 class DocumentAnalysisRequest(BaseModel):
     content: str = Field(..., description="文本内容或base64编码的PDF")
     doc_type: DocumentType
-    max_depth: Optional[int] = Field(default=3, ge=1, le=5)
-    title: Optional[str] = None 
\ No newline at end of file
+    mode: ProcessingMode = Field(default=ProcessingMode.AUTO, description="长文本处理方式")
+    max_depth: Optional[int] = Field(default=None, ge=1, le=5, description="渐进模式下可展开到的最大层数（根节点以下），默认使用 MAX_MINDMAP_DEPTH；其他模式不支持")
+    title: Optional[str] = None 
+    document_id: Optional[str] = Field(default=None, description="文档标识，重新提交编辑后的同一文档时只重新生成变化的部分")
+
+    @model_validator(mode="after")
+    def _check_max_depth(self):
+        check_max_depth(self.mode, self.max_depth)
+        return self
+
+def check_max_depth(mode: ProcessingMode, max_depth: Optional[int]):
+    """max_depth 只限制渐进模式按需展开的深度，其他模式一次生成完整的树，不能按深度截断"""
+    if max_depth is not None and mode != ProcessingMode.PROGRESSIVE:
+        raise ValueError("max_depth 只适用于渐进模式（mode=progressive）")
+
+class BatchStatus(str, Enum):
+    RUNNING = "running"
+    COMPLETED = "completed"
+    INTERRUPTED = "interrupted"  # 服务关闭时未完成
+    FAILED = "failed"  # 执行任务的 worker 异常退出（心跳超时）
+
+class BatchRequest(BaseModel):
+    documents: List[DocumentAnalysisRequest]
+    concurrency: Optional[int] = Field(default=None, ge=1, description="同时生成的文档数，不超过服务端上限")
+
+class ExpandRequest(BaseModel):
+    session: str = Field(..., description="渐进模式 complete 事件中的 session")
+    node_id: str = Field(..., description="要展开的节点 id")
+
+class LayoutRequest(BaseModel):
+    tree: Dict[str, Any] = Field(..., description="思维导图树（complete 事件中的 tree），不做逐层模型校验")
+    h_gap: float = Field(default=80, ge=0, description="相邻两层之间的水平间距")
+    v_gap: float = Field(default=20, ge=0, description="相邻兄弟子树之间的最小垂直间距")
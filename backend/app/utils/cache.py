@@ -1,36 +1,199 @@
 from collections import OrderedDict
 from typing import Any, Optional
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
 import time
 from app.config.settings import settings
+from app.utils.logger import get_logger
+from app.utils.metrics import CACHE_REQUESTS
+
+logger = get_logger()
 
 class LRUCache:
     def __init__(self, max_size: int = 100, ttl: int = 3600):
         self.cache = OrderedDict()
         self.max_size = max_size
         self.ttl = ttl
-    
+
     def get(self, key: str) -> Optional[Any]:
         if key not in self.cache:
             return None
-        
+
         value, timestamp = self.cache[key]
         if time.time() - timestamp > self.ttl:
             del self.cache[key]
             return None
-            
+
         self.cache.move_to_end(key)
         return value
-    
+
     def set(self, key: str, value: Any):
         if key in self.cache:
             del self.cache[key]
         elif len(self.cache) >= self.max_size:
             self.cache.popitem(last=False)
-            
+
         self.cache[key] = (value, time.time())
         self.cache.move_to_end(key)
 
+class SQLiteDatabase:
+    """按进程打开的 SQLite 连接（WAL 模式），多个 worker 共享同一个文件"""
+
+    def __init__(self, path: str, schema: str):
+        self.path = path
+        self.schema = schema
+        self.lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def connect(self) -> sqlite3.Connection:
+        # fork 之后不能复用父进程的连接
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.schema)
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+class SQLiteCache:
+    """基于 SQLite 的持久化缓存，多个 uvicorn worker 共享同一个文件"""
+
+    # 每写入多少次清理一次过期数据
+    PURGE_EVERY = 200
+
+    SCHEMA = "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL);"
+
+    def __init__(self, path: str, ttl: int = 3600):
+        self.db = SQLiteDatabase(path, self.SCHEMA)
+        self.ttl = ttl
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.db.lock:
+            conn = self.db.connect()
+            row = conn.execute(
+                "SELECT value, created FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if time.time() - created > self.ttl:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+        return json.loads(value)
+
+    def set(self, key: str, value: Any):
+        payload = json.dumps(value, ensure_ascii=False)
+        with self.db.lock:
+            conn = self.db.connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created) VALUES (?, ?, ?)",
+                (key, payload, time.time())
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.ttl,))
+            conn.commit()
+
+class TieredCache:
+    """两级缓存：进程内 LRU 在前，持久化存储在后"""
+
+    def __init__(self, memory: LRUCache, disk: SQLiteCache):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            CACHE_REQUESTS.labels("memory").inc()
+            return value
+        return self._promote(key, self.get_persistent(key))
+
+    def set(self, key: str, value: Any):
+        self.memory.set(key, value)
+        self.set_persistent(key, value)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """与 get 相同，内存未命中时在线程中读取持久化层，不阻塞事件循环"""
+        value = self.memory.get(key)
+        if value is not None:
+            CACHE_REQUESTS.labels("memory").inc()
+            return value
+        return self._promote(key, await asyncio.to_thread(self.get_persistent, key))
+
+    async def aset(self, key: str, value: Any):
+        """与 set 相同，持久化层在线程中写入"""
+        self.memory.set(key, value)
+        await asyncio.to_thread(self.set_persistent, key, value)
+
+    def _promote(self, key: str, value: Optional[Any]) -> Optional[Any]:
+        """持久化层命中的值放入内存层（内存层只在事件循环所在线程中访问）"""
+        if value is not None:
+            CACHE_REQUESTS.labels("disk").inc()
+            self.memory.set(key, value)
+        else:
+            CACHE_REQUESTS.labels("miss").inc()
+        return value
+
+    def get_persistent(self, key: str) -> Optional[Any]:
+        """只读写持久化层，用于不适合常驻内存的大对象；SQLite 访问是同步的，应在线程中调用"""
+        try:
+            return self.disk.get(key)
+        except Exception as e:
+            logger.warning(f"读取持久化缓存失败: {str(e)}")
+            return None
+
+    def set_persistent(self, key: str, value: Any):
+        try:
+            self.disk.set(key, value)
+        except Exception as e:
+            logger.warning(f"写入持久化缓存失败: {str(e)}")
+
+_BLANK_LINES = re.compile(r"\n{3,}")
+_TRAILING_SPACES = re.compile(r"[ \t　]+\n")
+
+def normalize_text(text: str) -> str:
+    """规范化输入文本，去掉不影响语义的空白差异"""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _TRAILING_SPACES.sub("\n", text)
+    text = _BLANK_LINES.sub("\n\n", text)
+    return text.strip()
+
+def make_cache_key(
+    text: str,
+    model: str,
+    temperature: Optional[float],
+    namespace: str = "mindmap",
+    prompt_version: str = None
+) -> str:
+    """基于规范化输入、模型、温度和提示词版本生成稳定的缓存键"""
+    version = prompt_version or settings.PROMPT_VERSION
+    digest = hashlib.sha256()
+    for part in (namespace, version, model, repr(temperature)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x1f")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return f"{namespace}:{digest.hexdigest()}"
+
 cache = LRUCache(
-    max_size=settings.CACHE_MAX_SIZE,
-    ttl=settings.CACHE_TTL
-) 
\ No newline at end of file
+    max_size=settings.MAX_CACHE_ITEMS,
+    ttl=settings.CACHE_EXPIRE_TIME
+)
+
+# 思维导图结果缓存（跨 worker、跨重启共享）
+result_cache = TieredCache(
+    cache,
+    SQLiteCache(settings.CACHE_DB_PATH, ttl=settings.CACHE_EXPIRE_TIME)
+)
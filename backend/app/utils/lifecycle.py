@@ -0,0 +1,42 @@
+import signal
+import threading
+import time
+from typing import Optional
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+class DrainState:
+    """进程排空状态：收到 SIGTERM 后不再接受新的生成请求，已建立的 SSE 流继续直到完成
+
+    uvicorn 收到信号后停止监听并等待现有连接结束（最多 SERVER_DRAIN_TIMEOUT 秒），
+    这段时间里健康检查返回 503，负载均衡把新请求发往其他 worker。
+    """
+
+    def __init__(self):
+        self.since: Optional[float] = None
+
+    @property
+    def draining(self) -> bool:
+        return self.since is not None
+
+    def start(self):
+        if self.since is None:
+            self.since = time.monotonic()
+            logger.info("开始排空：不再接受新的生成请求，等待进行中的流式响应完成")
+
+    def install(self, signals=(signal.SIGTERM, signal.SIGINT)):
+        """在 uvicorn 已安装的信号处理函数之前标记排空，需要在服务启动后（lifespan 中）调用"""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for sig in signals:
+            previous = signal.getsignal(sig)
+
+            def handler(signum, frame, previous=previous):
+                self.start()
+                if callable(previous):
+                    previous(signum, frame)
+
+            signal.signal(sig, handler)
+
+drain = DrainState()
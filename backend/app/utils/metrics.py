@@ -0,0 +1,115 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# 各阶段耗时（秒），覆盖从毫秒级的提示词构建到分钟级的长文档处理
+STAGE_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+STAGE_DURATION = Histogram(
+    "mindmap_stage_duration_seconds",
+    "思维导图生成各阶段耗时",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "mindmap_llm_tokens_per_second",
+    "LLM 正文输出速度",
+    buckets=(1, 5, 10, 20, 40, 60, 80, 120, 200)
+)
+SSE_MESSAGES = Counter(
+    "mindmap_sse_messages_total",
+    "发送的 SSE 消息数",
+    ["type"]
+)
+CACHE_REQUESTS = Counter(
+    "mindmap_cache_requests_total",
+    "结果缓存查询次数",
+    ["result"]
+)
+PDF_PAGES = Counter(
+    "mindmap_pdf_pages_total",
+    "解析的 PDF 页数"
+)
+LLM_TOKENS = Counter(
+    "mindmap_llm_tokens_total",
+    "LLM 调用的 token 数（input 为全部输入，cached_input 为其中命中提供方前缀缓存的部分）",
+    ["type"]
+)
+LLM_BACKEND_TTFT = Histogram(
+    "mindmap_llm_backend_ttft_seconds",
+    "各 LLM 后端的首 token 时间",
+    ["backend"],
+    buckets=STAGE_BUCKETS
+)
+LLM_BACKEND_FAILURES = Counter(
+    "mindmap_llm_backend_failures_total",
+    "各 LLM 后端的失败次数",
+    ["backend"]
+)
+LLM_HEDGES = Counter(
+    "mindmap_llm_hedges_total",
+    "发出对冲请求后的胜出方",
+    ["winner"]
+)
+LLM_QUEUE_WAIT = Histogram(
+    "mindmap_llm_queue_wait_seconds",
+    "LLM 调用在调度器中的排队时间",
+    ["priority"],
+    buckets=STAGE_BUCKETS
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "mindmap_llm_queue_depth",
+    "LLM 调度器排队中的调用数",
+    multiprocess_mode="livesum"
+)
+LLM_ACTIVE_CALLS = Gauge(
+    "mindmap_llm_active_calls",
+    "正在进行的 LLM 调用数",
+    multiprocess_mode="livesum"
+)
+
+class StageTimer:
+    """记录单个请求各阶段耗时，同时上报到 Prometheus"""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        STAGE_DURATION.labels(name).observe(seconds)
+        self.timings[name] = round(self.timings.get(name, 0.0) + seconds, 3)
+
+def record_usage(usage: Optional[dict]):
+    """记录 LLM 响应中的 usage_metadata，提供方未返回时忽略"""
+    if not usage:
+        return
+    LLM_TOKENS.labels("input").inc(usage.get("input_tokens") or 0)
+    LLM_TOKENS.labels("output").inc(usage.get("output_tokens") or 0)
+    cached = (usage.get("input_token_details") or {}).get("cache_read")
+    if cached:
+        LLM_TOKENS.labels("cached_input").inc(cached)
+
+def render_metrics() -> tuple:
+    """导出 Prometheus 文本格式；多进程部署时汇总所有 worker 的指标"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
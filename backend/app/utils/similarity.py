@@ -0,0 +1,175 @@
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import re
+import threading
+import time
+import zlib
+from app.config.settings import settings
+from app.utils.cache import SQLiteDatabase
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+FINGERPRINT_BITS = 64
+
+_SPACES = re.compile(r"\s+")
+
+def simhash(text: str, shingle_size: int = 5) -> int:
+    """基于字符 shingle 的 64 位 SimHash（忽略空白），标题或结尾少量改动只影响少数几位"""
+    text = _SPACES.sub("", text.lower())
+    if len(text) < shingle_size:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1)}
+
+    # crc32 不受 PYTHONHASHSEED 影响，指纹可以跨进程、跨重启比较
+    hashes = array("Q")
+    for shingle in shingles:
+        data = shingle.encode("utf-8")
+        hashes.append((zlib.crc32(data) << 32) | zlib.crc32(data, 0x9E3779B9))
+
+    # 按字节列统计每一位为 1 的次数，避免逐位循环
+    data = hashes.tobytes()
+    counts = [0] * FINGERPRINT_BITS
+    for column in range(hashes.itemsize):
+        for value, count in Counter(data[column::hashes.itemsize]).items():
+            for bit in range(8):
+                if value >> bit & 1:
+                    counts[column * 8 + bit] += count
+
+    half = len(hashes) / 2
+    fingerprint = 0
+    for bit, count in enumerate(counts):
+        if count > half:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def similarity(a: int, b: int) -> float:
+    return 1 - (a ^ b).bit_count() / FINGERPRINT_BITS
+
+class SimHashIndex:
+    """指纹的 LSH 分段索引
+
+    64 位指纹分成 max_distance + 1 段，汉明距离不超过 max_distance 的两个指纹至少有一段完全相同，
+    查询只需比较这些段桶中的候选，与缓存的文档数量基本无关。
+    """
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        width = FINGERPRINT_BITS // bands
+        self._bands = [
+            (i * width, (FINGERPRINT_BITS if i == bands - 1 else (i + 1) * width) - i * width)
+            for i in range(bands)
+        ]
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in self._bands]
+        self._entries: List[Tuple[str, str, int]] = []  # (范围, 缓存键, 指纹)
+        self._positions: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _keys(self, fingerprint: int):
+        for band, (shift, width) in enumerate(self._bands):
+            yield band, (fingerprint >> shift) & ((1 << width) - 1)
+
+    def add(self, scope: str, key: str, fingerprint: int):
+        if key in self._positions:
+            return
+        position = len(self._entries)
+        self._entries.append((scope, key, fingerprint))
+        self._positions[key] = position
+        for band, value in self._keys(fingerprint):
+            self._buckets[band].setdefault(value, []).append(position)
+
+    def find(self, scope: str, fingerprint: int) -> Optional[Tuple[str, float]]:
+        """返回同一范围内最相似且距离不超过 max_distance 的 (缓存键, 相似度)"""
+        best, best_distance = None, self.max_distance + 1
+        for band, value in self._keys(fingerprint):
+            for position in self._buckets[band].get(value, ()):
+                entry_scope, key, candidate = self._entries[position]
+                distance = (candidate ^ fingerprint).bit_count()
+                if distance < best_distance and entry_scope == scope:
+                    best, best_distance = key, distance
+        if best is None:
+            return None
+        return best, 1 - best_distance / FINGERPRINT_BITS
+
+class SimilarityIndex:
+    """近似重复输入的查找：指纹持久化到 SQLite，各 worker 在内存中维护索引并增量同步"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS fingerprints (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL UNIQUE, scope TEXT NOT NULL,
+        fingerprint INTEGER NOT NULL, created REAL NOT NULL
+    );
+    """
+
+    # 距离上次同步超过多少秒时从数据库读取其他 worker 新增的指纹
+    SYNC_INTERVAL = 5.0
+
+    def __init__(self, path: str, threshold: float, ttl: int):
+        self.db = SQLiteDatabase(path, self.SCHEMA)
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_distance = max(0, int((1 - threshold) * FINGERPRINT_BITS))
+        self.index = SimHashIndex(self.max_distance)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._synced = 0.0
+        self._rebuilt = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return 0 < self.threshold < 1
+
+    def _sync(self):
+        if time.monotonic() - self._synced < self.SYNC_INTERVAL:
+            return
+        if time.monotonic() - self._rebuilt > self.ttl:
+            # 定期重建，丢弃内存中已过期的指纹
+            self.index = SimHashIndex(self.max_distance)
+            self._seq = 0
+            self._rebuilt = time.monotonic()
+        with self.db.lock:
+            rows = self.db.connect().execute(
+                "SELECT seq, key, scope, fingerprint FROM fingerprints WHERE seq > ? AND created > ? ORDER BY seq",
+                (self._seq, time.time() - self.ttl)
+            ).fetchall()
+        for seq, key, scope, fingerprint in rows:
+            # SQLite 整数是有符号 64 位
+            self.index.add(scope, key, fingerprint & (2 ** FINGERPRINT_BITS - 1))
+            self._seq = seq
+        self._synced = time.monotonic()
+
+    def find(self, scope: str, fingerprint: int) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            try:
+                self._sync()
+            except Exception as e:
+                logger.warning(f"同步相似度索引失败: {str(e)}")
+            return self.index.find(scope, fingerprint)
+
+    def add(self, scope: str, key: str, fingerprint: int):
+        with self._lock:
+            self.index.add(scope, key, fingerprint)
+        signed = fingerprint - 2 ** FINGERPRINT_BITS if fingerprint >= 2 ** (FINGERPRINT_BITS - 1) else fingerprint
+        try:
+            with self.db.lock:
+                conn = self.db.connect()
+                conn.execute(
+                    "INSERT OR IGNORE INTO fingerprints (key, scope, fingerprint, created) VALUES (?, ?, ?, ?)",
+                    (key, scope, signed, time.time())
+                )
+                conn.execute("DELETE FROM fingerprints WHERE created < ?", (time.time() - self.ttl,))
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"保存指纹失败: {str(e)}")
+
+# 思维导图结果的近似重复索引，命中的缓存键仍需在 result_cache 中存在
+similarity_index = SimilarityIndex(
+    settings.CACHE_DB_PATH,
+    threshold=settings.SIMILARITY_THRESHOLD,
+    ttl=settings.CACHE_EXPIRE_TIME
+)
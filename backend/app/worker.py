@@ -0,0 +1,22 @@
+"""gunicorn 使用的 uvicorn worker（见 gunicorn.conf.py）"""
+import importlib.util
+from app.config.settings import settings
+
+try:
+    from uvicorn_worker import UvicornWorker
+except ImportError:  # 旧版本 uvicorn 自带 worker
+    from uvicorn.workers import UvicornWorker
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+class MindMapWorker(UvicornWorker):
+    """事件循环使用 uvloop、HTTP 解析使用 httptools（未安装时退回标准实现），
+    并应用每个 worker 的连接上限和排空时间"""
+
+    CONFIG_KWARGS = {
+        "loop": "uvloop" if _installed("uvloop") else "asyncio",
+        "http": "httptools" if _installed("httptools") else "h11",
+        "limit_concurrency": settings.SERVER_MAX_CONNECTIONS or None,
+        "timeout_graceful_shutdown": settings.SERVER_DRAIN_TIMEOUT,
+    }
@@ -0,0 +1,158 @@
+"""端到端基准：在本进程启动 uvicorn，用假模型驱动流式接口
+
+示例：
+    python -m benchmarks.bench_endpoints --endpoint text --requests 200 --concurrency 20
+    python -m benchmarks.bench_endpoints --endpoint document --doc-type pdf --pages 30 --tps 0
+"""
+import argparse
+import asyncio
+import base64
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="思维导图流式接口基准测试")
+    parser.add_argument("--endpoint", choices=["text", "document"], default="text")
+    parser.add_argument("--requests", type=int, default=100, help="总请求数")
+    parser.add_argument("--concurrency", type=int, default=10, help="并发客户端数")
+    parser.add_argument("--chars", type=int, default=3000, help="文本输入长度")
+    parser.add_argument("--doc-type", choices=["text", "pdf"], default="text")
+    parser.add_argument("--pages", type=int, default=10, help="PDF 页数")
+    parser.add_argument("--mode", default="auto", help="文档处理模式")
+    parser.add_argument("--repeat", action="store_true", help="所有请求使用相同输入（测试缓存和请求合并）")
+    parser.add_argument("--tps", type=float, default=200.0, help="假模型每秒输出 token 数，0 表示不等待")
+    parser.add_argument("--latency", type=float, default=0.2, help="假模型首 token 延迟(秒)")
+    parser.add_argument("--think", action="store_true", help="输出 <think> 思考块")
+    parser.add_argument("--reasoning-kwargs", action="store_true", help="通过 reasoning_content 输出思考过程")
+    return parser.parse_args()
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+def build_payload(args, index: int) -> dict:
+    from benchmarks.corpus import make_pdf, make_text
+    seed = 0 if args.repeat else index
+    if args.endpoint == "text":
+        return {"content": make_text(args.chars, seed)}
+    if args.doc_type == "pdf":
+        content = base64.b64encode(make_pdf(args.pages, seed=seed)).decode("ascii")
+    else:
+        content = make_text(args.chars, seed)
+    return {"content": content, "doc_type": args.doc_type, "mode": args.mode}
+
+async def run_request(client, url: str, payload: dict) -> dict:
+    started = time.perf_counter()
+    first_event = None
+    events = 0
+    status = "incomplete"
+    async with client.stream("POST", url, json=payload) as response:
+        if response.status_code != 200:
+            return {"status": f"http {response.status_code}", "ttfe": 0.0, "latency": 0.0, "events": 0}
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            events += 1
+            if first_event is None:
+                first_event = time.perf_counter() - started
+            if '"type":"complete"' in line or '"type": "complete"' in line:
+                status = "ok"
+            elif '"type":"error"' in line or '"type": "error"' in line:
+                status = "error"
+    return {
+        "status": status,
+        "ttfe": first_event or 0.0,
+        "latency": time.perf_counter() - started,
+        "events": events
+    }
+
+async def run(args):
+    import uvicorn
+    from app.main import app
+    from app.utils.logger import get_logger
+    from benchmarks.fake_llm import FakeLLMConfig, install
+
+    logger = get_logger()
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    install(FakeLLMConfig(
+        tokens_per_second=args.tps,
+        first_token_latency=args.latency,
+        think_tags=args.think,
+        reasoning_kwargs=args.reasoning_kwargs
+    ))
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    path = endpoint_path(args)
+    payloads = [build_payload(args, i) for i in range(args.requests)]
+
+    cpu_started = time.process_time()
+    results, wall = await run_load(f"http://127.0.0.1:{port}{path}", payloads, args.concurrency)
+    cpu = time.process_time() - cpu_started
+
+    server.should_exit = True
+    await server_task
+
+    events = report(path, results, wall, args.concurrency)
+    print(f"CPU: {cpu:.2f}s  每事件 {cpu / max(events, 1) * 1e6:.1f}µs（包含同进程客户端开销）")
+    print(f"峰值 RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}MB")
+
+def endpoint_path(args) -> str:
+    return "/api/v1/mindmap/from-text/stream" if args.endpoint == "text" else "/api/v1/mindmap/from-document/stream"
+
+async def run_load(url: str, payloads: list, concurrency: int):
+    """用 concurrency 个客户端依次发送 payloads，返回 (结果列表, 总耗时)"""
+    import httpx
+
+    queue = asyncio.Queue()
+    for payload in payloads:
+        queue.put_nowait(payload)
+    results = []
+
+    async def worker(client):
+        while not queue.empty():
+            results.append(await run_request(client, url, queue.get_nowait()))
+
+    limits = httpx.Limits(max_connections=concurrency)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return results, time.perf_counter() - started
+
+def report(path: str, results: list, wall: float, concurrency: int) -> int:
+    """输出吞吐和延迟，返回事件总数"""
+    ok = [r for r in results if r["status"] == "ok"]
+    events = sum(r["events"] for r in results)
+    print(f"接口: {path}  请求数: {len(results)}  并发: {concurrency}  成功: {len(ok)}")
+    print(f"吞吐: {len(results) / wall:.2f} req/s  总耗时: {wall:.2f}s")
+    print(f"首个事件: p50 {percentile([r['ttfe'] for r in ok], 0.5) * 1000:.1f}ms  "
+          f"p95 {percentile([r['ttfe'] for r in ok], 0.95) * 1000:.1f}ms")
+    print(f"完整请求: p50 {percentile([r['latency'] for r in ok], 0.5) * 1000:.1f}ms  "
+          f"p95 {percentile([r['latency'] for r in ok], 0.95) * 1000:.1f}ms")
+    print(f"事件数: {events}  平均每请求 {statistics.mean([r['events'] for r in results] or [0]):.1f}")
+    failed = [r["status"] for r in results if r["status"] != "ok"]
+    if failed:
+        print(f"失败: {len(failed)} {sorted(set(failed))}")
+    return events
+
+def main():
+    args = parse_args()
+    # 配置需要在导入应用之前设置
+    os.environ.setdefault("CACHE_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="mindmap-bench-"), "cache.sqlite3"))
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
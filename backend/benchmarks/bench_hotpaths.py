@@ -0,0 +1,103 @@
+"""热点函数微基准：文本分块、抽取式压缩、节点校验、树布局、相似度指纹和 PDF 解析
+
+示例：
+    python -m benchmarks.bench_hotpaths --chars 200000 --pages 50
+"""
+import argparse
+import asyncio
+import base64
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="热点函数微基准")
+    parser.add_argument("--chars", type=int, default=100000, help="分块测试的文本长度")
+    parser.add_argument("--summary-tokens", type=int, default=20000, help="抽取式压缩的目标 token 数")
+    parser.add_argument("--pages", type=int, default=30, help="PDF 页数")
+    parser.add_argument("--depth", type=int, default=4, help="节点树深度")
+    parser.add_argument("--breadth", type=int, default=5, help="每个节点的子节点数")
+    parser.add_argument("--fingerprints", type=int, default=100000, help="相似度索引中的指纹数")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数")
+    return parser.parse_args()
+
+def measure(name: str, func, repeat: int, setup=None):
+    """运行 repeat 次，输出中位数和最小耗时"""
+    durations = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    print(f"{name:<36} 中位数 {statistics.median(durations) * 1000:9.2f}ms  最小 {min(durations) * 1000:9.2f}ms")
+
+def _iter_nodes(node: dict):
+    yield node
+    for child in node.get("children", []):
+        yield from _iter_nodes(child)
+
+def main():
+    args = parse_args()
+    os.environ.setdefault("CACHE_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="mindmap-bench-"), "cache.sqlite3"))
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+    from app.core.document.extractive import extract_summary
+    from app.core.document.pdf_parser import PDFParser
+    from app.core.document.sections import detect_sections
+    from app.core.mindmap.chains import MindMapChain
+    from app.core.mindmap.layout import layout_tree
+    from app.core.models.token_budget import clear_token_counts, count_tokens
+    from app.utils.logger import get_logger
+    from app.utils.similarity import SimHashIndex, simhash
+    from benchmarks.corpus import make_pdf, make_text, make_tree
+    from benchmarks.fake_llm import FakeChatModel
+
+    logger = get_logger()
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    chain = MindMapChain(FakeChatModel())
+    text = make_text(args.chars)
+    chunks = chain._split_text(text)
+    small_chunks = [chunk[:len(chunk) // 8] for chunk in chunks] * 4
+    pdf = make_pdf(args.pages)
+    pdf_base64 = base64.b64encode(pdf).decode("ascii")
+
+    print(f"文本 {len(text)} 字符 / {len(chunks)} 块，PDF {args.pages} 页 / {len(pdf)} 字节，"
+          f"节点树 {args.depth} 层 x {args.breadth}")
+
+    # 分词结果按文本缓存，每轮前清空以测量冷启动耗时
+    measure("MindMapChain._split_text", lambda: chain._split_text(text), args.repeat, clear_token_counts)
+    measure("MindMapChain._merge_small_chunks", lambda: chain._merge_small_chunks(small_chunks), args.repeat,
+            clear_token_counts)
+    measure("MindMapChain._validate_node_format", lambda: chain._validate_node_format(make_tree(args.depth, args.breadth)),
+            args.repeat)
+    tree = chain._validate_node_format(make_tree(args.depth, args.breadth))
+    measure(f"layout_tree ({sum(1 for _ in _iter_nodes(tree))} 节点)", lambda: layout_tree(tree), args.repeat)
+    measure("detect_sections", lambda: detect_sections(text), args.repeat)
+    measure(f"extract_summary ({args.summary_tokens} tokens)",
+            lambda: extract_summary(text, args.summary_tokens, count_tokens), args.repeat, clear_token_counts)
+    measure("simhash", lambda: simhash(text), args.repeat)
+
+    rng = random.Random(0)
+    index = SimHashIndex(max_distance=3)
+    for i in range(args.fingerprints):
+        index.add("bench", f"key-{i}", rng.getrandbits(64))
+    queries = [rng.getrandbits(64) for _ in range(1000)]
+    measure(f"SimHashIndex.find x1000 ({args.fingerprints} 条)",
+            lambda: [index.find("bench", query) for query in queries], args.repeat)
+    measure("PDFParser.parse_base64_pdf", lambda: PDFParser.parse_base64_pdf(pdf_base64), args.repeat)
+
+    async def read_pages():
+        async for _ in PDFParser.iter_pages(pdf):
+            pass
+
+    measure("PDFParser.iter_pages (进程池)", lambda: asyncio.run(read_pages()), args.repeat)
+    PDFParser.shutdown()
+
+if __name__ == "__main__":
+    main()
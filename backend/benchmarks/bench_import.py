@@ -0,0 +1,92 @@
+"""冷启动导入耗时检查：用 python -X importtime 导入 app.main，超出预算或提前导入了重量级依赖时以非零状态退出
+
+示例：
+    python -m benchmarks.bench_import --budget-ms 1500 --top 15
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+# 应在后台预热或首次使用时才导入的模块
+DEFERRED_MODULES = (
+    "openai",
+    "langchain_openai",
+    "langchain_ollama",
+    "langchain.output_parsers",
+    "langchain.text_splitter",
+    "langchain_text_splitters",
+    "PyPDF2",
+    "numpy",
+    "tiktoken",
+)
+
+# import time:  self [us] | cumulative | imported package
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="冷启动导入耗时检查")
+    parser.add_argument("--module", default="app.main", help="导入的模块")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="导入总耗时上限（毫秒）")
+    parser.add_argument("--top", type=int, default=15, help="输出累计耗时最多的直接导入数")
+    parser.add_argument("--repeat", type=int, default=3, help="运行次数，取总耗时最小的一次")
+    parser.add_argument("--llm-type", default="openai", help="LLM_TYPE，导入不应依赖后端配置")
+    return parser.parse_args()
+
+def run_once(module: str, llm_type: str, cache_dir: str) -> list:
+    """在干净的子进程中导入模块，返回 (缩进层级, 模块名, 自身耗时us, 累计耗时us) 列表"""
+    env = dict(os.environ, LLM_TYPE=llm_type, CACHE_DB_PATH=os.path.join(cache_dir, "cache.db"))
+    # 未配置 API Key 也必须能导入，配置检查推迟到应用启动
+    env.pop("OPENAI_API_KEY", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+def parse_importtime(output: str) -> list:
+    """解析 -X importtime 的输出，返回 (缩进层级, 模块名, 自身耗时us, 累计耗时us) 列表"""
+    records = []
+    for line in output.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            records.append((len(indent) // 2, name, int(self_us), int(cumulative_us)))
+    return records
+
+def total_ms(records: list) -> float:
+    """顶层导入（缩进最少）的累计耗时之和即总耗时"""
+    return sum(cumulative for level, _, _, cumulative in records if level == 0) / 1000
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        runs = [run_once(args.module, args.llm_type, cache_dir) for _ in range(args.repeat)]
+    totals = [total_ms(records) for records in runs]
+    records = runs[totals.index(min(totals))]
+    elapsed_ms = min(totals)
+
+    print(f"导入 {args.module}: {elapsed_ms:.1f}ms（预算 {args.budget_ms:.0f}ms，{args.repeat} 次取最小）")
+    # 顶层和第二层（被测模块直接导入的依赖）
+    top = sorted((r for r in records if r[0] <= 1), key=lambda r: r[3], reverse=True)[:args.top]
+    for _, name, _, cumulative in top:
+        print(f"  {cumulative / 1000:9.1f}ms  {name}")
+
+    loaded = {name for _, name, _, _ in records}
+    eager = [name for name in DEFERRED_MODULES if name in loaded]
+    failed = False
+    if eager:
+        print(f"提前导入了应延迟加载的模块: {', '.join(eager)}")
+        failed = True
+    if elapsed_ms > args.budget_ms:
+        print(f"导入耗时超出预算 {elapsed_ms - args.budget_ms:.1f}ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
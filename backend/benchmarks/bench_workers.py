@@ -0,0 +1,129 @@
+"""worker 数扩展基准：用生产配置（gunicorn.conf.py）依次以不同 worker 数启动服务，压测流式接口
+
+示例：
+    python -m benchmarks.bench_workers --workers 1 2 4 8 --requests 2000 --concurrency 200 --clients 4
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from benchmarks.bench_endpoints import build_payload, endpoint_path, percentile, run_load
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="按 worker 数测试吞吐扩展")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--endpoint", choices=["text", "document"], default="text")
+    parser.add_argument("--requests", type=int, default=1000, help="每轮总请求数")
+    parser.add_argument("--concurrency", type=int, default=100, help="总并发连接数")
+    parser.add_argument("--clients", type=int, default=2, help="压测客户端进程数，避免客户端先成为瓶颈")
+    parser.add_argument("--chars", type=int, default=3000, help="文本输入长度")
+    parser.add_argument("--doc-type", choices=["text", "pdf"], default="text")
+    parser.add_argument("--pages", type=int, default=10, help="PDF 页数")
+    parser.add_argument("--mode", default="auto", help="文档处理模式")
+    parser.add_argument("--tps", type=float, default=0, help="假模型每秒输出 token 数，0 表示不等待（只测服务开销）")
+    parser.add_argument("--latency", type=float, default=0, help="假模型首 token 延迟(秒)")
+    args = parser.parse_args()
+    args.repeat = False
+    return args
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(workers: int, port: int, args) -> subprocess.Popen:
+    data_dir = tempfile.mkdtemp(prefix="mindmap-bench-")
+    env = {
+        **os.environ,
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(port),
+        "SERVER_WORKERS": str(workers),
+        "BENCH_TPS": str(args.tps),
+        "BENCH_LATENCY": str(args.latency),
+        "CACHE_DB_PATH": os.path.join(data_dir, "cache.sqlite3"),
+        "BATCH_DB_PATH": os.path.join(data_dir, "batch.sqlite3"),
+        "PROMETHEUS_MULTIPROC_DIR": os.path.join(data_dir, "metrics"),
+    }
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    # 测量服务自身开销，调度器不应成为瓶颈
+    env.setdefault("MAX_CONCURRENT_REQUESTS", "10000")
+    env.setdefault("LLM_MAX_QUEUE", "10000")
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "benchmarks/gunicorn_bench.conf.py", "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL
+    )
+
+def wait_ready(port: int, workers: int, timeout: float = 60):
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/v1/mindmap/health").status_code == 200:
+                # 等所有 worker 完成启动
+                time.sleep(0.5 + 0.2 * workers)
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("服务启动超时")
+
+def client(url: str, payloads: list, concurrency: int):
+    return asyncio.run(run_load(url, payloads, concurrency))
+
+def run_round(workers: int, args) -> dict:
+    port = free_port()
+    server = start_server(workers, port, args)
+    try:
+        wait_ready(port, workers)
+        url = f"http://127.0.0.1:{port}{endpoint_path(args)}"
+        payloads = [build_payload(args, i) for i in range(args.requests)]
+        clients = max(1, args.clients)
+        shares = [payloads[i::clients] for i in range(clients)]
+        concurrency = max(1, args.concurrency // clients)
+
+        started = time.perf_counter()
+        with ProcessPoolExecutor(clients) as pool:
+            outputs = list(pool.map(client, [url] * clients, shares, [concurrency] * clients))
+        wall = time.perf_counter() - started
+        results = [result for output, _ in outputs for result in output]
+    finally:
+        drain_started = time.perf_counter()
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+        drain = time.perf_counter() - drain_started
+
+    ok = [r for r in results if r["status"] == "ok"]
+    return {
+        "workers": workers,
+        "rps": len(ok) / wall,
+        "ttfe_p50": percentile([r["ttfe"] for r in ok], 0.5) * 1000,
+        "ttfe_p95": percentile([r["ttfe"] for r in ok], 0.95) * 1000,
+        "latency_p95": percentile([r["latency"] for r in ok], 0.95) * 1000,
+        "failed": len(results) - len(ok),
+        "drain": drain,
+    }
+
+def main():
+    args = parse_args()
+    print(f"接口: {endpoint_path(args)}  每轮请求数: {args.requests}  并发: {args.concurrency}  "
+          f"客户端进程: {args.clients}  CPU 核数: {os.cpu_count()}")
+    print(f"{'workers':>8} {'req/s':>9} {'加速比':>7} {'首事件p50':>10} {'首事件p95':>10} {'完整p95':>10} {'失败':>5} {'排空':>6}")
+    baseline = None
+    for workers in args.workers:
+        row = run_round(workers, args)
+        baseline = baseline or row["rps"]
+        print(f"{workers:>8} {row['rps']:>9.1f} {row['rps'] / baseline:>7.2f} {row['ttfe_p50']:>8.1f}ms "
+              f"{row['ttfe_p95']:>8.1f}ms {row['latency_p95']:>8.1f}ms {row['failed']:>5} {row['drain']:>5.1f}s")
+
+if __name__ == "__main__":
+    main()
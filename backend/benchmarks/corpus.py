@@ -0,0 +1,64 @@
+"""生成基准测试用的文本和 PDF 语料"""
+import random
+import zlib
+
+_WORDS_ZH = ["模型", "注意力", "实验", "结果", "性能", "数据集", "训练", "推理", "延迟", "吞吐量",
+             "结构", "方法", "创新", "贡献", "参数", "优化", "评估", "基线", "误差", "分布"]
+_WORDS_EN = ["transformer", "attention", "latency", "throughput", "benchmark", "dataset",
+             "training", "inference", "gradient", "baseline", "token", "layer"]
+
+def make_text(chars: int, seed: int = 0) -> str:
+    """生成中英混合、带段落的文本"""
+    rng = random.Random(seed)
+    paragraphs, size = [], 0
+    while size < chars:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            words = [rng.choice(_WORDS_ZH if rng.random() < 0.7 else _WORDS_EN) for _ in range(rng.randint(6, 16))]
+            sentences.append("".join(words) + rng.choice("。！？"))
+        paragraph = "".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:chars]
+
+def make_tree(depth: int, breadth: int, prefix: str = "root") -> dict:
+    """生成缺少部分字段的节点树，用于测试节点格式校验"""
+    node = {"label": f"节点 {prefix}"}
+    if depth:
+        node["children"] = [make_tree(depth - 1, breadth, f"{prefix}-{i}") for i in range(breadth)]
+    return node
+
+def make_pdf(pages: int, lines_per_page: int = 40, seed: int = 0) -> bytes:
+    """生成包含 ASCII 文本的最小合法 PDF"""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # 页面树，最后填充
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for _ in range(pages):
+        lines = [" ".join(rng.choice(_WORDS_EN) for _ in range(10)) for _ in range(lines_per_page)]
+        stream = "BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(f"({line}) '" for line in lines) + " ET"
+        data = zlib.compress(stream.encode("ascii"))
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(data) + data + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode("ascii")
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
@@ -0,0 +1,106 @@
+"""确定性的本地假模型，用于在没有 LLM 服务的情况下测量本服务自身的开销"""
+import asyncio
+import json
+import random
+from dataclasses import dataclass
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+MINDMAP_MARKDOWN = """# 基准测试：思维导图生成服务的性能剖析
+## 输入处理：文档解析与文本规范化
+### PDF 解析：进程池并行提取每页文本
+- 页面按批次提交到子进程，结果按页码顺序返回
+- 达到处理模式所需的文本量后提前停止
+### 文本规范化：统一换行和空白，生成稳定缓存键
+- 使用 sha256 摘要作为缓存键，跨 worker 共享
+## 流式生成：增量解析与批量刷新
+### 增量解析：逐行解析标题和列表项
+- 每个完整的行产生一个 node_added 事件
+- 节点 id 按位置生成，保证稳定
+### 批量刷新：按字符数或时间间隔合并片段
+- 慢连接上合并积压的片段，减少消息数
+## 资源调度：并发控制与速率限制
+### 优先级队列：交互式请求优先于后台任务
+- 队列已满时立即返回 429 和 Retry-After
+"""
+
+THINKING = "用户需要一份结构清晰的思维导图，先确定核心主题，再展开主要方面和具体要点。"
+
+@dataclass
+class FakeLLMConfig:
+    tokens_per_second: float = 200.0   # 输出速度，0 表示不等待
+    first_token_latency: float = 0.2   # 首 token 延迟(秒)
+    chars_per_token: int = 2           # 每个 token 的字符数
+    think_tags: bool = False           # 使用 <think> 标记输出思考过程（DeepSeek 风格）
+    reasoning_kwargs: bool = False     # 通过 additional_kwargs.reasoning_content 输出思考过程
+    seed: int = 0
+
+class FakeChatModel:
+    """按配置的速率流式输出固定 Markdown 的假模型"""
+
+    def __init__(self, config: FakeLLMConfig = None, temperature: float = 0.8):
+        self.config = config or FakeLLMConfig()
+        self.model_name = "fake-llm"
+        self.temperature = temperature
+        self._random = random.Random(self.config.seed)
+
+    def _tokens(self, text: str):
+        size = self.config.chars_per_token
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    async def _pace(self):
+        if self.config.tokens_per_second:
+            await asyncio.sleep(1 / self.config.tokens_per_second)
+
+    async def astream(self, input, *args, **kwargs):
+        await asyncio.sleep(self.config.first_token_latency)
+        if self.config.reasoning_kwargs:
+            for token in self._tokens(THINKING):
+                await self._pace()
+                yield AIMessageChunk(content="", additional_kwargs={"reasoning_content": token})
+        if self.config.think_tags:
+            yield AIMessageChunk(content="<think>")
+            for token in self._tokens(THINKING):
+                await self._pace()
+                yield AIMessageChunk(content=token)
+            yield AIMessageChunk(content="</think>")
+        for token in self._tokens(self._respond(str(input))):
+            await self._pace()
+            yield AIMessageChunk(content=token)
+
+    async def ainvoke(self, input, *args, **kwargs):
+        prompt = str(input)
+        content = self._respond(prompt)
+        await asyncio.sleep(self.config.first_token_latency)
+        if self.config.tokens_per_second:
+            await asyncio.sleep(len(self._tokens(content)) / self.config.tokens_per_second)
+        return AIMessage(content=content)
+
+    def _respond(self, prompt: str) -> str:
+        """根据提示词类型返回对应格式的固定结果"""
+        if "只输出 JSON" in prompt:
+            return json.dumps({
+                "id": "root",
+                "label": "基准测试文档",
+                "children": [
+                    {"id": str(i), "label": f"主要方面 {i}", "children": []}
+                    for i in range(1, 5)
+                ]
+            }, ensure_ascii=False)
+        if "当前分支" in prompt:
+            children = [
+                {"id": f"d-{i}", "label": f"具体要点 {i}：{self._random.randint(10, 99)}%"}
+                for i in range(1, 4)
+            ]
+            return "```json\n" + json.dumps({"children": children}, ensure_ascii=False) + "\n```"
+        if "文本片段" in prompt:
+            return "\n".join(f"- 要点 {i}" for i in range(1, 5))
+        if "当前节点" in prompt:
+            return "\n".join(f"- 展开要点 {i}：{self._random.randint(10, 99)}%" for i in range(1, 5))
+        if "前两层" in prompt:
+            return "\n".join(line for line in MINDMAP_MARKDOWN.splitlines() if line.startswith(("# ", "## "))) + "\n"
+        return MINDMAP_MARKDOWN
+
+def install(config: FakeLLMConfig = None):
+    """把假模型注入 get_llm()"""
+    from app.core.models.llm import llm_registry
+    llm_registry.override(lambda temperature: FakeChatModel(config, temperature))
@@ -0,0 +1,17 @@
+"""基准测试使用的 gunicorn 配置：沿用生产配置，在 fork 之前把模型替换为假模型"""
+import os
+import runpy
+
+globals().update(runpy.run_path(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+))
+
+_when_ready = when_ready  # noqa: F821
+
+def when_ready(server):
+    _when_ready(server)
+    from benchmarks.fake_llm import FakeLLMConfig, install
+    install(FakeLLMConfig(
+        tokens_per_second=float(os.environ.get("BENCH_TPS", "200")),
+        first_token_latency=float(os.environ.get("BENCH_LATENCY", "0.2"))
+    ))
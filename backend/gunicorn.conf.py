@@ -0,0 +1,48 @@
+"""生产部署配置
+
+    gunicorn -c gunicorn.conf.py
+
+主进程预加载应用和重量级依赖（模型集成、PyPDF2、numpy、分词器词表）后再 fork 出 worker，
+worker 共享这部分内存并且启动更快（应用本身的导入保持轻量，单独运行时这些依赖由后台预热任务导入）。
+每个 worker 是一个独立的事件循环，SSE 流和 PDF 解析分摊到各个 worker。
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# 多进程汇总 Prometheus 指标，需要在导入 prometheus_client 之前设置
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "mindmap-metrics"))
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from app.config.settings import settings  # noqa: E402
+
+wsgi_app = "app.main:app"
+bind = f"{settings.SERVER_HOST}:{settings.SERVER_PORT}"
+workers = settings.SERVER_WORKERS or multiprocessing.cpu_count()
+worker_class = "app.worker.MindMapWorker"
+preload_app = True
+
+keepalive = settings.SERVER_KEEPALIVE
+# 事件循环被阻塞超过该时间的 worker 会被重启
+timeout = 120
+# SIGTERM 后 worker 自己排空 SERVER_DRAIN_TIMEOUT 秒，主进程多等一会再强制结束
+graceful_timeout = settings.SERVER_DRAIN_TIMEOUT + 10
+max_requests = settings.SERVER_MAX_REQUESTS
+max_requests_jitter = max_requests // 10
+
+def on_starting(server):
+    # 清理上次运行遗留的指标文件（worker fork 后会重新创建自己的文件）
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+def when_ready(server):
+    # fork 之前导入重量级依赖、加载各后端模型的分词器词表
+    from app.core.warmup import preload_modules
+    preload_modules()
+    server.log.info(f"应用已预加载，启动 {workers} 个 worker")
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
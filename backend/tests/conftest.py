@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# 测试使用独立的缓存和任务数据库，不读写 data/ 下的文件
+_data_dir = tempfile.mkdtemp(prefix="wang-mind-tests-")
+os.environ.setdefault("CACHE_DB_PATH", os.path.join(_data_dir, "cache.sqlite3"))
+os.environ.setdefault("BATCH_DB_PATH", os.path.join(_data_dir, "batch.sqlite3"))
@@ -0,0 +1,75 @@
+import asyncio
+import time
+import pytest
+from app.config.settings import settings
+from app.core.mindmap.batch import BatchRunner, BatchStore
+from app.schemas.mindmap import BatchStatus
+
+@pytest.fixture
+def store(tmp_path):
+    return BatchStore(str(tmp_path / "batch.db"), ttl=3600)
+
+def _age(store: BatchStore, job_id: str, seconds: float):
+    # 模拟 worker 被强制终止后心跳停止了一段时间
+    with store.db.lock:
+        conn = store.db.connect()
+        conn.execute("UPDATE batch_jobs SET updated = ? WHERE id = ?", (time.time() - seconds, job_id))
+        conn.commit()
+
+def _stored_status(store: BatchStore, job_id: str) -> str:
+    with store.db.lock:
+        return store.db.connect().execute("SELECT status FROM batch_jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+def test_stale_running_job_is_failed_when_read(store):
+    store.create("stale", total=2)
+    _age(store, "stale", settings.BATCH_LEASE_TIMEOUT + 1)
+    assert store.get_job("stale")["status"] == BatchStatus.FAILED.value
+    # 查询只读，不写数据库
+    assert _stored_status(store, "stale") == BatchStatus.RUNNING.value
+
+def test_job_with_fresh_heartbeat_stays_running(store):
+    store.create("alive", total=2)
+    _age(store, "alive", settings.BATCH_LEASE_TIMEOUT + 1)
+    store.heartbeat("alive")
+    assert store.get_job("alive")["status"] == BatchStatus.RUNNING.value
+
+def test_finished_jobs_are_not_expired(store):
+    store.create("done", total=1)
+    store.set_status("done", BatchStatus.COMPLETED)
+    _age(store, "done", settings.BATCH_LEASE_TIMEOUT + 1)
+    # 心跳只刷新运行中的任务
+    store.heartbeat("done")
+    assert store.get_job("done")["status"] == BatchStatus.COMPLETED.value
+
+def test_expire_stale_on_startup(store):
+    store.create("a", total=1)
+    store.create("b", total=1)
+    store.create("c", total=1)
+    _age(store, "a", settings.BATCH_LEASE_TIMEOUT + 1)
+    _age(store, "b", settings.BATCH_LEASE_TIMEOUT + 1)
+    assert store.expire_stale() == 2
+    assert store.expire_stale() == 0
+    assert _stored_status(store, "a") == BatchStatus.FAILED.value
+    assert store.get_job("c")["status"] == BatchStatus.RUNNING.value
+
+async def test_follow_stops_when_worker_is_gone(store):
+    runner = BatchRunner(store)
+    store.create("orphan", total=2)
+    store.save_item("orphan", 0, result={"markdown": "# 主题"})
+    _age(store, "orphan", settings.BATCH_LEASE_TIMEOUT + 1)
+
+    async def collect():
+        return [line async for line in runner.iter_results("orphan", follow=True, poll_interval=0.01)]
+
+    lines = await asyncio.wait_for(collect(), timeout=1)
+    assert len(lines) == 1
+
+async def test_runner_refreshes_heartbeat(store, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_HEARTBEAT_INTERVAL", 0.01)
+    runner = BatchRunner(store)
+    store.create("busy", total=1)
+    _age(store, "busy", settings.BATCH_LEASE_TIMEOUT - 1)
+    heartbeat = asyncio.create_task(runner._heartbeat("busy"))
+    await asyncio.sleep(0.05)
+    heartbeat.cancel()
+    assert time.time() - store.get_job("busy")["updated"] < 1
@@ -0,0 +1,105 @@
+import pytest
+from app.utils import cache as cache_module
+from app.utils.cache import LRUCache, SQLiteCache, TieredCache, make_cache_key
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    return clock
+
+def _tiered(tmp_path, max_size: int = 2, ttl: int = 60) -> TieredCache:
+    return TieredCache(LRUCache(max_size=max_size, ttl=ttl), SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl=ttl))
+
+def test_evicted_entries_fall_back_to_sqlite(tmp_path, clock):
+    cache = _tiered(tmp_path, max_size=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, {"key": key})
+
+    # 最久未使用的 a 被挤出内存层，但仍能从 SQLite 读到，并重新放回内存层
+    assert "a" not in cache.memory.cache
+    assert cache.get("a") == {"key": "a"}
+    assert "a" in cache.memory.cache
+    assert "b" not in cache.memory.cache
+    assert cache.get("b") == {"key": "b"}
+
+async def test_async_get_falls_back_to_sqlite(tmp_path, clock):
+    cache = _tiered(tmp_path, max_size=1)
+    await cache.aset("a", [1])
+    await cache.aset("b", [2])
+    assert "a" not in cache.memory.cache
+    assert await cache.aget("a") == [1]
+    assert await cache.aget("missing") is None
+
+def test_lru_keeps_recently_read_entries(tmp_path, clock):
+    cache = _tiered(tmp_path, max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert list(cache.memory.cache) == ["a", "c"]
+
+def test_memory_tier_expires(clock):
+    memory = LRUCache(max_size=10, ttl=60)
+    memory.set("a", 1)
+    clock.now += 59
+    assert memory.get("a") == 1
+    clock.now += 2
+    assert memory.get("a") is None
+    assert "a" not in memory.cache
+
+def test_sqlite_tier_expires(tmp_path, clock):
+    disk = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    disk.set("a", {"value": 1})
+    clock.now += 59
+    assert disk.get("a") == {"value": 1}
+    clock.now += 2
+    assert disk.get("a") is None
+    # 过期的行在读取时删除
+    assert disk.db.connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0] == 0
+
+def test_expired_entries_are_not_served_from_either_tier(tmp_path, clock):
+    cache = _tiered(tmp_path, ttl=60)
+    cache.set("a", 1)
+    clock.now += 61
+    assert cache.get("a") is None
+    assert cache.get_persistent("a") is None
+
+def test_sqlite_is_shared_between_instances(tmp_path, clock):
+    # 另一个 worker 的内存层为空，从共享的 SQLite 文件中读到结果
+    _tiered(tmp_path).set("a", "共享")
+    assert _tiered(tmp_path).get("a") == "共享"
+
+BASE = {"text": "输入文本", "model": "gpt-4o-mini", "temperature": 0.3, "prompt_version": "v1"}
+
+@pytest.mark.parametrize("field, value", [
+    ("model", "gpt-4o"),
+    ("temperature", 0.7),
+    ("temperature", None),
+    ("prompt_version", "v2"),
+    ("text", "另一段输入文本"),
+])
+def test_cache_key_changes_with_inputs(field, value):
+    assert make_cache_key(**{**BASE, field: value}) != make_cache_key(**BASE)
+
+def test_cache_key_depends_on_namespace():
+    key = make_cache_key(**BASE, namespace="outline")
+    assert key.startswith("outline:")
+    assert key.split(":", 1)[1] != make_cache_key(**BASE).split(":", 1)[1]
+
+def test_cache_key_ignores_whitespace_differences():
+    assert make_cache_key(**{**BASE, "text": "  输入文本\r\n\n\n\n"}) == make_cache_key(**BASE)
+
+def test_cache_key_uses_configured_prompt_version(monkeypatch):
+    without_version = {**BASE, "prompt_version": None}
+    monkeypatch.setattr(cache_module.settings, "PROMPT_VERSION", "v1")
+    assert make_cache_key(**without_version) == make_cache_key(**BASE)
+    monkeypatch.setattr(cache_module.settings, "PROMPT_VERSION", "v9")
+    assert make_cache_key(**without_version) != make_cache_key(**BASE)
@@ -0,0 +1,163 @@
+import json
+import re
+from collections import Counter
+import pytest
+from langchain_core.messages import AIMessage
+from app.config.settings import settings
+from app.core.mindmap import chains as chains_module
+from app.core.mindmap.chains import MindMapChain
+from app.core.mindmap.prompts import CHUNK_SUMMARY_PROMPT, DETAILS_PROMPT, STRUCTURE_PROMPT
+from app.utils.cache import LRUCache, SQLiteCache, TieredCache
+
+TOPICS = ["存储引擎", "网络协议", "调度算法", "安全审计"]
+
+def _paragraph(topic: str, index: int, wording: str = "设计取舍") -> str:
+    return f"{topic}：第{index}段讨论{topic}的{wording}，" + "".join(
+        f"其中第{j}项指标在压测中的表现为{(index * 31 + j * 7) % 97}毫秒；" for j in range(8)
+    )
+
+PARAGRAPHS = [_paragraph(topic, index) for topic in TOPICS for index in range(10)]
+
+def _document(paragraphs) -> str:
+    return "\n\n".join(paragraphs)
+
+def _edited(position: int) -> list:
+    paragraphs = list(PARAGRAPHS)
+    topic = TOPICS[position // 10]
+    paragraphs[position] = _paragraph(topic, position % 10, wording="设计权衡")
+    return paragraphs
+
+class ScriptedLLM:
+    """按提示词类型返回确定结果的模型，记录每类调用的次数"""
+
+    model_name = "scripted-llm"
+    temperature = 0.5
+
+    def __init__(self):
+        self.calls = Counter()
+        self.branches = []
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        system, human = messages[0][1], messages[1][1]
+        if system == CHUNK_SUMMARY_PROMPT.system:
+            self.calls["summary"] += 1
+            # 每段开头的主题作为要点，分支按标签匹配到相关分块
+            return AIMessage(content="\n".join(f"- {line.split('：')[0]}" for line in human.splitlines() if "：第" in line))
+        if system == STRUCTURE_PROMPT.system:
+            self.calls["structure"] += 1
+            return AIMessage(content=json.dumps({"id": "root", "label": "系统设计", "children": [
+                {"id": str(i), "label": topic, "children": []} for i, topic in enumerate(TOPICS, 1)
+            ]}, ensure_ascii=False))
+        if system.startswith(DETAILS_PROMPT.system):
+            self.calls["details"] += 1
+            category = re.search(r"当前分支：(.*)", human).group(1)
+            self.branches.append(category)
+            children = [{"id": str(i), "label": f"{category}要点{i}"} for i in range(1, 3)]
+            return AIMessage(content="```json\n" + json.dumps({"children": children}, ensure_ascii=False) + "\n```")
+        raise AssertionError("未知的提示词")
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    cache = TieredCache(LRUCache(), SQLiteCache(str(tmp_path / "cache.sqlite3")))
+    monkeypatch.setattr(chains_module, "result_cache", cache)
+    monkeypatch.setattr(settings, "DETAIL_SOURCE_CHUNKS", 2)
+    return cache
+
+def _chain(llm=None) -> MindMapChain:
+    chain = MindMapChain(llm or ScriptedLLM())
+    chain.chunk_tokens = 600
+    return chain
+
+async def _run(chain: MindMapChain, paragraphs, document_id: str = "doc"):
+    chain.llm.calls.clear()
+    chain.llm.branches.clear()
+    structure = None
+    async for type, data in chain.process_long_text_stream(_document(paragraphs), document_id):
+        if type == "result":
+            structure = data
+    return structure
+
+@pytest.mark.parametrize("position", [0, 3, 17, 25, 39])
+def test_editing_a_paragraph_only_changes_nearby_chunks(position):
+    chain = _chain()
+    before = chain._content_defined_chunks(_document(PARAGRAPHS))
+    after = chain._content_defined_chunks(_document(_edited(position)))
+    assert len(before) > 10
+
+    edited = next(i for i, chunk in enumerate(after) if "设计权衡" in chunk)
+    changed = [i for i, chunk in enumerate(after) if chunk not in before]
+    # 只有包含该段的分块和紧随其后的分块（切分点移动时）会变化
+    assert edited in changed
+    assert set(changed) <= {edited, edited + 1}
+
+def test_inserted_paragraph_realigns_following_chunks():
+    chain = _chain()
+    before = chain._content_defined_chunks(_document(PARAGRAPHS))
+    paragraphs = list(PARAGRAPHS)
+    paragraphs.insert(12, _paragraph("网络协议", 99))
+    after = chain._content_defined_chunks(_document(paragraphs))
+    assert len([chunk for chunk in after if chunk not in before]) <= 2
+
+async def test_unchanged_document_reuses_everything():
+    chain = _chain()
+    first = await _run(chain, PARAGRAPHS)
+    assert chain.llm.calls["structure"] == 1
+    assert chain.reuse["chunks_reused"] == 0
+
+    second = await _run(chain, PARAGRAPHS)
+    assert chain.llm.calls == Counter()
+    assert chain.reuse["chunks_reused"] == chain.reuse["chunks"]
+    assert chain.reuse["structure_reused"]
+    assert chain.reuse["branches_reused"] == chain.reuse["branches"] == len(TOPICS)
+    assert second == first
+
+async def test_small_edit_keeps_structure_and_regenerates_only_affected_branches():
+    chain = _chain()
+    first = await _run(chain, PARAGRAPHS)
+
+    # 编辑「调度算法」的第一段，它所在的分块是该分支的参考来源之一
+    second = await _run(chain, _edited(20))
+    assert chain.reuse["structure_reused"]
+    assert chain.llm.calls["structure"] == 0
+    assert 1 <= chain.llm.calls["summary"] <= 2
+    assert chain.llm.branches == ["调度算法"]
+    assert chain.reuse["branches_reused"] == len(TOPICS) - 1
+    # 沿用上次的分支划分，节点 id 保持不变，未变化分支的子树原样复用
+    assert [node["id"] for node in second["children"]] == [node["id"] for node in first["children"]]
+    assert second["children"][0] == first["children"][0]
+
+async def test_large_edit_triggers_full_regeneration(monkeypatch):
+    monkeypatch.setattr(settings, "INCREMENTAL_RESTRUCTURE_RATIO", 0.3)
+    chain = _chain()
+    await _run(chain, PARAGRAPHS)
+
+    paragraphs = [_paragraph(topic, index, wording="实现细节") for topic in TOPICS for index in range(10)]
+    await _run(chain, paragraphs)
+    assert not chain.reuse["structure_reused"]
+    assert chain.llm.calls["structure"] == 1
+    assert chain.reuse["chunks_reused"] == 0
+
+async def test_without_document_id_structure_is_not_reused():
+    chain = _chain()
+    await _run(chain, PARAGRAPHS, document_id=None)
+    await _run(chain, _edited(25), document_id=None)
+    assert not chain.reuse["structure_reused"]
+    assert chain.llm.calls["structure"] == 1
+
+async def test_branch_keys_change_only_for_edited_branches():
+    chain = _chain()
+    keys = {}
+    cache_key = chain._cache_key
+
+    def recording(text: str, namespace: str) -> str:
+        key = cache_key(text, namespace)
+        if namespace == "branch":
+            keys[text.split("\x1f")[2]] = key
+        return key
+
+    chain._cache_key = recording
+    await _run(chain, PARAGRAPHS)
+    before = dict(keys)
+    await _run(chain, _edited(0))
+    assert set(before) == set(TOPICS)
+    assert {topic for topic in TOPICS if keys[topic] != before[topic]} == {"存储引擎"}
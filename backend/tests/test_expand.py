@@ -0,0 +1,103 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from app.config.settings import settings
+from app.core.models.llm import llm_registry
+from app.utils.cache import result_cache
+from benchmarks.fake_llm import FakeLLMConfig, install
+
+API = f"{settings.API_V1_STR}/mindmap"
+DOCUMENT = "".join(
+    f"第{i}部分介绍了分布式存储系统中副本放置、故障检测和数据修复的设计，以及它们对可用性的影响。" for i in range(20)
+)
+
+@pytest.fixture
+def client():
+    from app.main import app
+    install(FakeLLMConfig(tokens_per_second=0, first_token_latency=0))
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        llm_registry.override(None)
+
+def _outline(client, max_depth: int = 3, content: str = DOCUMENT) -> dict:
+    response = client.post(f"{API}/from-document/stream", json={
+        "content": content, "doc_type": "text", "mode": "progressive", "max_depth": max_depth
+    })
+    assert response.status_code == 200
+    for line in response.text.splitlines():
+        if line.startswith("data: ") and (event := json.loads(line[6:]))["type"] == "complete":
+            return event
+    raise AssertionError(response.text)
+
+def _expand(client, session: str, node_id: str):
+    return client.post(f"{API}/expand", json={"session": session, "node_id": node_id})
+
+def test_expand_uses_the_session(client):
+    outline = _outline(client, content="展开：" + DOCUMENT)
+    tree = outline["tree"]
+    assert [child["id"] for child in tree["children"]] == ["1", "2", "3"]
+    assert all(child["children"] == [] for child in tree["children"])
+
+    response = _expand(client, outline["session"], "2")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["node_id"] == "2" and not body["cached"] and body["expandable"]
+    assert [child["id"] for child in body["children"]] == ["2-1", "2-2", "2-3", "2-4"]
+
+    # 再次展开直接返回缓存，展开得到的子节点可以继续展开
+    again = _expand(client, outline["session"], "2").json()
+    assert again["cached"] and again["children"] == body["children"]
+    deeper = _expand(client, outline["session"], "2-3").json()
+    assert [child["id"] for child in deeper["children"]][0] == "2-3-1"
+    assert not deeper["expandable"]
+
+def test_depth_limit(client):
+    outline = _outline(client, max_depth=2, content="深度限制：" + DOCUMENT)
+    first = _expand(client, outline["session"], "1")
+    assert first.status_code == 200 and not first.json()["expandable"]
+    response = _expand(client, outline["session"], "1-1")
+    assert response.status_code == 400
+    assert "最大深度 2" in response.json()["detail"]
+
+def test_sessions_with_different_depths_are_separate(client):
+    shallow = _outline(client, max_depth=2, content="会话深度：" + DOCUMENT)
+    deep = _outline(client, max_depth=4, content="会话深度：" + DOCUMENT)
+    assert shallow["session"] != deep["session"]
+    _expand(client, deep["session"], "1")
+    assert _expand(client, deep["session"], "1-1").status_code == 200
+    assert _expand(client, shallow["session"], "1-1").status_code == 400
+
+def test_root_cannot_be_expanded(client):
+    outline = _outline(client)
+    assert _expand(client, outline["session"], "root").status_code == 400
+
+@pytest.mark.parametrize("node_id", ["9", "1-9", "9-1"])
+def test_unknown_node(client, node_id):
+    outline = _outline(client)
+    response = _expand(client, outline["session"], node_id)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "节点不存在"
+
+def test_unknown_session(client):
+    response = _expand(client, "outline:does-not-exist", "1")
+    assert response.status_code == 404
+
+def test_expired_session(client, monkeypatch):
+    outline = _outline(client, content="过期会话：" + DOCUMENT)
+    monkeypatch.setattr(result_cache.memory, "ttl", -1)
+    monkeypatch.setattr(result_cache.disk, "ttl", -1)
+    response = _expand(client, outline["session"], "1")
+    assert response.status_code == 404
+    assert "过期" in response.json()["detail"]
+
+@pytest.mark.parametrize("mode", ["auto", "single", "map_reduce", "sections"])
+def test_max_depth_is_rejected_outside_progressive_mode(client, mode):
+    response = client.post(f"{API}/from-document/stream", json={
+        "content": DOCUMENT, "doc_type": "text", "mode": mode, "max_depth": 2
+    })
+    assert response.status_code == 422
+    response = client.post(f"{API}/from-document/upload?mode={mode}&max_depth=2", content=b"%PDF-1.4",
+                           headers={"content-type": "application/pdf"})
+    assert response.status_code == 400
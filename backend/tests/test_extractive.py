@@ -0,0 +1,78 @@
+import re
+import pytest
+from app.core.document.extractive import extract_summary
+from app.core.models.token_budget import count_tokens
+
+TOPICS = ["数据库索引", "网络拥塞控制", "编译器优化", "量子计算", "操作系统调度"]
+
+def _document(paragraphs: int = 40) -> str:
+    return "\n\n".join(
+        "".join(
+            f"{TOPICS[p % len(TOPICS)]}的第{p}段第{s}句讨论了{TOPICS[p % len(TOPICS)]}中与性能相关的取舍，"
+            f"实验数据为{(p * 13 + s * 7) % 101}。"
+            for s in range(6)
+        )
+        for p in range(paragraphs)
+    )
+
+DOCUMENT = _document()
+
+def _sentences(text: str):
+    return [s for s in re.split(r"(?<=。)|\n+", text) if s.strip()]
+
+@pytest.mark.parametrize("max_tokens", [100, 400, 1200, 3000])
+def test_output_stays_within_budget(max_tokens):
+    assert count_tokens(DOCUMENT) > max_tokens
+    summary = extract_summary(DOCUMENT, max_tokens, count_tokens)
+    assert summary
+    assert count_tokens(summary) <= max_tokens
+
+def test_text_within_budget_is_kept_whole():
+    text = _document(3)
+    assert extract_summary(text, count_tokens(text) * 2, count_tokens) == text
+
+def test_original_sentence_order_is_preserved():
+    summary = extract_summary(DOCUMENT, 600, count_tokens)
+    positions = [DOCUMENT.index(sentence) for sentence in _sentences(summary)]
+    assert len(positions) > 5
+    assert positions == sorted(positions)
+
+def test_covers_the_whole_document():
+    summary = extract_summary(DOCUMENT, 3000, count_tokens)
+    paragraphs = DOCUMENT.split("\n\n")
+    first_half = any(s in summary for p in paragraphs[:20] for s in _sentences(p)[1:])
+    second_half = any(s in summary for p in paragraphs[20:] for s in _sentences(p))
+    assert first_half and second_half
+
+def test_near_duplicate_sentences_are_dropped():
+    boilerplate = "本文档仅供内部评审使用，未经许可不得转载或引用其中的任何内容。"
+    variants = [boilerplate, "本文档仅供内部评审使用, 未经许可不得转载或引用其中的任何内容.", boilerplate.replace("本文档", "本 文档")]
+    paragraphs = DOCUMENT.split("\n\n")
+    text = "\n\n".join(f"{p}{variants[i % len(variants)]}" for i, p in enumerate(paragraphs))
+    # 预算能容纳全文，只有重复的句子被丢弃
+    summary = extract_summary(text, count_tokens(text), count_tokens, head_ratio=0.0)
+    assert sum(summary.count(variant) for variant in variants) == 1
+
+def test_sentences_with_different_numbers_are_not_duplicates():
+    text = "".join(f"第{i}组实验在压力测试中测得的平均响应延迟为{i * 11}毫秒。" for i in range(30))
+    summary = extract_summary(text, count_tokens(text) // 2, count_tokens, head_ratio=0.0)
+    assert len(_sentences(summary)) > 5
+
+def test_query_biased_selection():
+    summary = extract_summary(DOCUMENT, 300, count_tokens, head_ratio=0.0, query="量子计算")
+    sentences = _sentences(summary)
+    assert sentences
+    assert all("量子计算" in sentence for sentence in sentences)
+
+    summary = extract_summary(DOCUMENT, 300, count_tokens, head_ratio=0.0, query="编译器优化")
+    assert all("编译器优化" in sentence for sentence in _sentences(summary))
+
+@pytest.mark.parametrize("text", ["", "   ", "\n\n"])
+def test_empty_input(text):
+    assert extract_summary(text, 100, count_tokens) == ""
+
+@pytest.mark.parametrize("text", ["只有一句话。", "Just one sentence without a period"])
+def test_single_sentence(text):
+    assert extract_summary(text, 100, count_tokens) == text
+    # 放不下唯一的句子时返回空文本，而不是超出预算
+    assert extract_summary(text, 1, count_tokens) == ""
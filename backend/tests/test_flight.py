@@ -0,0 +1,220 @@
+import asyncio
+import pytest
+from app.core.mindmap.flight import Flight, FlightGroup
+
+def _generating(text: str):
+    return ("generating", {"partial": text})
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+async def test_replay_and_event_ids():
+    flight = Flight("k", max_events=100)
+    flight.publish(("start", {}))
+    flight.publish(_generating("a"))
+    flight.publish(("complete", {"data": "a"}))
+    flight.finish()
+
+    events = await _collect(flight.subscribe())
+    # start 之后的片段与 complete 不合并
+    assert events == [(1, ("start", {})), (2, _generating("a")), (3, ("complete", {"data": "a"}))]
+    assert await _collect(flight.subscribe(after=2)) == [(3, ("complete", {"data": "a"}))]
+    assert await _collect(flight.subscribe(after=3)) == []
+    assert flight.event_id(3) == f"{flight.token}.3"
+
+async def test_backlog_is_coalesced():
+    flight = Flight("k", max_events=100)
+    flight.publish(_generating("a"))
+    flight.publish(("node_added", {"id": "1"}))
+    flight.publish(_generating("b"))
+    flight.publish(("reasoning", {"partial": "r"}))
+    flight.publish(("complete", {}))
+    flight.finish()
+
+    events = await _collect(flight.subscribe())
+    # 片段合并为一条，node_added 保持顺序，只有最后一条带 seq
+    assert events == [
+        (None, ("reasoning", {"partial": "r"})),
+        (None, _generating("ab")),
+        (4, ("node_added", {"id": "1"})),
+        (5, ("complete", {})),
+    ]
+
+async def test_trimmed_events_become_snapshot():
+    flight = Flight("k", max_events=4)
+    for i in range(5):
+        flight.publish(_generating(str(i)))
+    flight.publish(("node_added", {"id": "1"}))
+    flight.publish(("complete", {}))
+    flight.finish()
+
+    # 第 5 个事件时超出上限，丢弃最早的 3 个
+    assert flight.base == 3
+    assert flight.snapshot["data"] == ["0", "1", "2"]
+
+    events = await _collect(flight.subscribe(after=1))
+    assert events[0] == (3, ("snapshot", {"data": "012", "reasoning": "", "nodes": []}))
+    assert events[-1] == (7, ("complete", {}))
+    # 快照之后的事件不重复快照中的内容
+    partials = "".join(data["partial"] for _, (type, data) in events if type == "generating")
+    assert partials == "34"
+
+    # 已经收到快照之后事件的订阅者不会收到快照
+    assert [type for _, (type, _) in await _collect(flight.subscribe(after=5))] == ["node_added", "complete"]
+
+async def test_subscriber_waits_for_new_events():
+    flight = Flight("k", max_events=100)
+    received = []
+
+    async def consume():
+        async for seq, event in flight.subscribe():
+            received.append((seq, event))
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0)
+    flight.publish(_generating("a"))
+    await asyncio.sleep(0)
+    assert received == [(1, _generating("a"))]
+    flight.publish(("complete", {}))
+    flight.finish()
+    await task
+    assert received[-1] == (2, ("complete", {}))
+
+def _producer(events, gate: asyncio.Event = None, calls: list = None):
+    async def produce():
+        if calls is not None:
+            calls.append(1)
+        for event in events:
+            if gate is not None:
+                await gate.wait()
+            yield event
+    return produce
+
+async def test_identical_requests_share_one_flight():
+    group = FlightGroup(grace_period=1)
+    gate = asyncio.Event()
+    calls = []
+    producer = _producer([_generating("a"), ("complete", {})], gate, calls)
+
+    first = asyncio.create_task(_collect(group.run("k", producer)))
+    second = asyncio.create_task(_collect(group.run("k", producer)))
+    await asyncio.sleep(0)
+    gate.set()
+    results = await asyncio.gather(first, second)
+
+    assert calls == [1]
+    assert [event for _, event in results[0]] == [event for _, event in results[1]]
+    assert results[0][-1][1] == ("complete", {})
+    assert group.flights == {} and group.tokens == {}
+
+def _queued_producer(queue: asyncio.Queue):
+    """逐个产生测试放入队列的事件，None 表示结束"""
+    async def produce():
+        while (event := await queue.get()) is not None:
+            yield event
+    return produce
+
+async def test_resume_from_event_id():
+    group = FlightGroup(grace_period=1)
+    queue = asyncio.Queue()
+    stream = group.run("k", _queued_producer(queue))
+    queue.put_nowait(_generating("a"))
+    event_id, event = await stream.__anext__()
+    assert event == _generating("a")
+    await stream.aclose()
+
+    flight, seq = group.find(event_id)
+    assert seq == 1
+    for event in (_generating("b"), ("complete", {}), None):
+        queue.put_nowait(event)
+    resumed = await _collect(group.resume(flight, seq))
+    assert [event for _, event in resumed] == [_generating("b"), ("complete", {})]
+
+async def test_finished_flight_is_not_found():
+    group = FlightGroup(grace_period=1)
+    events = await _collect(group.run("k", _producer([_generating("a"), ("complete", {})])))
+    assert group.find(events[-1][0]) is None
+
+async def test_held_flight_replays_after_finishing():
+    group = FlightGroup(grace_period=1)
+    queue = asyncio.Queue()
+    stream = group.run("k", _queued_producer(queue))
+    queue.put_nowait(_generating("a"))
+    event_id, _ = await stream.__anext__()
+    found = group.find(event_id)
+
+    # 查找之后任务结束并从分组中移除，持有的任务对象仍可回放剩余事件
+    for event in (("complete", {}), None):
+        queue.put_nowait(event)
+    await _collect(stream)
+    assert group.find(event_id) is None
+    resumed = await _collect(group.resume(*found))
+    assert [event for _, event in resumed] == [("complete", {})]
+
+@pytest.mark.parametrize("event_id", [None, "", "unknown.1", "token-without-seq"])
+def test_find_rejects_unknown_ids(event_id):
+    assert FlightGroup().find(event_id) is None
+
+async def test_abandoned_flight_is_cancelled_after_grace_period():
+    group = FlightGroup(grace_period=0.05)
+    gate = asyncio.Event()
+    stream = group.run("k", _producer([_generating("a"), ("complete", {})], gate))
+    task = asyncio.create_task(stream.__anext__())
+    await asyncio.sleep(0)
+    flight = group.flights["k"]
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await stream.aclose()
+
+    assert flight.subscribers == 0
+    assert not flight.done
+    await asyncio.sleep(0.1)
+    assert flight.done
+    assert group.flights == {}
+
+async def test_reconnect_within_grace_period_keeps_flight():
+    group = FlightGroup(grace_period=0.05)
+    gate = asyncio.Event()
+    stream = group.run("k", _producer([_generating("a"), ("complete", {})], gate))
+    task = asyncio.create_task(stream.__anext__())
+    await asyncio.sleep(0)
+    flight = group.flights["k"]
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await stream.aclose()
+
+    resumed = asyncio.create_task(_collect(group.resume(flight, 0)))
+    await asyncio.sleep(0.1)
+    gate.set()
+    events = await resumed
+    assert events[-1][1] == ("complete", {})
+
+async def test_producer_error_is_published():
+    async def failing():
+        yield _generating("a")
+        raise RuntimeError("上游错误")
+
+    events = await _collect(FlightGroup(grace_period=1).run("k", failing))
+    assert events[-1][1] == ("error", {"message": "上游错误"})
+
+async def _fallback():
+    yield "fallback"
+
+async def test_resume_stream_falls_back_without_terminal_event():
+    from app.core.mindmap.processor import MindMapProcessor
+    processor = MindMapProcessor(None)
+    flight = Flight("k")
+    flight.publish(_generating("a"))
+    flight.publish(("complete", {}))
+    flight.finish()
+
+    # 还有未收到的结束事件时正常续传
+    messages = await _collect(processor.resume_stream((flight, 1), _fallback()))
+    assert len(messages) == 1 and '"complete"' in messages[0]
+    # 客户端已收到全部事件（或任务被取消）时改走正常请求流程
+    assert await _collect(processor.resume_stream((flight, 2), _fallback())) == ["fallback"]
+    # 没有 fallback 时返回 error 事件，而不是空的 200 流
+    messages = await _collect(processor.resume_stream((flight, 2)))
+    assert len(messages) == 1 and '"error"' in messages[0]
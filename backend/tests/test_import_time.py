@@ -0,0 +1,31 @@
+"""冷启动导入检查：导入 app.main 不应加载重量级依赖
+
+耗时预算检查依赖机器性能，只在设置了 IMPORT_BUDGET_MS（毫秒）时运行，例如
+    IMPORT_BUDGET_MS=1500 python -m pytest tests/test_import_time.py
+"""
+import os
+import pytest
+from benchmarks.bench_import import run_once, total_ms
+
+IMPORT_BUDGET_MS = os.environ.get("IMPORT_BUDGET_MS")
+
+# 应在后台预热或首次使用时才导入的顶层包
+DEFERRED_PACKAGES = {
+    "langchain", "langchain_core", "langchain_openai", "langchain_ollama", "langchain_text_splitters",
+    "openai", "numpy", "PyPDF2", "pypdf", "tiktoken",
+}
+
+def _import_app(tmp_path) -> list:
+    """在干净的子进程中导入 app.main，返回 (缩进层级, 模块名, 自身耗时us, 累计耗时us)"""
+    return run_once("app.main", "openai", str(tmp_path))
+
+def test_no_heavy_eager_imports(tmp_path):
+    loaded = {name.split(".")[0] for _, name, _, _ in _import_app(tmp_path)}
+    assert not loaded & DEFERRED_PACKAGES
+
+@pytest.mark.skipif(not IMPORT_BUDGET_MS, reason="设置 IMPORT_BUDGET_MS 后才检查导入耗时")
+def test_import_within_budget(tmp_path):
+    budget = float(IMPORT_BUDGET_MS)
+    # 取三次中最快的一次，减少机器抖动的影响
+    elapsed = min(total_ms(_import_app(tmp_path)) for _ in range(3))
+    assert elapsed <= budget, f"导入 app.main 耗时 {elapsed:.0f}ms，超出预算 {budget:.0f}ms"
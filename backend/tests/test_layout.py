@@ -0,0 +1,162 @@
+import random
+import pytest
+from fastapi.testclient import TestClient
+from app.config.settings import settings
+from app.core.mindmap.layout import CompactTree, layout_tree, node_size
+
+V_GAP = 20
+
+def _random_tree(rng: random.Random, size: int) -> dict:
+    """随机形状的树：新节点挂在已有节点下，深浅和分支数差异大，能覆盖线程和子树平移"""
+    root = {"id": "root", "label": "根节点", "children": []}
+    nodes = [(root, 0)]
+    for i in range(size - 1):
+        parent, depth = rng.choice(nodes)
+        label = rng.choice(["短", "中等长度的标签", "A much longer English label", "C#"])
+        child = {"id": f"n{i}", "label": label, "children": []}
+        parent["children"].append(child)
+        nodes.append((child, depth + 1))
+    return root
+
+def _unbalanced_tree() -> dict:
+    """左侧（上方）子树很深、右侧子树很浅，兄弟子树需要按轮廓而不是包围盒分开"""
+    def chain(prefix: str, length: int) -> dict:
+        node = {"id": f"{prefix}{length}", "label": "叶", "children": []}
+        for i in range(length - 1, 0, -1):
+            node = {"id": f"{prefix}{i}", "label": "链", "children": [node, {"id": f"{prefix}{i}b", "label": "叶"}]}
+        return node
+    return {"id": "root", "label": "根", "children": [
+        chain("a", 6),
+        {"id": "b", "label": "叶"},
+        {"id": "c", "label": "叶"},
+        chain("d", 4),
+    ]}
+
+def _index(layout: dict):
+    nodes = {node["id"]: node for node in layout["nodes"]}
+    children = {node["id"]: [] for node in layout["nodes"]}
+    for node in layout["nodes"]:
+        if node["parent_id"] is not None:
+            children[node["parent_id"]].append(node["id"])
+    return nodes, children
+
+def _center(node: dict) -> float:
+    return node["y"] + node["height"] / 2
+
+def _assert_tidy(layout: dict):
+    nodes, children = _index(layout)
+
+    # 父节点位于首末子节点的正中
+    for node_id, kids in children.items():
+        if kids:
+            expected = (_center(nodes[kids[0]]) + _center(nodes[kids[-1]])) / 2
+            assert _center(nodes[node_id]) == pytest.approx(expected, abs=0.2)
+
+    # 同一列中的节点互不重叠，且至少相隔 v_gap（坐标保留一位小数）
+    columns = {}
+    for node in layout["nodes"]:
+        columns.setdefault(node["x"], []).append(node)
+    for column in columns.values():
+        column.sort(key=lambda node: node["y"])
+        for upper, lower in zip(column, column[1:]):
+            assert upper["y"] + upper["height"] + V_GAP <= lower["y"] + 0.2
+
+    # 兄弟子树在每一层都保持先后顺序：上方子树的所有节点都在下方子树之上
+    def levels(node_id: str, depth: int = 0, out=None):
+        out = {} if out is None else out
+        node = nodes[node_id]
+        top, bottom = out.get(depth, (node["y"], node["y"] + node["height"]))
+        out[depth] = (min(top, node["y"]), max(bottom, node["y"] + node["height"]))
+        for child in children[node_id]:
+            levels(child, depth + 1, out)
+        return out
+
+    for kids in children.values():
+        extents = [levels(kid) for kid in kids]
+        for upper, lower in zip(extents, extents[1:]):
+            for depth in upper.keys() & lower.keys():
+                assert upper[depth][1] + V_GAP <= lower[depth][0] + 0.2
+
+    # 子节点所在列在父节点右侧
+    for node_id, kids in children.items():
+        parent = nodes[node_id]
+        for kid in kids:
+            assert nodes[kid]["x"] >= parent["x"] + parent["width"]
+
+def test_single_node():
+    layout = layout_tree({"id": "root", "label": "主题"})
+    width, height = node_size("主题", 0)
+    assert layout["nodes"] == [{
+        "id": "root", "parent_id": None, "label": "主题",
+        "x": 0.0, "y": 0.0, "width": round(width, 1), "height": height
+    }]
+    assert layout["width"] == round(width, 1)
+    assert layout["height"] == height
+
+def test_unbalanced_siblings_do_not_overlap():
+    _assert_tidy(layout_tree(_unbalanced_tree(), v_gap=V_GAP))
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_trees_are_tidy(seed):
+    rng = random.Random(seed)
+    _assert_tidy(layout_tree(_random_tree(rng, rng.randint(2, 300)), v_gap=V_GAP))
+
+def test_canvas_starts_at_origin_and_contains_all_nodes():
+    layout = layout_tree(_random_tree(random.Random(7), 200), v_gap=V_GAP)
+    assert min(node["y"] for node in layout["nodes"]) == 0
+    assert min(node["x"] for node in layout["nodes"]) == 0
+    assert all(node["x"] + node["width"] <= layout["width"] + 0.1 for node in layout["nodes"])
+    assert all(node["y"] + node["height"] <= layout["height"] + 0.1 for node in layout["nodes"])
+
+def test_columns_align_by_depth():
+    layout = layout_tree(_random_tree(random.Random(3), 100), h_gap=50, v_gap=V_GAP)
+    nodes, children = _index(layout)
+    depths = {"root": 0}
+    for node in layout["nodes"]:
+        for kid in children[node["id"]]:
+            depths[kid] = depths[node["id"]] + 1
+    x_by_depth = {}
+    for node_id, depth in depths.items():
+        x_by_depth.setdefault(depth, set()).add(nodes[node_id]["x"])
+    assert all(len(xs) == 1 for xs in x_by_depth.values())
+
+def test_nodes_are_in_preorder():
+    tree = _unbalanced_tree()
+    expected = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        expected.append(node["id"])
+        stack.extend(reversed(node.get("children") or []))
+    assert [node["id"] for node in layout_tree(tree)["nodes"]] == expected
+
+def test_compact_tree_labels():
+    tree = CompactTree.from_dict({"id": "r", "label": "根", "children": [{"id": "a", "label": "子节点"}]})
+    assert len(tree) == 2
+    assert [tree.label(i) for i in range(len(tree))] == ["根", "子节点"]
+    assert list(tree.parent) == [-1, 0]
+    assert list(tree.depth) == [0, 1]
+
+def test_wide_characters_are_wider():
+    assert node_size("中文标签", 2)[0] > node_size("abcd", 2)[0]
+
+def test_max_nodes():
+    with pytest.raises(ValueError):
+        layout_tree(_random_tree(random.Random(0), 50), max_nodes=10)
+
+def test_invalid_node():
+    with pytest.raises(ValueError):
+        layout_tree({"id": "root", "label": "根", "children": ["不是对象"]})
+
+@pytest.mark.parametrize("children", [3, "子节点", {"id": "a", "label": "子节点"}])
+def test_children_must_be_a_list(children):
+    with pytest.raises(ValueError):
+        layout_tree({"id": "root", "label": "根", "children": children})
+
+@pytest.mark.parametrize("children", [3, ["不是对象"]])
+def test_layout_endpoint_rejects_malformed_children(children):
+    from app.main import app
+    response = TestClient(app).post(f"{settings.API_V1_STR}/mindmap/layout", json={
+        "tree": {"id": "root", "label": "根", "children": [{"id": "a", "label": "分支", "children": children}]}
+    })
+    assert response.status_code == 400
@@ -0,0 +1,88 @@
+import pytest
+from app.core.mindmap.markdown_stream import IncrementalMarkdownParser
+
+MARKDOWN = """# 机器学习
+## 监督学习
+- 分类
+  - 决策树
+  - 支持向量机
+- 回归
+## 无监督学习
+- 聚类
+"""
+
+def _parse(text: str, chunk_size: int = None):
+    parser = IncrementalMarkdownParser()
+    events = []
+    if chunk_size is None:
+        events += parser.feed(text)
+    else:
+        for start in range(0, len(text), chunk_size):
+            events += parser.feed(text[start:start + chunk_size])
+    events += parser.close()
+    return parser, events
+
+def _labels(node: dict):
+    return [node["label"], [_labels(child) for child in node["children"]]]
+
+def test_builds_tree_with_positional_ids():
+    parser, events = _parse(MARKDOWN)
+    assert [(event["node"]["id"], event["parent_id"]) for event in events] == [
+        ("root", None), ("1", "root"), ("1-1", "1"), ("1-1-1", "1-1"), ("1-1-2", "1-1"),
+        ("1-2", "1"), ("2", "root"), ("2-1", "2"),
+    ]
+    assert _labels(parser.tree()) == ["机器学习", [
+        ["监督学习", [["分类", [["决策树", []], ["支持向量机", []]]], ["回归", []]]],
+        ["无监督学习", [["聚类", []]]],
+    ]]
+    # 事件中的节点不带子节点，避免重复发送子树
+    assert all(event["node"]["children"] == [] for event in events)
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_chunking_does_not_change_result(chunk_size):
+    expected_parser, expected_events = _parse(MARKDOWN)
+    parser, events = _parse(MARKDOWN, chunk_size)
+    assert events == expected_events
+    assert parser.tree() == expected_parser.tree()
+
+def test_node_is_emitted_only_when_line_is_complete():
+    parser = IncrementalMarkdownParser()
+    assert parser.feed("# 主题\n## 分") == [{"node": {"id": "root", "label": "主题", "children": []}, "parent_id": None}]
+    assert parser.feed("支") == []
+    assert [event["node"]["label"] for event in parser.feed("一\n")] == ["分支一"]
+
+def test_last_line_without_newline():
+    parser = IncrementalMarkdownParser()
+    parser.feed("# 主题\n- 要点")
+    assert [event["node"]["label"] for event in parser.close()] == ["要点"]
+    assert parser.close() == []
+
+@pytest.mark.parametrize("line, label", [
+    ("## C#", "C#"),
+    ("## F# 与 .NET", "F# 与 .NET"),
+    ("## 标题 ##", "标题"),
+    ("## C# ##", "C#"),
+    ("##   两端空白   ", "两端空白"),
+])
+def test_heading_labels(line, label):
+    _, events = _parse(f"# 主题\n{line}\n")
+    assert events[-1]["node"]["label"] == label
+
+def test_sibling_top_level_headings_attach_to_root():
+    parser, events = _parse("# 主题\n# 另一个一级标题\n## 子标题\n")
+    assert [(event["node"]["id"], event["parent_id"]) for event in events] == [
+        ("root", None), ("1", "root"), ("1-1", "1"),
+    ]
+
+def test_bullets_without_heading():
+    parser, _ = _parse("- 根\n  - 子节点\n    - 孙节点\n- 第二个\n")
+    assert _labels(parser.tree()) == ["根", [["子节点", [["孙节点", []]]], ["第二个", []]]]
+
+def test_ignores_prose_and_empty_items():
+    parser, events = _parse("以下是思维导图：\n```markdown\n# 主题\n- \n普通段落\n- 要点\n```\n")
+    assert [event["node"]["label"] for event in events] == ["主题", "要点"]
+
+def test_empty_output():
+    parser, events = _parse("")
+    assert events == []
+    assert parser.tree() == {"id": "root", "label": "", "children": []}
@@ -0,0 +1,35 @@
+import tempfile
+import pytest
+from app.core.document import pdf_parser
+from app.core.document.pdf_parser import PDFParser
+from benchmarks.corpus import make_pdf
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    return tmp_path
+
+async def test_iter_pages_from_bytes_in_order(spool_dir):
+    pages = [item async for item in PDFParser.iter_pages(make_pdf(7))]
+    assert [(page, total) for page, total, _ in pages] == [(page, 7) for page in range(1, 8)]
+    assert all(text for _, _, text in pages)
+    # 临时文件在解析结束后删除
+    assert list(spool_dir.iterdir()) == []
+
+def test_batches_of_one_document_share_a_reader(tmp_path, monkeypatch):
+    opened = []
+    reader = pdf_parser._reader
+    monkeypatch.setattr(pdf_parser, "_reader", lambda source: opened.append(source) or reader(source))
+    monkeypatch.setattr(pdf_parser, "_readers", type(pdf_parser._readers)())
+
+    path = tmp_path / "a.pdf"
+    path.write_bytes(make_pdf(6))
+    assert pdf_parser._count_pages(str(path)) == 6
+    texts = pdf_parser._extract_pages(str(path), 0, 3) + pdf_parser._extract_pages(str(path), 3, 6)
+    assert len(texts) == 6
+    assert opened == [str(path)]
+
+    # 同一路径上换成另一个文件时重新解析
+    path.write_bytes(make_pdf(2))
+    assert pdf_parser._count_pages(str(path)) == 2
+    assert len(opened) == 2
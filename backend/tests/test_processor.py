@@ -0,0 +1,172 @@
+import asyncio
+import json
+import pytest
+from app.config.settings import settings
+from app.core.mindmap import processor as processor_module
+from app.core.mindmap.processor import MindMapProcessor
+from app.core.models.llm import llm_registry
+from app.schemas.mindmap import MindMapRequest, ProcessingMode
+from app.utils.cache import LRUCache, SQLiteCache, TieredCache
+from app.utils.similarity import SimilarityIndex, similarity, simhash
+from benchmarks.fake_llm import FakeChatModel, FakeLLMConfig, install
+
+_POINTS = [
+    "分布式系统通过复制和分区提高可用性与吞吐量", "一致性协议在节点之间协调状态变更",
+    "监控与容量规划保证服务在负载变化时仍能满足延迟目标", "缓存层减少了对数据库的重复读取",
+    "消息队列把突发流量平滑为稳定的后台处理", "灰度发布让新版本先在少量流量上验证",
+]
+
+def _article(topic: str, points: int = 50) -> str:
+    return "".join(
+        f"{topic}的第{i}个要点：{_POINTS[i % len(_POINTS)]}，在第{i * 7 % 13}号集群上的观测表明效果稳定。"
+        for i in range(points)
+    )
+
+def _variant(text: str) -> str:
+    """缓存键不同、但 SimHash 完全相同的输入（只多了一个句中空格）"""
+    return text.replace("：", "： ", 1)
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    # 每个测试使用独立的结果缓存和相似度索引，互不命中
+    cache = TieredCache(LRUCache(), SQLiteCache(str(tmp_path / "cache.sqlite3")))
+    index = SimilarityIndex(str(tmp_path / "fingerprints.sqlite3"), threshold=settings.SIMILARITY_THRESHOLD, ttl=3600)
+    monkeypatch.setattr(processor_module, "result_cache", cache)
+    monkeypatch.setattr(processor_module, "similarity_index", index)
+    install(FakeLLMConfig(tokens_per_second=0, first_token_latency=0))
+    try:
+        yield MindMapProcessor(FakeChatModel(FakeLLMConfig(tokens_per_second=0, first_token_latency=0)))
+    finally:
+        llm_registry.override(None)
+
+async def _final(messages) -> dict:
+    async for message in messages:
+        data = json.loads(message.split("data: ", 1)[1])
+        if data["type"] == "complete":
+            return data
+    raise AssertionError("没有 complete 事件")
+
+async def test_near_duplicate_is_reused_within_the_same_mode(processor):
+    text = _article("同模式")
+    first = await processor.generate_document(text, ProcessingMode.SINGLE)
+    assert not first.get("cached")
+    second = await processor.generate_document(_variant(text), ProcessingMode.SINGLE)
+    assert second["cached"] and second["similarity"] == 1.0
+
+@pytest.mark.parametrize("first_mode, second_mode", [
+    (ProcessingMode.SINGLE, ProcessingMode.MAP_REDUCE),
+    (ProcessingMode.MAP_REDUCE, ProcessingMode.SINGLE),
+])
+@pytest.mark.parametrize("edited", [False, True])
+async def test_modes_never_share_results(processor, first_mode, second_mode, edited):
+    text = _article(f"{first_mode.value}-{second_mode.value}-{edited}")
+    await processor.generate_document(text, first_mode)
+    result = await processor.generate_document(_variant(text) if edited else text, second_mode)
+    assert not result.get("cached")
+    # map-reduce 的结果带有分块复用统计，单次调用的结果没有
+    assert ("reuse" in result) == (second_mode == ProcessingMode.MAP_REDUCE)
+
+async def test_text_endpoint_does_not_reuse_document_results(processor):
+    text = _article("入口")
+    await processor.generate_document(text, ProcessingMode.SINGLE)
+    request = MindMapRequest(content=_variant(text), options={"draft": False})
+    result = await _final(processor.process_text_stream(request))
+    assert not result.get("cached")
+
+PARAGRAPH = (
+    "2019年，研究团队发布了一台53比特的超导量子处理器，并声称在特定采样任务上实现了量子优越性。"
+    "这一结果引发了关于经典模拟算法极限的广泛讨论，多家机构随后提出了改进的张量网络模拟方法。"
+    "评论者普遍认为，这类处理器具有在化学模拟和优化问题上取得实际应用的潜力，但纠错开销仍是主要障碍。"
+)
+
+@pytest.mark.parametrize("old, new", [
+    ("2019", "2021"),
+    ("具有在", "并不具有在"),
+    ("53比特", "127比特"),
+])
+async def test_meaning_changing_edits_of_short_input_miss_the_cache(processor, tmp_path, monkeypatch, old, new):
+    # 放宽阈值，使这些改动的指纹距离都在查找范围内，短文本仍然不做近似查找
+    loose = SimilarityIndex(str(tmp_path / "loose.sqlite3"), threshold=0.85, ttl=3600)
+    monkeypatch.setattr(processor_module, "similarity_index", loose)
+    edited = PARAGRAPH.replace(old, new)
+    assert similarity(simhash(PARAGRAPH), simhash(edited)) >= 0.85
+
+    await processor.generate_document(PARAGRAPH, ProcessingMode.SINGLE)
+    result = await processor.generate_document(edited, ProcessingMode.SINGLE)
+    assert not result.get("cached")
+    for content in (PARAGRAPH, edited):
+        request = MindMapRequest(content=content, options={"draft": False})
+        result = await _final(processor.process_text_stream(request))
+    assert "similarity" not in result
+
+async def _drain(events) -> list:
+    return [(event_id, type) async for event_id, (type, _) in events]
+
+async def test_draft_events_arrive_before_the_final_result(processor):
+    async def events():
+        await asyncio.sleep(0.05)
+        yield 1, ("complete", {"markdown": "# 正式"})
+
+    async def draft():
+        yield ("draft", {"partial": "# 草稿"})
+        yield ("draft", {"partial": "\n## 分支"})
+
+    # 草稿事件不带事件 id，不进入共享的事件日志
+    assert await _drain(processor._with_draft(events(), draft())) == [
+        (None, "draft"), (None, "draft"), (1, "complete")
+    ]
+
+async def test_draft_is_cancelled_when_the_main_stream_finishes_first(processor):
+    closed = asyncio.Event()
+
+    async def events():
+        yield 1, ("complete", {"markdown": "# 正式"})
+
+    async def draft():
+        try:
+            await asyncio.sleep(10)
+            yield ("draft", {"partial": "# 过时的草稿"})
+        finally:
+            closed.set()
+
+    result = await asyncio.wait_for(_drain(processor._with_draft(events(), draft())), 1)
+    assert result == [(1, "complete")]
+    assert closed.is_set()
+
+async def test_draft_stops_once_the_main_model_starts_output(processor):
+    async def events():
+        await asyncio.sleep(0.02)
+        yield 1, ("node_added", {"node": {"id": "1", "label": "主题"}})
+        await asyncio.sleep(0.05)
+        yield 2, ("complete", {"markdown": "# 正式"})
+
+    async def draft():
+        yield ("draft", {"partial": "# 草稿"})
+        await asyncio.sleep(0.03)
+        yield ("draft", {"partial": "\n## 迟到的草稿"})
+
+    assert await _drain(processor._with_draft(events(), draft())) == [
+        (None, "draft"), (1, "node_added"), (2, "complete")
+    ]
+
+async def test_draft_failure_does_not_fail_the_request(processor):
+    async def events():
+        await asyncio.sleep(0.02)
+        yield 1, ("complete", {"markdown": "# 正式"})
+
+    async def draft():
+        yield ("draft", {"partial": "# 草稿"})
+        raise ConnectionError("草稿模型不可用")
+
+    assert await _drain(processor._with_draft(events(), draft())) == [(None, "draft"), (1, "complete")]
+
+async def test_text_stream_sends_draft_before_complete(processor, monkeypatch):
+    monkeypatch.setattr(settings, "DRAFT_MODEL", "fake-draft")
+    # 草稿模型（注册表中的假模型）立即输出，主模型首 token 较慢
+    processor.llm = FakeChatModel(FakeLLMConfig(tokens_per_second=0, first_token_latency=0.2))
+    types = []
+    async for message in processor.process_text_stream(MindMapRequest(content=PARAGRAPH)):
+        types.append(json.loads(message.split("data: ", 1)[1])["type"])
+    assert "draft" in types
+    assert types.index("draft") < types.index("complete")
+    assert "draft" not in types[types.index("complete"):]
@@ -0,0 +1,69 @@
+import hashlib
+import pytest
+from app.config.settings import settings
+from app.core.mindmap import prompts
+from app.core.mindmap.prompts import CompiledPrompt
+
+PROMPT_NAMES = [
+    "MINDMAP_PROMPT", "CHUNK_SUMMARY_PROMPT", "STRUCTURE_PROMPT", "DETAILS_PROMPT",
+    "DRAFT_PROMPT", "SECTION_PROMPT", "OUTLINE_PROMPT", "EXPAND_PROMPT",
+]
+
+# 缓存键只包含 PROMPT_VERSION 而不包含模板文本：修改模板后必须递增 PROMPT_VERSION 并更新这里的摘要，
+# 否则旧模板生成的缓存结果会继续命中
+PROMPT_DIGESTS = {
+    "2": "b332192a25b13ac59904057e18a821fdb942e07914e82b85f89be3245bbc7f5b",
+}
+
+def _digest() -> str:
+    digest = hashlib.sha256()
+    for name in PROMPT_NAMES:
+        prompt = getattr(prompts, name)
+        for part in (name, prompt.system, prompt.human):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x1f")
+    return digest.hexdigest()
+
+def test_messages_render_variables_into_the_human_message():
+    prompt = CompiledPrompt("  固定说明  \n", "\n主题：{topic}\n正文：{text}\n")
+    assert prompt.variables == {"topic", "text"}
+    assert prompt.messages(topic="存储", text="副本放置") == [
+        ("system", "固定说明"),
+        ("human", "主题：存储\n正文：副本放置"),
+    ]
+    assert prompt.template == "固定说明\n\n主题：{topic}\n正文：{text}"
+
+def test_system_message_is_not_formatted():
+    # 系统消息中的花括号（如 JSON 示例）原样保留
+    prompt = CompiledPrompt('输出 {"id": "1"}', "{text}")
+    assert prompt.messages(text="x")[0] == ("system", '输出 {"id": "1"}')
+
+def test_braces_in_values_are_kept_verbatim():
+    prompt = CompiledPrompt("说明", "正文：{text}")
+    assert prompt.format(text="def f(): return {x}") == "正文：def f(): return {x}"
+
+def test_missing_variable_raises():
+    with pytest.raises(KeyError):
+        CompiledPrompt("说明", "{topic}：{text}").format(text="正文")
+
+def test_extend_appends_to_the_system_message_without_mutating():
+    base = CompiledPrompt("说明", "{text}")
+    extended = base.extend("输出 JSON")
+    assert extended.system == "说明\n\n输出 JSON"
+    assert extended.human == base.human and extended.variables == base.variables
+    assert base.system == "说明"
+
+@pytest.mark.parametrize("name", PROMPT_NAMES)
+def test_system_prefix_is_identical_across_inputs(name):
+    """系统消息逐字节不变，提供方才能缓存这部分前缀"""
+    prompt = getattr(prompts, name)
+    first = prompt.messages(**{variable: "第一篇文档" for variable in prompt.variables})
+    second = prompt.messages(**{variable: "另一篇完全不同的文档" for variable in prompt.variables})
+    assert first[0] == second[0] == ("system", prompt.system)
+    assert first[1] != second[1]
+    assert "text" in prompt.variables
+
+def test_prompt_templates_match_prompt_version():
+    assert PROMPT_DIGESTS.get(settings.PROMPT_VERSION) == _digest(), (
+        "提示词模板已修改：请递增 PROMPT_VERSION，并把新的摘要加入 PROMPT_DIGESTS"
+    )
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from app.config.settings import settings
+from app.core.models.router import LLMRouter, RoutedLLM
+
+class FakeModel:
+    def __init__(self, chunks=(), delay: float = 0, error: Exception = None):
+        self.chunks = list(chunks)
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def astream(self, input, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        for chunk in self.chunks:
+            yield chunk
+
+    async def ainvoke(self, input, *args, **kwargs):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return "".join(self.chunks)
+
+def _routed(**models) -> RoutedLLM:
+    # 只有第一个后端有权重，保证它总是主后端
+    configs = [
+        {"name": name, "model": settings.OPENAI_MODEL, "weight": 1.0 if index == 0 else 0.0, "short_text": False}
+        for index, name in enumerate(models)
+    ]
+    return RoutedLLM(LLMRouter(configs), models, temperature=0.5)
+
+def _backend(llm: RoutedLLM, name: str):
+    return next(backend for backend in llm.router.backends if backend.name == name)
+
+async def _collect(llm: RoutedLLM):
+    return [chunk async for chunk in llm.astream("你好")]
+
+async def test_streams_from_primary():
+    llm = _routed(primary=FakeModel(["a", "b"]), backup=FakeModel(["x"]))
+    assert await _collect(llm) == ["a", "b"]
+    assert llm.models["backup"].calls == 0
+
+async def test_empty_stream_is_a_successful_response():
+    llm = _routed(primary=FakeModel([]), backup=FakeModel(["x"]))
+    assert await _collect(llm) == []
+    # 空响应不计为故障，也不触发故障转移
+    assert _backend(llm, "primary").failures == 0
+    assert len(_backend(llm, "primary").ttfts) == 1
+    assert llm.models["backup"].calls == 0
+
+async def test_fails_over_on_error():
+    llm = _routed(primary=FakeModel(error=RuntimeError("502")), backup=FakeModel(["x", "y"]))
+    assert await _collect(llm) == ["x", "y"]
+    assert _backend(llm, "primary").failures == 1
+    assert _backend(llm, "backup").failures == 0
+
+async def test_raises_when_all_backends_fail():
+    llm = _routed(primary=FakeModel(error=RuntimeError("a")), backup=FakeModel(error=RuntimeError("b")))
+    with pytest.raises(RuntimeError):
+        await _collect(llm)
+
+async def test_backend_is_suspended_after_repeated_failures(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_BACKEND_MAX_FAILURES", 2)
+    llm = _routed(primary=FakeModel(error=RuntimeError("down")), backup=FakeModel(["x"]))
+    for _ in range(2):
+        await _collect(llm)
+    assert not _backend(llm, "primary").healthy
+    # 暂停期间主后端不再被选中
+    await _collect(llm)
+    assert llm.models["primary"].calls == 2
+
+async def test_slow_primary_is_hedged(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_MAX_DELAY", 0.02)
+    llm = _routed(primary=FakeModel(["slow"], delay=1), backup=FakeModel(["fast"]))
+    assert await _collect(llm) == ["fast"]
+    assert llm.models["primary"].calls == 1
+
+async def test_ainvoke_fails_over():
+    llm = _routed(primary=FakeModel(error=RuntimeError("502")), backup=FakeModel(["ok"]))
+    assert await llm.ainvoke("你好") == "ok"
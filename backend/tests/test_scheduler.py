@@ -0,0 +1,166 @@
+import asyncio
+import pytest
+from app.config.settings import settings
+from app.core.models import scheduler as scheduler_module
+from app.core.models.scheduler import LLMScheduler, Priority, ScheduledLLM, SchedulerSaturated, TokenBucket
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler_module.time, "monotonic", clock)
+    return clock
+
+def test_token_bucket_unlimited():
+    bucket = TokenBucket(0)
+    assert bucket.reserve(10 ** 9) == 0
+
+def test_token_bucket_overdraft_and_refill(clock):
+    bucket = TokenBucket(60)  # 每秒 1 个
+    assert bucket.reserve(60) == 0
+    # 透支 3 个，需要等待 3 秒补足
+    assert bucket.reserve(3) == pytest.approx(3.0)
+    clock.now += 5
+    # 5 秒补回 5 个：余额 2
+    assert bucket.reserve(2) == 0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+def test_token_bucket_capacity(clock):
+    bucket = TokenBucket(60)
+    clock.now += 3600
+    # 闲置再久也只能累积到容量上限
+    assert bucket.reserve(60) == 0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+async def _hold(scheduler: LLMScheduler, priority: Priority, name: str, order: list, release: asyncio.Event):
+    async with scheduler.slot(priority):
+        order.append(name)
+        await release.wait()
+
+async def test_concurrency_limit_and_priority_order():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=10)
+    order = []
+    release = asyncio.Event()
+    first = asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "first", order, release))
+    await asyncio.sleep(0)
+    assert scheduler.active == 1
+
+    waiters = [
+        asyncio.create_task(_hold(scheduler, priority, name, order, release))
+        for priority, name in [
+            (Priority.BACKGROUND, "background-1"),
+            (Priority.INTERACTIVE, "interactive-1"),
+            (Priority.BACKGROUND, "background-2"),
+            (Priority.INTERACTIVE, "interactive-2"),
+        ]
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.queue_depth == 4
+    assert order == ["first"]
+
+    release.set()
+    await asyncio.gather(first, *waiters)
+    # 交互式请求优先，同一优先级先到先得
+    assert order == ["first", "interactive-1", "interactive-2", "background-1", "background-2"]
+    assert scheduler.active == 0
+    assert scheduler.queue_depth == 0
+
+async def test_admission_rejects_when_queue_full():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=1)
+    release = asyncio.Event()
+    order = []
+    holder = asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "holder", order, release))
+    queued = asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "queued", order, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(SchedulerSaturated) as error:
+        scheduler.check_admission()
+    assert error.value.retry_after >= 1
+    with pytest.raises(SchedulerSaturated):
+        async with scheduler.slot():
+            pass
+
+    release.set()
+    await asyncio.gather(holder, queued)
+    scheduler.check_admission()
+
+async def test_cancelled_waiter_does_not_leak_slot():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=10)
+    release = asyncio.Event()
+    order = []
+    holder = asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "holder", order, release))
+    cancelled = asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "cancelled", order, release))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    assert scheduler.queue_depth == 0
+
+    waiter = asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "waiter", order, release))
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, waiter)
+    assert order == ["holder", "waiter"]
+    assert scheduler.active == 0
+
+async def test_queue_timeout(monkeypatch):
+    monkeypatch.setattr(settings, "REQUEST_TIMEOUT", 0.05)
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=10)
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(scheduler, Priority.INTERACTIVE, "holder", [], release))
+    await asyncio.sleep(0)
+    with pytest.raises(SchedulerSaturated):
+        async with scheduler.slot():
+            pass
+    assert scheduler.queue_depth == 0
+    release.set()
+    await holder
+    assert scheduler.active == 0
+
+async def test_rate_limit_delays_call(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(scheduler_module.asyncio, "sleep", fake_sleep)
+    scheduler = LLMScheduler(max_concurrency=4, max_queue=10, tpm=600)  # 每秒 10 个令牌
+    async with scheduler.slot(tokens=600):
+        pass
+    async with scheduler.slot(tokens=20):
+        pass
+    assert sleeps == [pytest.approx(2.0, abs=0.05)]
+
+class EchoLLM:
+    model_name = "echo"
+
+    def __init__(self, scheduler: LLMScheduler):
+        self.scheduler = scheduler
+        self.active_during_call = None
+
+    async def ainvoke(self, input):
+        self.active_during_call = self.scheduler.active
+        return input
+
+    async def astream(self, input):
+        self.active_during_call = self.scheduler.active
+        for part in input:
+            yield part
+
+async def test_scheduled_llm_holds_slot_during_call():
+    scheduler = LLMScheduler(max_concurrency=2, max_queue=10)
+    llm = EchoLLM(scheduler)
+    scheduled = ScheduledLLM(llm, scheduler)
+    assert await scheduled.ainvoke("你好") == "你好"
+    assert llm.active_during_call == 1
+    assert [chunk async for chunk in scheduled.with_priority(Priority.BACKGROUND).astream("ab")] == ["a", "b"]
+    assert llm.active_during_call == 1
+    assert scheduler.active == 0
+    # 未被代理的属性透传给原始模型
+    assert scheduled.model_name == "echo"
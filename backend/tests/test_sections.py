@@ -0,0 +1,152 @@
+import pytest
+from app.config.settings import settings
+from app.core.document.sections import SectionKind, detect_sections
+from app.core.mindmap.processor import MindMapProcessor
+from app.schemas.mindmap import ProcessingMode
+
+def _paragraph(topic: str, sentences: int = 6) -> str:
+    return " ".join(f"This paragraph discusses {topic} in detail, sentence {i}." for i in range(sentences))
+
+def _cn_paragraph(topic: str, sentences: int = 15) -> str:
+    return "".join(f"本段详细讨论{topic}的相关内容，这是第{i}句。" for i in range(sentences))
+
+ENGLISH_PAPER = "\n".join([
+    "Efficient Attention for Long Documents",
+    "Abstract",
+    _paragraph("the summary of our work"),
+    "1. Introduction",
+    _paragraph("the motivation"),
+    "2. Related Work",
+    _paragraph("prior approaches"),
+    "3. Proposed Method",
+    _paragraph("the architecture"),
+    "3.1 Sparse Attention",
+    _paragraph("the sparse pattern"),
+    "4. Experiments",
+    _paragraph("the benchmarks"),
+    "5. Conclusion",
+    _paragraph("future directions"),
+    "References",
+    "[1] A. Author. Some paper. 2020.",
+])
+
+CHINESE_PAPER = "\n".join([
+    "基于图神经网络的交通流量预测",
+    "摘要：" + _cn_paragraph("研究概要"),
+    "一、引言",
+    _cn_paragraph("研究背景"),
+    "二、模型设计",
+    _cn_paragraph("模型结构"),
+    "三、实验结果",
+    _cn_paragraph("实验数据"),
+    "四、结论",
+    _cn_paragraph("结论"),
+    "参考文献",
+    "[1] 张三. 某论文. 2020.",
+])
+
+def _kinds(paper):
+    return [section.kind for section in paper.sections]
+
+def test_english_paper():
+    paper = detect_sections(ENGLISH_PAPER)
+    assert paper is not None
+    assert paper.title == "Efficient Attention for Long Documents"
+    assert _kinds(paper) == [
+        SectionKind.ABSTRACT, SectionKind.INTRODUCTION, SectionKind.GENERAL,
+        SectionKind.METHOD, SectionKind.RESULT, SectionKind.CONCLUSION,
+    ]
+    # 小节编号不是一级标题，内容留在所属章节中
+    method = paper.sections[3]
+    assert "Sparse Attention" in method.text and "sparse pattern" in method.text
+    # 参考文献不参与生成
+    assert all("Some paper" not in section.text for section in paper.sections)
+
+def test_chinese_paper_with_inline_abstract():
+    paper = detect_sections(CHINESE_PAPER)
+    assert paper is not None
+    assert paper.title == "基于图神经网络的交通流量预测"
+    assert _kinds(paper) == [
+        SectionKind.ABSTRACT, SectionKind.INTRODUCTION, SectionKind.METHOD,
+        SectionKind.RESULT, SectionKind.CONCLUSION,
+    ]
+    assert paper.sections[0].text.startswith("本段详细讨论研究概要")
+
+def test_roman_and_chapter_numbering():
+    text = "\n".join([
+        "A Survey",
+        "I. Introduction", _paragraph("scope"),
+        "II. Methodology", _paragraph("search strategy"),
+        "III. Results", _paragraph("findings"),
+        "IV. Conclusion", _paragraph("summary"),
+    ])
+    assert _kinds(detect_sections(text)) == [
+        SectionKind.INTRODUCTION, SectionKind.METHOD, SectionKind.RESULT, SectionKind.CONCLUSION,
+    ]
+
+    text = "\n".join([
+        "某系统的设计与实现",
+        "第一章 绪论", _cn_paragraph("课题背景"),
+        "第二章 系统设计", _cn_paragraph("总体架构"),
+        "第三章 性能分析", _cn_paragraph("测试结果"),
+        "第四章 总结与展望", _cn_paragraph("后续工作"),
+    ])
+    assert _kinds(detect_sections(text)) == [
+        SectionKind.INTRODUCTION, SectionKind.METHOD, SectionKind.RESULT, SectionKind.CONCLUSION,
+    ]
+
+def test_out_of_sequence_numbers_are_not_headings():
+    # 正文中的编号列表（从 7 开始）不是章节标题
+    text = "\n".join([
+        "Notes",
+        "Introduction", _paragraph("the topic"),
+        "7 Items were collected in total", "9 Further items",
+        "Results", _paragraph("the data"),
+        "Conclusion", _paragraph("the end"),
+    ])
+    paper = detect_sections(text)
+    assert _kinds(paper) == [SectionKind.INTRODUCTION, SectionKind.RESULT, SectionKind.CONCLUSION]
+    assert "7 Items were collected" in paper.sections[0].text
+
+def test_short_sections_are_merged():
+    text = "\n".join([
+        "Title of the Paper",
+        "1. Introduction", _paragraph("the motivation"),
+        "2. Background", "Very short.",
+        "3. Method", _paragraph("the method"),
+        "4. Results", _paragraph("the results"),
+    ])
+    paper = detect_sections(text)
+    assert [section.heading for section in paper.sections] == ["Introduction", "Method", "Results"]
+    assert "Background\nVery short." in paper.sections[0].text
+
+def test_section_count_is_capped(monkeypatch):
+    monkeypatch.setattr(settings, "SECTION_MAX_COUNT", 3)
+    paper = detect_sections(ENGLISH_PAPER)
+    assert len(paper.sections) == 3
+    assert paper.sections[0].kind == SectionKind.ABSTRACT
+
+@pytest.mark.parametrize("text", [
+    # 普通文章没有章节标题
+    _cn_paragraph("日常话题", 40),
+    # 带 Methods / Results 小标题的简短笔记
+    "Lab notes\n1. Methods\nMixed the samples.\n2. Results\nColour changed.\n3. Conclusion\nIt works.",
+    # 只有一种已知章节
+    "\n".join(["Report", "1. Overview", _paragraph("a"), "2. Details", _paragraph("b"), "3. Conclusion", _paragraph("c")]),
+])
+def test_non_papers_are_rejected(text):
+    assert detect_sections(text) is None
+
+def test_auto_mode_uses_sections_only_beyond_budget(monkeypatch):
+    processor = MindMapProcessor(None)
+
+    # 单次调用能容纳的论文直接单次生成
+    cache_key, _ = processor._select_plan(ENGLISH_PAPER, ProcessingMode.AUTO)
+    assert cache_key.startswith("mindmap:")
+    cache_key, _ = processor._select_plan(ENGLISH_PAPER, ProcessingMode.SECTIONS)
+    assert cache_key.startswith("sections:")
+
+    # 超出单次调用预算时按章节并发生成
+    monkeypatch.setattr(processor.budget, "input_budget", lambda template="": processor.budget.count(ENGLISH_PAPER) - 1)
+    cache_key, _ = processor._select_plan(ENGLISH_PAPER, ProcessingMode.AUTO)
+    assert cache_key.startswith("sections:")
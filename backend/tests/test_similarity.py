@@ -0,0 +1,89 @@
+import random
+import pytest
+from app.utils.similarity import FINGERPRINT_BITS, SimHashIndex, SimilarityIndex, similarity, simhash
+
+ARTICLE = (
+    "深度学习是机器学习的一个分支，它使用多层神经网络从数据中学习表示。"
+    "卷积神经网络在图像识别中取得了突破，循环神经网络和 Transformer 则广泛用于自然语言处理。"
+    "训练深度模型需要大量标注数据和计算资源，迁移学习和自监督学习可以降低对标注数据的依赖。"
+) * 4
+
+def _flip(fingerprint: int, bits) -> int:
+    for bit in bits:
+        fingerprint ^= 1 << bit
+    return fingerprint
+
+def test_simhash_is_stable_and_ignores_whitespace_and_case():
+    assert simhash(ARTICLE) == simhash(ARTICLE)
+    assert simhash("Deep  Learning\n概述") == simhash("deep learning 概述")
+    assert 0 <= simhash(ARTICLE) < 2 ** FINGERPRINT_BITS
+
+def test_small_edit_keeps_fingerprint_close():
+    edited = ARTICLE.replace("深度学习是", "深度学习（Deep Learning）是", 1)
+    assert similarity(simhash(ARTICLE), simhash(edited)) >= 0.85
+
+def test_unrelated_texts_are_far_apart():
+    other = "宋代的城市经济十分繁荣，汴京的商铺不再受坊市制度的限制，夜市和草市随之兴起。" * 6
+    assert similarity(simhash(ARTICLE), simhash(other)) < 0.8
+
+def test_short_text():
+    assert simhash("ab") == simhash("AB")
+
+@pytest.mark.parametrize("max_distance", [0, 1, 3, 7])
+def test_index_finds_every_fingerprint_within_distance(max_distance):
+    """分段的鸽笼原理：距离不超过 max_distance 时一定至少有一段完全相同"""
+    rng = random.Random(max_distance)
+    index = SimHashIndex(max_distance)
+    stored = [rng.getrandbits(FINGERPRINT_BITS) for _ in range(200)]
+    for i, fingerprint in enumerate(stored):
+        index.add("scope", f"key-{i}", fingerprint)
+    assert len(index) == len(stored)
+
+    for i, fingerprint in enumerate(stored):
+        query = _flip(fingerprint, rng.sample(range(FINGERPRINT_BITS), max_distance))
+        key, score = index.find("scope", query)
+        assert key == f"key-{i}"
+        assert score == pytest.approx(1 - max_distance / FINGERPRINT_BITS)
+
+def test_index_rejects_fingerprints_beyond_distance():
+    index = SimHashIndex(3)
+    index.add("scope", "key", 0)
+    assert index.find("scope", _flip(0, range(4))) is None
+    assert index.find("scope", _flip(0, [0, 20, 40])) == ("key", 1 - 3 / FINGERPRINT_BITS)
+
+def test_index_prefers_closest_match():
+    index = SimHashIndex(3)
+    index.add("scope", "far", _flip(0, [1, 2, 3]))
+    index.add("scope", "near", _flip(0, [1]))
+    assert index.find("scope", 0)[0] == "near"
+
+def test_index_scopes_are_isolated():
+    index = SimHashIndex(3)
+    index.add("model-a", "a", 12345)
+    assert index.find("model-b", 12345) is None
+    index.add("model-b", "b", 12345)
+    assert index.find("model-b", 12345) == ("b", 1.0)
+
+def test_index_ignores_duplicate_keys():
+    index = SimHashIndex(3)
+    index.add("scope", "key", 1)
+    index.add("scope", "key", 2 ** 64 - 2)
+    assert len(index) == 1
+    assert index.find("scope", 2 ** 64 - 2) is None
+
+def test_similarity_index_syncs_between_workers(tmp_path):
+    path = str(tmp_path / "similarity.sqlite3")
+    writer = SimilarityIndex(path, threshold=0.95, ttl=3600)
+    reader = SimilarityIndex(path, threshold=0.95, ttl=3600)
+    assert writer.enabled
+    assert writer.max_distance == 3
+
+    # 最高位为 1 的指纹以有符号整数存储，读取后需要还原
+    fingerprint = 2 ** 63 + 12345
+    writer.add("scope", "key", fingerprint)
+    assert writer.find("scope", _flip(fingerprint, [5])) == ("key", 1 - 1 / FINGERPRINT_BITS)
+    assert reader.find("scope", fingerprint) == ("key", 1.0)
+
+@pytest.mark.parametrize("threshold", [0, 1])
+def test_similarity_index_disabled(tmp_path, threshold):
+    assert not SimilarityIndex(str(tmp_path / "s.sqlite3"), threshold=threshold, ttl=60).enabled
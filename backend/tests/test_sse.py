@@ -0,0 +1,71 @@
+import pytest
+from app.config.settings import settings
+from app.core.mindmap import sse
+from app.core.mindmap.sse import FlushPolicy
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(sse.time, "monotonic", clock)
+    return clock
+
+def test_flushes_when_size_threshold_is_reached(clock):
+    policy = FlushPolicy(max_chars=10, max_delay_ms=1000)
+    assert policy.add("abcd") is None
+    assert policy.add("efg") is None
+    assert policy.add("hij") == "abcdefghij"
+    # 刷新后重新累计
+    assert policy.add("k") is None
+    assert policy.flush() == "k"
+
+def test_single_large_fragment_is_flushed_at_once(clock):
+    policy = FlushPolicy(max_chars=4, max_delay_ms=1000)
+    assert policy.add("一段超过阈值的文本") == "一段超过阈值的文本"
+    assert policy.flush() is None
+
+def test_flushes_when_delay_elapses(clock):
+    policy = FlushPolicy(max_chars=100, max_delay_ms=50)
+    assert policy.add("a") is None
+    clock.now += 0.049
+    assert policy.add("b") is None
+    clock.now += 0.001
+    assert policy.add("c") == "abc"
+
+def test_delay_is_measured_from_the_first_pending_fragment(clock):
+    policy = FlushPolicy(max_chars=100, max_delay_ms=50)
+    policy.add("a")
+    clock.now += 0.04
+    assert policy.flush() == "a"
+    # 空闲时间不计入下一批的等待时间
+    clock.now += 1
+    assert policy.add("b") is None
+    clock.now += 0.04
+    assert policy.add("c") is None
+    clock.now += 0.01
+    assert policy.add("d") == "bcd"
+
+def test_empty_fragments_are_ignored(clock):
+    policy = FlushPolicy(max_chars=1, max_delay_ms=1000)
+    assert policy.add("") is None
+    assert policy.flush() is None
+
+def test_flush_returns_pending_text_once(clock):
+    policy = FlushPolicy(max_chars=100, max_delay_ms=1000)
+    policy.add("# 标题")
+    policy.add("\n## 分支")
+    assert policy.flush() == "# 标题\n## 分支"
+    assert policy.flush() is None
+
+def test_defaults_come_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_CHUNK_SIZE", 12)
+    monkeypatch.setattr(settings, "STREAM_FLUSH_INTERVAL_MS", 250)
+    policy = FlushPolicy()
+    assert policy.max_chars == 12
+    assert policy.max_delay == 0.25
@@ -0,0 +1,115 @@
+import random
+import re
+import sys
+import pytest
+from app.config.settings import settings
+from app.core.models import token_budget
+from app.core.models.token_budget import TokenBudget, clear_token_counts, count_tokens, truncate_to_tokens
+
+_PIECES = ["分布式", "系统", "的", "一致性", "协议", "consistency", " ", "replica", "，", "。", "\n", "2024", "log-structured"]
+
+def _texts(seed: int, count: int = 30):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(_PIECES) for _ in range(rng.randint(0, 400))) for _ in range(count)]
+
+class _FakeEncoding:
+    """按词和单个字符切分的分词器：token 边界不与字符一一对应，解码为逐个 token 拼接"""
+
+    _TOKEN = re.compile(r"[a-z]{1,4}|\d{1,3}|\s+|.", re.S)
+
+    def encode_ordinary(self, text: str) -> list:
+        return self._TOKEN.findall(text)
+
+    def decode(self, tokens: list) -> str:
+        return "".join(tokens)
+
+@pytest.fixture(autouse=True)
+def fresh_counts():
+    clear_token_counts()
+    yield
+    clear_token_counts()
+
+@pytest.fixture
+def encoding(monkeypatch):
+    encoding = _FakeEncoding()
+    monkeypatch.setattr(token_budget, "_get_encoding", lambda model: encoding)
+    return encoding
+
+@pytest.fixture
+def offline(monkeypatch):
+    monkeypatch.setattr(token_budget, "_get_encoding", lambda model: None)
+
+def test_count_uses_the_tokenizer(encoding):
+    text = "replica 一致性 2024"
+    assert count_tokens(text, "gpt-4o") == len(encoding.encode_ordinary(text))
+
+@pytest.mark.parametrize("seed", range(3))
+def test_tokenizer_truncation_never_exceeds_limit(encoding, seed):
+    for text in _texts(seed):
+        for limit in (1, 7, 50, 200):
+            truncated = truncate_to_tokens(text, limit, "gpt-4o")
+            assert count_tokens(truncated, "gpt-4o") <= limit
+            assert text.startswith(truncated)
+            if count_tokens(text, "gpt-4o") <= limit:
+                assert truncated == text
+
+def test_estimate_counts_cjk_and_ascii_separately(offline):
+    chinese = "分布式系统" * 20
+    english = "replica " * 20
+    assert count_tokens(chinese) == int(len(chinese) / settings.CHINESE_CHARS_PER_TOKEN) + 1
+    assert count_tokens(english) == int(len(english) / 4) + 1
+
+@pytest.mark.parametrize("seed", range(3))
+def test_estimated_truncation_never_exceeds_limit(offline, seed):
+    for text in _texts(seed):
+        for limit in (1, 7, 50, 200):
+            truncated = truncate_to_tokens(text, limit)
+            assert count_tokens(truncated) <= limit
+            assert text.startswith(truncated)
+            if count_tokens(text) <= limit:
+                assert truncated == text
+
+@pytest.mark.parametrize("limit", [0, -5])
+def test_non_positive_limit_returns_empty(offline, limit):
+    assert truncate_to_tokens("分布式系统", limit) == ""
+
+def test_missing_tiktoken_falls_back_to_estimate(monkeypatch):
+    # sys.modules 中的 None 使 import tiktoken 抛出 ImportError
+    monkeypatch.setitem(sys.modules, "tiktoken", None)
+    token_budget._get_encoding.cache_clear()
+    try:
+        text = "一致性协议 consistency"
+        assert token_budget._get_encoding("gpt-4o") is None
+        assert count_tokens(text, "gpt-4o") == token_budget._estimate_tokens(text)
+    finally:
+        token_budget._get_encoding.cache_clear()
+
+def test_counts_are_cached_per_model(encoding, monkeypatch):
+    text = "consistency" * 100
+    calls = []
+    original = encoding.encode_ordinary
+    monkeypatch.setattr(encoding, "encode_ordinary", lambda text: calls.append(text) or original(text))
+    assert count_tokens(text, "gpt-4o") == count_tokens(text, "gpt-4o")
+    assert len(calls) == 1
+    count_tokens(text, "gpt-4")
+    assert len(calls) == 2
+
+@pytest.mark.parametrize("model", ["gpt-4", "gpt-4o-mini", "qwen2.5:7b", "unknown-model"])
+def test_budget_fits_the_context_window(offline, model):
+    budget = TokenBudget(model)
+    template = "请根据以下内容生成思维导图：\n{text}"
+    available = budget.input_budget(template)
+    assert budget.context_window <= settings.MAX_INPUT_TOKENS
+    assert available + settings.LLM_MAX_TOKENS + budget.count(template) <= budget.context_window
+    text = "分布式系统的一致性协议 replica log。" * 5000
+    assert budget.count(budget.truncate(text, available)) <= available
+
+def test_real_tokenizer_respects_limit():
+    """本地有 tiktoken 词表缓存时，用真实分词器检查截断（离线且无缓存时跳过）"""
+    pytest.importorskip("tiktoken")
+    token_budget._get_encoding.cache_clear()
+    if token_budget._get_encoding("gpt-4o") is None:
+        pytest.skip("没有可用的 tiktoken 词表")
+    for text in _texts(0, count=10):
+        for limit in (1, 7, 50):
+            assert count_tokens(truncate_to_tokens(text, limit, "gpt-4o"), "gpt-4o") <= limit
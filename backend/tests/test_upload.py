@@ -0,0 +1,131 @@
+import tempfile
+import pytest
+from fastapi.testclient import TestClient
+from fastapi import HTTPException
+from starlette.requests import Request
+from app.api.v1.mindmap import _TempFileStreamingResponse, _spool_pdf_upload
+from app.config.settings import settings
+from app.core.models.llm import llm_registry
+from benchmarks.corpus import make_pdf
+from benchmarks.fake_llm import FakeLLMConfig, install
+
+UPLOAD_URL = f"{settings.API_V1_STR}/mindmap/from-document/upload"
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    return tmp_path
+
+@pytest.fixture
+def client():
+    from app.main import app
+    install(FakeLLMConfig(tokens_per_second=0, first_token_latency=0))
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        llm_registry.override(None)
+
+def test_upload_streams_result_and_removes_spooled_file(client, spool_dir):
+    response = client.post(UPLOAD_URL, content=make_pdf(3), headers={"content-type": "application/pdf"})
+    assert response.status_code == 200
+    assert '"type":"extracting"' in response.text
+    assert '"type":"complete"' in response.text
+    assert list(spool_dir.glob("*.pdf")) == []
+
+@pytest.mark.parametrize("body, status", [
+    (b"not a pdf", 415),
+    (b"", 400),
+])
+def test_rejected_upload_leaves_no_file(client, spool_dir, body, status):
+    response = client.post(UPLOAD_URL, content=body, headers={"content-type": "application/pdf"})
+    assert response.status_code == status
+    assert list(spool_dir.glob("*.pdf")) == []
+
+async def test_file_removed_when_client_disconnects_before_body(tmp_path):
+    path = tmp_path / "upload.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    started = []
+
+    async def messages():
+        started.append(True)
+        yield "data: {}\n\n"
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # 连接在发送响应头时已经断开
+        raise OSError("connection reset")
+
+    response = _TempFileStreamingResponse(messages(), str(path), media_type="text/event-stream")
+    with pytest.raises(Exception):
+        await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+    assert not started
+    assert not path.exists()
+
+def _request(chunks, content_type: str = "application/pdf") -> Request:
+    """逐个网络分块送达请求体的请求"""
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+
+    async def receive():
+        return messages.pop(0)
+
+    scope = {"type": "http", "method": "POST", "headers": [(b"content-type", content_type.encode())]}
+    return Request(scope, receive)
+
+def _split(data: bytes, first: int):
+    # 文件头被拆到多个网络分块中
+    return [data[:first], data[first:first + 2], data[first + 2:]]
+
+@pytest.mark.parametrize("first", [1, 2, 3])
+async def test_magic_bytes_split_across_chunks(spool_dir, first):
+    pdf = make_pdf(2)
+    path = await _spool_pdf_upload(_request(_split(pdf, first)))
+    with open(path, "rb") as f:
+        assert f.read() == pdf
+
+@pytest.mark.parametrize("body", [b"%PD", b"%PDX-1.4", b"x"])
+async def test_short_or_wrong_header_is_rejected(spool_dir, body):
+    with pytest.raises(HTTPException) as error:
+        await _spool_pdf_upload(_request(_split(body, 1)))
+    assert error.value.status_code == 415
+    assert list(spool_dir.glob("*.pdf")) == []
+
+async def test_multipart_chunks_are_parsed_incrementally(spool_dir):
+    pdf = make_pdf(2)
+    boundary = "test-boundary"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\n附加字段\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.pdf\"\r\n"
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + pdf + f"\r\n--{boundary}--\r\n".encode()
+    chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+    path = await _spool_pdf_upload(_request(chunks, f"multipart/form-data; boundary={boundary}"))
+    with open(path, "rb") as f:
+        assert f.read() == pdf
+
+def test_multipart_upload_is_spooled_once(client, spool_dir, monkeypatch):
+    async def form(*args, **kwargs):
+        raise AssertionError("multipart 请求体不应再经过 Starlette 的表单临时文件")
+
+    monkeypatch.setattr(Request, "form", form)
+    response = client.post(
+        UPLOAD_URL,
+        files={"file": ("paper.pdf", make_pdf(3), "application/pdf")},
+        data={"note": "附加字段"}
+    )
+    assert response.status_code == 200
+    assert '"type":"complete"' in response.text
+    assert list(spool_dir.glob("*.pdf")) == []
+
+@pytest.mark.parametrize("files, status", [
+    ({"other": ("paper.pdf", make_pdf(1), "application/pdf")}, 400),
+    ({"file": ("paper.txt", b"plain text", "text/plain")}, 415),
+    ({"file": ("paper.pdf", b"", "application/pdf")}, 400),
+])
+def test_invalid_multipart_upload(client, spool_dir, files, status):
+    response = client.post(UPLOAD_URL, files=files)
+    assert response.status_code == status
+    assert list(spool_dir.glob("*.pdf")) == []
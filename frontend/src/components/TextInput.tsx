@@ -49,6 +49,7 @@ const TextInput: React.FC<TextInputProps> = ({ onMindMapGenerated }) => {
 
       let accumulatedContent = "";
       let currentLine = "";
+      let draftContent = "";
 
       while (reader) {
         const { done, value } = await reader.read();
@@ -69,6 +70,13 @@ const TextInput: React.FC<TextInputProps> = ({ onMindMapGenerated }) => {
                 case "reasoning":
                   setReasoningContent(prev => prev + data.partial);
                   break;
+                case "draft":
+                  // 草稿骨架只在正式内容到达之前显示
+                  if (!accumulatedContent && !currentLine) {
+                    draftContent += data.partial;
+                    setGeneratingContent(draftContent);
+                  }
+                  break;
                 case "generating":
                   if (data.partial) {
                     if (data.partial.includes("<think>")) {